@@ -0,0 +1,54 @@
+"""
+Headless video backend for rave.
+
+Renders into an offscreen NumPy framebuffer instead of a window on screen, so games and benchmarks can run on machines
+without a display or GPU. It is only used as a last resort, unless the `RAVE_HEADLESS` environment variable is set.
+Rendered frames can be written to PNG files by setting `RAVE_HEADLESS_DUMP` to a directory, or through `Window.dump()`.
+"""
+import os
+import sys
+
+import rave.log
+import rave.backends
+
+from .window import Window
+from .drawables import Image, Font, Text
+
+BACKEND_PRIORITY = rave.backends.PRIORITY_MIN
+FORCE_VARIABLE = 'RAVE_HEADLESS'
+DUMP_VARIABLE = 'RAVE_HEADLESS_DUMP'
+
+
+## Module API.
+
+def load():
+    global BACKEND_PRIORITY
+    if os.environ.get(FORCE_VARIABLE):
+        BACKEND_PRIORITY = rave.backends.PRIORITY_MAX
+    rave.backends.register(rave.backends.BACKEND_VIDEO, sys.modules[__name__])
+
+def unload():
+    rave.backends.remove(rave.backends.BACKEND_VIDEO, sys.modules[__name__])
+
+
+## Video backend API.
+
+def create_window(title, width, height, fullscreen=False, borders=True, resizable=True, vsync=True, visible=True):
+    window = Window(title, width, height)
+    window.dump_path = os.environ.get(DUMP_VARIABLE) or None
+    _log.debug('Created {w}x{h} headless window.', w=width, h=height)
+    return window
+
+def handle_events():
+    pass
+
+def create_drawable(data):
+    return Image(data)
+
+def create_font(data):
+    return Font(data)
+
+
+## Internals.
+
+_log = rave.log.get(__name__)
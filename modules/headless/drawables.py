@@ -0,0 +1,238 @@
+"""
+Drawables for the headless backend. These keep their pixels as NumPy arrays and draw by blending onto the window framebuffer.
+"""
+import collections
+import ctypes
+import numpy
+
+import rave.log
+import rave.rendering
+
+PixelFormat = rave.rendering.PixelFormat
+
+
+## Pixel conversion.
+
+def to_rgba(data, width, height, pixel_format):
+    """ Convert raw image data in `pixel_format` to a (height, width, 4) float32 RGBA array with values in [0, 1]. """
+    if pixel_format.compressed:
+        raise ValueError('Compressed pixel formats are not supported by the headless backend.')
+
+    size = pixel_format.data_size(width, height)
+    if isinstance(data, (bytes, bytearray, memoryview, numpy.ndarray)):
+        raw = numpy.frombuffer(data, dtype='uint8', count=size)
+    else:
+        # A raw pointer, such as the pixels of an SDL surface.
+        raw = numpy.frombuffer(ctypes.string_at(data, size), dtype='uint8')
+    if pixel_format.type == PixelFormat.TYPE_ARRAY:
+        channels = raw.reshape((height, width, len(pixel_format.order)))
+        rgba = numpy.empty((height, width, 4), dtype='float32')
+        for i, name in enumerate('rgba'):
+            if name in pixel_format.order:
+                rgba[..., i] = channels[..., pixel_format.order.index(name)] / 255
+            else:
+                rgba[..., i] = 1.0
+        return rgba
+
+    # Packed pixels: extract every channel using its mask and shift.
+    bits = pixel_format.r_bits + pixel_format.g_bits + pixel_format.b_bits + pixel_format.a_bits
+    packed = raw.view('<u4' if bits > 16 else '<u2').reshape((height, width)).astype('uint32')
+    rgba = numpy.empty((height, width, 4), dtype='float32')
+    for i, name in enumerate('rgba'):
+        channel_bits = getattr(pixel_format, name + '_bits')
+        if not channel_bits:
+            rgba[..., i] = 1.0
+            continue
+        mask = getattr(pixel_format, name + '_mask')
+        shift = getattr(pixel_format, name + '_shift')
+        rgba[..., i] = ((packed & mask) >> shift) / ((1 << channel_bits) - 1)
+    return rgba
+
+
+## Images.
+
+class Image(rave.rendering.Drawable):
+    """ A bitmap image, drawn at the window origin. Pixel conversion is deferred until first render. """
+    PLACEHOLDER = numpy.array([[[1.0, 0.0, 1.0, 1.0]]], dtype='float32')
+
+    def __init__(self, data):
+        self.data = data
+        self.width = data.width
+        self.height = data.height
+        self.pixels = None
+
+    def __repr__(self):
+        return '<{}: {}x{}>'.format(self.__class__.__qualname__, self.width, self.height)
+
+    def prepare(self):
+        try:
+            self.pixels = to_rgba(self.data.get_data(), self.width, self.height, self.data.pixel_format)
+        except ValueError as e:
+            _log.warn('Could not convert image, using placeholder: {err}', err=e)
+            self.pixels = numpy.broadcast_to(self.PLACEHOLDER, (self.height, self.width, 4))
+        # We don't need the source data anymore.
+        self.data = None
+
+    def render(self, target):
+        if self.pixels is None:
+            self.prepare()
+        target.blit(self.pixels, 0, 0)
+
+
+## Text.
+
+class Font:
+    """ A font that can create text drawables. Glyph bitmaps and laid out text are cached. """
+    KEEP_RUNS = 256
+
+    def __init__(self, data):
+        self.data = data
+        self.glyphs = {}
+        self.runs = collections.OrderedDict()
+
+    def __repr__(self):
+        return '<{}: {}>'.format(self.__class__.__qualname__, self.data.name)
+
+    def create_text(self, string, size=16, color=(0.0, 0.0, 0.0, 1.0), width=None):
+        return Text(self, string, size, color, width)
+
+    def measure(self, string, size=16, width=None):
+        _, _, run_width, run_height = self.shape(string, size, width)
+        return run_width, run_height
+
+    def get_glyph(self, char, size):
+        """ Get a (glyph data, coverage array) tuple for `char` at `size`. """
+        key = (size, char)
+        glyph = self.glyphs.get(key)
+        if not glyph:
+            data = self.data.get_glyph(char, size)
+            coverage = None
+            if data.width and data.height:
+                coverage = numpy.frombuffer(data.data, dtype='uint8').reshape((data.height, data.width)) / 255
+            glyph = self.glyphs[key] = (data, coverage)
+        return glyph
+
+    def shape(self, string, size, width=None):
+        """
+        Lay out `string`, returning a (placements, offsets, width, height) tuple: a list of (x, y, coverage) glyph bitmaps to draw,
+        the amount of placements preceding every character index, and the total size of the text.
+        """
+        key = (string, size, width)
+        run = self.runs.get(key)
+        if run:
+            self.runs.move_to_end(key)
+            return run
+
+        ascent, descent, line_height = self.data.get_metrics(size)
+        placements = []
+        offsets = []
+        pen_x = 0
+        baseline = ascent
+        max_width = 0
+        wrap_point = None
+        previous = None
+
+        for char in string:
+            offsets.append(len(placements))
+            if char == '\n':
+                max_width = max(max_width, pen_x)
+                pen_x = 0
+                baseline += line_height
+                wrap_point = previous = None
+                continue
+
+            data, coverage = self.get_glyph(char, size)
+            if previous:
+                pen_x += self.data.get_kerning(previous, char, size)
+            previous = char
+
+            if char.isspace():
+                pen_x += data.advance
+                wrap_point = (len(placements), pen_x)
+                continue
+
+            if width and wrap_point and pen_x + data.left + data.width > width:
+                # Move the current word to the next line.
+                first, shift = wrap_point
+                max_width = max(max_width, shift)
+                placements[first:] = [ (x - shift, y + line_height, c) for x, y, c in placements[first:] ]
+                pen_x -= shift
+                baseline += line_height
+                wrap_point = None
+
+            if coverage is not None:
+                placements.append((pen_x + data.left, baseline - data.top, coverage))
+            pen_x += data.advance
+
+        offsets.append(len(placements))
+        run = self.runs[key] = (placements, offsets, max(max_width, pen_x), baseline + descent)
+        if len(self.runs) > self.KEEP_RUNS:
+            self.runs.popitem(last=False)
+        return run
+
+class Text(rave.rendering.Drawable):
+    """ A block of text. Set `position` to move it and `reveal` to show only the first characters. """
+
+    def __init__(self, font, string, size, color, width=None):
+        self.font = font
+        self._string = string
+        self.size = size
+        self.color = color
+        self.width = width
+        self._position = (0, 0)
+        self._reveal = None
+
+    def __repr__(self):
+        return '<{}: {!r} in {!r} at {}px>'.format(self.__class__.__qualname__, self.string, self.font, self.size)
+
+    @property
+    def string(self):
+        return self._string
+
+    @string.setter
+    def string(self, string):
+        if string != self._string:
+            self._string = string
+            self.changed()
+
+    @property
+    def position(self):
+        """ Position of the text in window coordinates. """
+        return self._position
+
+    @position.setter
+    def position(self, position):
+        if position != self._position:
+            self._position = position
+            self.changed()
+
+    @property
+    def reveal(self):
+        """ Amount of characters to show, or None to show all of them. """
+        return self._reveal
+
+    @reveal.setter
+    def reveal(self, count):
+        if count != self._reveal:
+            self._reveal = count
+            self.changed()
+
+    @property
+    def length(self):
+        return len(self.string)
+
+    def render(self, target):
+        placements, offsets, _, _ = self.font.shape(self.string, self.size, self.width)
+        if self._reveal is None or self._reveal >= len(offsets) - 1:
+            count = offsets[-1]
+        else:
+            count = offsets[max(0, self._reveal)]
+
+        ox, oy = self._position
+        for x, y, coverage in placements[:count]:
+            target.blit_coverage(coverage, self.color, int(round(ox + x)), int(round(oy + y)))
+
+
+## Internals.
+
+_log = rave.log.get(__name__)
@@ -0,0 +1,215 @@
+"""
+Offscreen windows for the headless backend.
+"""
+import os
+import zlib
+import struct
+import itertools
+import numpy
+
+import rave.log
+import rave.events
+import rave.rendering
+
+
+class Window(rave.rendering.Drawable):
+    """
+    A window rendering into a (height, width, 4) float32 RGBA framebuffer, with (0, 0) being the top-left corner.
+    If `dump_path` is set, every rendered frame is written to a PNG file in that directory.
+    """
+    CLEAR_COLOR = (1.0, 1.0, 1.0, 1.0)
+    DUMP_PATTERN = 'frame-{:06d}.png'
+
+    def __init__(self, title, width, height):
+        self.id = next(_ids)
+        self._title = title
+        self._size = (width, height)
+        self.framebuffer = numpy.empty((height, width, 4), dtype='float32')
+        self.framebuffer[...] = self.CLEAR_COLOR
+        self.layers = []
+        self.layer_names = {}
+        self.frames = 0
+        self.dump_path = None
+        self._damaged = True
+
+        # Remember the bus we hooked into, as another one may be current by the time we are closed.
+        self._events = rave.events.current()
+        self._redraw_hook = self._events.hook('video.redraw', self.on_redraw, weak=True)
+
+    def __repr__(self):
+        return '<{}: {!r} ({}x{})>'.format(self.__class__.__qualname__, self._title, *self._size)
+
+    def close(self):
+        self._events.unhook(self._redraw_hook)
+
+    def show(self):
+        pass
+
+    def hide(self):
+        pass
+
+    def minimize(self):
+        pass
+
+    def maximize(self):
+        pass
+
+    def restore(self):
+        pass
+
+    def render(self, target):
+        # Like on-screen windows, only draw when something changed.
+        if not self._damaged and not self.animated:
+            return
+        self._damaged = False
+
+        self.framebuffer[...] = self.CLEAR_COLOR
+        for layer in self.layers:
+            layer.render(self)
+        self.frames += 1
+
+        if self.dump_path:
+            self.dump(os.path.join(self.dump_path, self.DUMP_PATTERN.format(self.frames)))
+
+    def refresh(self):
+        pass
+
+    def request_redraw(self):
+        """ Mark the window contents as changed, so it will be redrawn on the next frame. """
+        self._damaged = True
+
+    def add_layer(self, layer):
+        self.layers.append(layer)
+        self.layer_names[layer.name] = layer
+        self.request_redraw()
+
+    def get_layer(self, name):
+        return self.layer_names[name]
+
+    def on_redraw(self, event, window=None):
+        if window and window is not self and window != self.id:
+            return
+        self.request_redraw()
+
+
+    ## Drawing.
+
+    def blit(self, pixels, x, y):
+        """ Blend (height, width, 4) RGBA float array `pixels` onto the framebuffer with its top-left corner at (x, y). """
+        region = self._clip(x, y, pixels.shape[1], pixels.shape[0])
+        if not region:
+            return
+        (dy0, dy1, dx0, dx1), (sy0, sy1, sx0, sx1) = region
+
+        source = pixels[sy0:sy1, sx0:sx1]
+        dest = self.framebuffer[dy0:dy1, dx0:dx1]
+        alpha = source[..., 3:4]
+        dest[..., 0:3] = source[..., 0:3] * alpha + dest[..., 0:3] * (1 - alpha)
+        dest[..., 3:4] = alpha + dest[..., 3:4] * (1 - alpha)
+
+    def blit_coverage(self, coverage, color, x, y):
+        """ Blend solid RGBA `color` onto the framebuffer through (height, width) coverage array `coverage`, with its top-left corner at (x, y). """
+        region = self._clip(x, y, coverage.shape[1], coverage.shape[0])
+        if not region:
+            return
+        (dy0, dy1, dx0, dx1), (sy0, sy1, sx0, sx1) = region
+
+        alpha = coverage[sy0:sy1, sx0:sx1, None] * color[3]
+        dest = self.framebuffer[dy0:dy1, dx0:dx1]
+        dest[..., 0:3] = numpy.asarray(color[0:3], dtype='float32') * alpha + dest[..., 0:3] * (1 - alpha)
+        dest[..., 3:4] = alpha + dest[..., 3:4] * (1 - alpha)
+
+    def _clip(self, x, y, width, height):
+        """ Clip a rectangle to the framebuffer, returning ((dest rows, dest columns), (source rows, source columns)) bounds. """
+        fw, fh = self._size
+        dx0, dy0 = max(0, x), max(0, y)
+        dx1, dy1 = min(fw, x + width), min(fh, y + height)
+        if dx0 >= dx1 or dy0 >= dy1:
+            return None
+        return (dy0, dy1, dx0, dx1), (dy0 - y, dy1 - y, dx0 - x, dx1 - x)
+
+
+    ## Frame output.
+
+    def snapshot(self):
+        """ Get the current frame as a (height, width, 4) uint8 RGBA array. """
+        return (numpy.clip(self.framebuffer, 0.0, 1.0) * 255 + 0.5).astype('uint8')
+
+    def dump(self, path):
+        """ Write the current frame to a PNG file at `path` on the host filesystem. """
+        pixels = self.snapshot()
+        height, width, _ = pixels.shape
+        # Every scanline is prefixed with its filter type, 0 meaning unfiltered.
+        scanlines = numpy.zeros((height, 1 + width * 4), dtype='uint8')
+        scanlines[:, 1:] = pixels.reshape((height, width * 4))
+
+        def chunk(kind, data):
+            body = kind + data
+            return struct.pack('>I', len(data)) + body + struct.pack('>I', zlib.crc32(body) & 0xFFFFFFFF)
+
+        with open(path, 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n')
+            f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)))
+            f.write(chunk(b'IDAT', zlib.compress(scanlines.tobytes(), 1)))
+            f.write(chunk(b'IEND', b''))
+        _log.trace('Dumped frame {n} to {path}.', n=self.frames, path=path)
+
+
+    ## Properties.
+
+    @property
+    def title(self):
+        return self._title
+
+    @title.setter
+    def title(self, new):
+        self._title = new
+
+    @property
+    def size(self):
+        return self._size
+
+    @size.setter
+    def size(self, new):
+        width, height = new
+        self._size = (width, height)
+        self.framebuffer = numpy.empty((height, width, 4), dtype='float32')
+        self.framebuffer[...] = self.CLEAR_COLOR
+        self.request_redraw()
+        rave.events.emit('video.window.resized', self.id, width, height)
+
+    @property
+    def render_size(self):
+        return self._size
+
+    @property
+    def scale(self):
+        return 1.0
+
+    @property
+    def animated(self):
+        """ Whether anything in the window changes every frame. """
+        return any(layer.animated for layer in self.layers)
+
+    @property
+    def fullscreen(self):
+        return False
+
+    @property
+    def borders(self):
+        return False
+
+    @property
+    def resizable(self):
+        return False
+
+    @property
+    def vsync(self):
+        return False
+
+
+## Internals.
+
+_log = rave.log.get(__name__)
+# Window identifiers, as passed in window events.
+_ids = itertools.count(1)
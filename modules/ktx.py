@@ -0,0 +1,110 @@
+"""
+Support for loading precompressed textures from KTX (version 1) containers.
+
+KTX files store GPU-ready image data, including mipmap levels, so no decoding is needed before uploading them.
+The `tools/ktxconvert.py` script can be used to create them.
+"""
+import struct
+
+import rave.log
+import rave.events
+import rave.rendering
+import rave.resources
+
+
+## Constants.
+
+KTX_IDENTIFIER = b'\xabKTX 11\xbb\r\n\x1a\n'
+KTX_ENDIANNESS = 0x04030201
+KTX_HEADER = struct.Struct('<13I')
+
+# Mapping of glInternalFormat values to pixel formats.
+KTX_FORMATS = {
+    0x83F0: rave.rendering.PixelFormat.FORMAT_BC1,
+    0x83F1: rave.rendering.PixelFormat.FORMAT_BC1A,
+    0x83F2: rave.rendering.PixelFormat.FORMAT_BC2,
+    0x83F3: rave.rendering.PixelFormat.FORMAT_BC3,
+    0x9274: rave.rendering.PixelFormat.FORMAT_ETC2_RGB8,
+    0x9278: rave.rendering.PixelFormat.FORMAT_ETC2_RGBA8,
+}
+# Reverse mapping, for writing.
+KTX_INTERNAL_FORMATS = { v: k for k, v in KTX_FORMATS.items() }
+
+
+## Module API.
+
+def load():
+    rave.events.hook('engine.new_game', new_game)
+
+
+## Module stuff.
+
+def new_game(event, game):
+    game.resources.register_loader(KTXLoader, '.ktx$')
+    _log.debug('Loaded support for KTX textures.')
+
+
+class ImageData(rave.resources.ImageData):
+    __slots__ = ('levels',)
+
+    def __init__(self, levels, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.levels = levels
+
+    def get_data(self, amount=None):
+        data = self.levels[0][2]
+        if amount:
+            return data[:amount]
+        return data
+
+    def get_mipmaps(self):
+        return self.levels
+
+class KTXLoader:
+    @classmethod
+    def can_load(cls, path, fd):
+        return fd.read(len(KTX_IDENTIFIER)) == KTX_IDENTIFIER
+
+    @classmethod
+    def load(cls, path, fd):
+        if fd.read(len(KTX_IDENTIFIER)) != KTX_IDENTIFIER:
+            raise ValueError('Not a KTX file.')
+
+        header = fd.read(KTX_HEADER.size)
+        endianness = struct.unpack('<I', header[:4])[0]
+        if endianness == KTX_ENDIANNESS:
+            order = '<'
+        elif endianness == struct.unpack('>I', struct.pack('<I', KTX_ENDIANNESS))[0]:
+            order = '>'
+        else:
+            raise ValueError('Invalid KTX endianness marker: {:#x}'.format(endianness))
+
+        (_, gl_type, _, gl_format, gl_internal_format, _, width, height, depth,
+            array_elements, faces, mipmap_levels, kv_bytes) = struct.unpack(order + '13I', header)
+
+        if gl_type != 0 or gl_format != 0:
+            raise ValueError('Only compressed KTX textures are supported.')
+        if gl_internal_format not in KTX_FORMATS:
+            raise ValueError('Unsupported KTX internal format: {:#x}'.format(gl_internal_format))
+        if depth > 1 or array_elements > 0 or faces != 1:
+            raise ValueError('Only 2D KTX textures are supported.')
+
+        # Skip key/value metadata.
+        fd.read(kv_bytes)
+
+        levels = []
+        for level in range(max(1, mipmap_levels)):
+            size = struct.unpack(order + 'I', fd.read(4))[0]
+            data = fd.read(size)
+            if len(data) != size:
+                raise ValueError('Truncated KTX mipmap level {}.'.format(level))
+            # Levels are padded to 4 bytes.
+            fd.read(3 - (size + 3) % 4)
+            levels.append((max(1, width >> level), max(1, height >> level), data))
+
+        return ImageData(levels, width, height, KTX_FORMATS[gl_internal_format])
+
+
+## Internals.
+
+_log = rave.log.get(__name__)
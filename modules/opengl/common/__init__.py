@@ -3,8 +3,9 @@ Common OpenGL functionality.
 """
 from OpenGL import GL
 import rave.log
-from .math import ortho, identity
+from .math import ortho, identity, to_gl
 from .versions import get_version_range
+from . import probes
 
 
 def dump_info(context):
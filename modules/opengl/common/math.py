@@ -1,15 +1,213 @@
+"""
+Vectorized transformation math.
+
+Matrices follow the column vector convention (`M @ v`) and are stored as regular row-major NumPy arrays, including
+the ones returned by `ortho()` and `identity()`. Use `to_gl()` to convert them to the column-major layout OpenGL expects
+before uploading them.
+
+Most functions operate on batches: a stack of N matrices is an array of shape (N, 3, 3) for 2D affine transforms,
+or (N, 4, 4) for 3D affine transforms, and scalar parameters can be given as arrays of length N.
+Functions that produce arrays take an optional `out` array to write the result to, which is also returned,
+so result arrays can be reused between frames. Intermediate results may still be allocated.
+"""
 import numpy
 
+DTYPE = 'float32'
+
+
+## Basic matrices.
+
 def ortho(left, right, top, bottom, far, near):
+    """ Get a 4 x 4 orthographic projection matrix. """
     rl = right - left
     tb = top - bottom
     fn = far - near
     return numpy.array([
-         2 / rl, 0, 0, 0,
-         0, 2 / tb, 0, 0,
-         0, 0, -2 / fn,  0 ,
-         - (right + left) / rl, - (top + bottom) / tb, - (far + near) / fn, 1
-    ], dtype='float32')
+        [ 2 / rl, 0, 0, -(right + left) / rl ],
+        [ 0, 2 / tb, 0, -(top + bottom) / tb ],
+        [ 0, 0, -2 / fn, -(far + near) / fn ],
+        [ 0, 0, 0, 1 ],
+    ], dtype=DTYPE)
 
 def identity(n):
     return numpy.eye(n, dtype='float32')
+
+def identities(count, n, out=None):
+    """ Get a stack of `count` n x n identity matrices. """
+    if out is None:
+        out = numpy.empty((count, n, n), dtype=DTYPE)
+    out[...] = numpy.eye(n, dtype=DTYPE)
+    return out
+
+
+## 2D affine transforms.
+
+def affine2d(tx=0, ty=0, rotation=0, sx=1, sy=1, out=None):
+    """
+    Build 2D affine transforms that scale, then rotate (counter-clockwise, in radians), then translate.
+    Every parameter can be a scalar or an array of length N. Returns an (N, 3, 3) array.
+    """
+    tx, ty, rotation, sx, sy = numpy.broadcast_arrays(*(numpy.atleast_1d(p) for p in (tx, ty, rotation, sx, sy)))
+    if out is None:
+        out = numpy.empty((len(tx), 3, 3), dtype=DTYPE)
+
+    cos = numpy.cos(rotation)
+    sin = numpy.sin(rotation)
+    out[:, 0, 0] = cos * sx
+    out[:, 0, 1] = -sin * sy
+    out[:, 0, 2] = tx
+    out[:, 1, 0] = sin * sx
+    out[:, 1, 1] = cos * sy
+    out[:, 1, 2] = ty
+    out[:, 2, 0] = 0
+    out[:, 2, 1] = 0
+    out[:, 2, 2] = 1
+    return out
+
+def inverse_affine2d(m, out=None):
+    """ Invert a stack of (N, 3, 3) 2D affine transforms in closed form. """
+    if out is None:
+        out = numpy.empty_like(m)
+    a, b, tx = m[:, 0, 0], m[:, 0, 1], m[:, 0, 2]
+    c, d, ty = m[:, 1, 0], m[:, 1, 1], m[:, 1, 2]
+    det = a * d - b * c
+
+    # Compute into temporaries first, since `out` may alias `m`.
+    ia, ib, ic, idd = d / det, -b / det, -c / det, a / det
+    itx = -(ia * tx + ib * ty)
+    ity = -(ic * tx + idd * ty)
+
+    out[:, 0, 0], out[:, 0, 1], out[:, 0, 2] = ia, ib, itx
+    out[:, 1, 0], out[:, 1, 1], out[:, 1, 2] = ic, idd, ity
+    out[:, 2, 0], out[:, 2, 1], out[:, 2, 2] = 0, 0, 1
+    return out
+
+def affine2d_to_3d(m, out=None):
+    """ Embed a stack of (N, 3, 3) 2D affine transforms into (N, 4, 4) 3D affine transforms acting on the XY plane. """
+    if out is None:
+        out = numpy.empty((len(m), 4, 4), dtype=DTYPE)
+    out[...] = 0
+    out[:, 0:2, 0:2] = m[:, 0:2, 0:2]
+    out[:, 0:2, 3] = m[:, 0:2, 2]
+    out[:, 2, 2] = 1
+    out[:, 3, 3] = 1
+    return out
+
+
+## 3D affine transforms.
+
+def affine3d(translation=(0, 0, 0), rotation=(0, 0, 0, 1), scale=(1, 1, 1), out=None):
+    """
+    Build 3D affine transforms that scale, then rotate, then translate.
+    `translation` and `scale` are (N, 3) arrays, `rotation` is an (N, 4) array of unit quaternions in (x, y, z, w) order.
+    Single vectors are broadcast. Returns an (N, 4, 4) array.
+    """
+    translation = numpy.atleast_2d(translation)
+    rotation = numpy.atleast_2d(rotation)
+    scale = numpy.atleast_2d(scale)
+    count = max(len(translation), len(rotation), len(scale))
+    if out is None:
+        out = numpy.empty((count, 4, 4), dtype=DTYPE)
+
+    x, y, z, w = (rotation[:, i] for i in range(4))
+    xx, yy, zz = x * x, y * y, z * z
+    xy, xz, yz = x * y, x * z, y * z
+    wx, wy, wz = w * x, w * y, w * z
+
+    out[:, 0, 0] = 1 - 2 * (yy + zz)
+    out[:, 0, 1] = 2 * (xy - wz)
+    out[:, 0, 2] = 2 * (xz + wy)
+    out[:, 1, 0] = 2 * (xy + wz)
+    out[:, 1, 1] = 1 - 2 * (xx + zz)
+    out[:, 1, 2] = 2 * (yz - wx)
+    out[:, 2, 0] = 2 * (xz - wy)
+    out[:, 2, 1] = 2 * (yz + wx)
+    out[:, 2, 2] = 1 - 2 * (xx + yy)
+    out[:, 0:3, 0:3] *= scale[:, None, :]
+    out[:, 0:3, 3] = translation
+    out[:, 3, 0:3] = 0
+    out[:, 3, 3] = 1
+    return out
+
+def inverse_affine3d(m, out=None):
+    """ Invert a stack of (N, 4, 4) 3D affine transforms. """
+    linear = numpy.linalg.inv(m[:, 0:3, 0:3])
+    translation = -numpy.matmul(linear, m[:, 0:3, 3:4])
+    if out is None:
+        out = numpy.empty_like(m)
+    out[:, 0:3, 0:3] = linear
+    out[:, 0:3, 3:4] = translation
+    out[:, 3, 0:3] = 0
+    out[:, 3, 3] = 1
+    return out
+
+
+## Generic operations.
+
+def multiply(a, b, out=None):
+    """ Multiply two stacks of matrices pairwise, broadcasting single matrices. """
+    return numpy.matmul(a, b, out=out)
+
+def compose(matrices, out=None):
+    """
+    Compose a sequence of matrices (or matrix stacks) into one, applying the last one first:
+    compose([a, b, c]) equals a @ b @ c.
+    """
+    matrices = [ numpy.asarray(m) for m in matrices ]
+    if out is None:
+        # Stacks and single matrices can be mixed, so the result has the broadcast shape of all of them.
+        out = numpy.empty(numpy.broadcast_shapes(*(m.shape for m in matrices)), dtype=DTYPE)
+    out[...] = matrices[0]
+    for m in matrices[1:]:
+        numpy.matmul(out, m, out=out)
+    return out
+
+def inverse(m, out=None):
+    """ Invert a stack of arbitrary matrices. """
+    if out is None:
+        return numpy.linalg.inv(m).astype(DTYPE, copy=False)
+    out[...] = numpy.linalg.inv(m)
+    return out
+
+def transform_points(m, points, out=None):
+    """
+    Transform points by affine transforms. For 2D transforms, `m` is (N, 3, 3) and `points` is (N, K, 2);
+    for 3D transforms, `m` is (N, 4, 4) and `points` is (N, K, 3). A single matrix or point set is broadcast.
+    """
+    dims = m.shape[-1] - 1
+    linear = m[..., 0:dims, 0:dims]
+    translation = m[..., 0:dims, dims]
+    # (N, K, D) @ (N, D, D)^T applies the linear part to every point.
+    out = numpy.matmul(points, numpy.swapaxes(linear, -1, -2), out=out)
+    out += translation[..., None, :]
+    return out
+
+def transform_aabbs(m, mins, maxs, out_mins=None, out_maxs=None):
+    """
+    Transform axis-aligned bounding boxes by affine transforms, returning the bounding boxes of the results.
+    `mins` and `maxs` are (N, D) arrays of box corners, with D being 2 or 3 according to the transforms.
+    Returns an (out_mins, out_maxs) tuple.
+    """
+    dims = m.shape[-1] - 1
+    linear = m[..., 0:dims, 0:dims]
+    translation = m[..., 0:dims, dims]
+
+    center = (mins + maxs) / 2
+    extent = (maxs - mins) / 2
+    new_center = numpy.matmul(linear, center[..., None])[..., 0] + translation
+    new_extent = numpy.matmul(numpy.abs(linear), extent[..., None])[..., 0]
+
+    if out_mins is None:
+        out_mins = numpy.empty_like(new_center, dtype=DTYPE)
+    if out_maxs is None:
+        out_maxs = numpy.empty_like(new_center, dtype=DTYPE)
+    numpy.subtract(new_center, new_extent, out=out_mins)
+    numpy.add(new_center, new_extent, out=out_maxs)
+    return out_mins, out_maxs
+
+def to_gl(m, out=None):
+    """ Convert matrices to OpenGL's column-major float32 layout, for uploading to uniforms or buffers. """
+    if out is None:
+        out = numpy.empty(m.shape, dtype='float32')
+    out[...] = numpy.swapaxes(m, -1, -2)
+    return out
@@ -0,0 +1,103 @@
+"""
+Persistent cache of GL context probing results.
+
+Finding a working GL context means trying profile and version combinations until the driver accepts one, which is slow.
+The working combination is remembered per windowing driver, so subsequent runs can try it first.
+The GL driver that accepted it is stored alongside, so driver changes show up in the logs.
+"""
+import os
+import json
+from OpenGL import GL
+
+import rave.log
+
+
+class ProbeCache:
+    """ A JSON file of working (profile, major, minor) context versions, keyed by windowing driver. """
+    PATH = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'rave', 'glprobe.json')
+
+    def __init__(self, path=None):
+        self.path = path or self.PATH
+        self.enabled = True
+        self._entries = None
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            self._entries = {}
+            if self.enabled:
+                try:
+                    with open(self.path, 'r') as f:
+                        self._entries = json.load(f)
+                except (OSError, ValueError):
+                    pass
+        return self._entries
+
+    def get(self, key):
+        """ Get the working (profile, major, minor) tuple for windowing driver `key`, or None if not known. """
+        entry = self.entries.get(key)
+        if not entry:
+            return None
+        return (entry['profile'], entry['major'], entry['minor'])
+
+    def order(self, key, versions):
+        """ Reorder list of (profile, major, minor) tuples `versions` so the known working version for `key` is tried first. """
+        known = self.get(key)
+        if known not in versions:
+            return versions
+        return [ known ] + [ v for v in versions if v != known ]
+
+    def store(self, key, context):
+        """ Remember the version of `context` as working for `key`. Must be called with the context current. """
+        driver = get_driver()
+        version = (context.profile, context.major, context.minor)
+
+        entry = self.entries.get(key)
+        if entry and self.get(key) == version and entry.get('driver') == driver:
+            return
+        if entry and entry.get('driver') != driver:
+            _log.debug('GL driver changed from {old} to {new}, updating probe cache.', old=entry.get('driver'), new=driver)
+
+        self.entries[key] = { 'profile': context.profile, 'major': context.major, 'minor': context.minor, 'driver': driver }
+        self._write()
+
+    def forget(self, key):
+        if self.entries.pop(key, None):
+            self._write()
+
+    def _write(self):
+        if not self.enabled:
+            return
+        temp = self.path + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temp, 'w') as f:
+                json.dump(self.entries, f)
+            os.replace(temp, self.path)
+        except OSError as e:
+            _log.warn('Could not write GL probe cache: {err}', err=e)
+
+
+def get_driver():
+    """ Get a string identifying the GL driver of the current context. """
+    return ' / '.join((GL.glGetString(name) or b'').decode('utf-8', 'replace') for name in (GL.GL_VENDOR, GL.GL_RENDERER, GL.GL_VERSION))
+
+
+## API.
+
+def get():
+    return _cache
+
+def set_path(path):
+    _cache.path = path
+    _cache._entries = None
+
+def set_enabled(enabled):
+    _cache.enabled = enabled
+    _cache._entries = None
+
+
+## Internals.
+
+_log = rave.log.get(__name__)
+_cache = ProbeCache()
@@ -2,14 +2,15 @@
 OpenGL 3.x backend for rave.
 """
 import sys
+import weakref
 
 import rave.log
 import rave.backends
 
 from .. import common
-from . import shaders
+from . import shaders, upload, text
 from .window import create_gl_window
-from .texture import Texture, Image
+from .texture import Texture, Image, supported_compressions
 
 __provides__ = [ 'opengl' ]
 __requires__ = [ 'opengl_manager' ]
@@ -26,12 +27,16 @@ def load(opengl_manager):
     rave.backends.register(rave.backends.BACKEND_VIDEO, sys.modules[__name__])
 
 def load_backend(category):
+    global _probe
     # Attempt to load a GL context to see if we support it. If we don't, create_window() will raise an exception.
-    window = create_window('OpenGL Test', 1, 1, testing=True, visible=False)
-    window.close()
+    # Keep the window around, so the first real window can reuse it rather than create another context.
+    _probe = create_window('OpenGL Test', 1, 1, testing=True, visible=False)
 
 def unload():
-    global _manager
+    global _manager, _probe
+    if _probe:
+        _probe.close()
+        _probe = None
     _manager = None
 
     rave.backends.remove(rave.backends.BACKEND_VIDEO, sys.modules[__name__])
@@ -40,23 +45,69 @@ def unload():
 ## Video backend API.
 
 def create_window(*args, testing=False, **kwargs):
-    window = _manager.create_window(*args, **kwargs)
-    _manager.create_gl_context(window, common.get_version_range('core', (3, 0), (3, 3)))
+    global _probe
+
+    if _probe and not testing:
+        # Turn the probe window into the requested window.
+        window, _probe = _probe, None
+        _manager.configure_window(window, *args, **kwargs)
+    else:
+        window = _manager.create_window(*args, **kwargs)
+        create_gl_context(window)
 
     if not testing:
         # Dump some info.
         common.dump_info(window.gl_context)
     return window
 
+def create_gl_context(window):
+    global _compressions
+    # Share textures, buffers and programs with existing windows.
+    share = next((context for context in _contexts if context.context), None)
+    if share:
+        _manager.create_gl_context(window, None, share=share)
+        _contexts.add(window.gl_context)
+        return
+
+    # Try the version that worked last time for this driver first.
+    cache = common.probes.get()
+    key = _manager.get_driver_name()
+    versions = cache.order(key, common.get_version_range('core', (3, 0), (3, 3)))
+
+    try:
+        _manager.create_gl_context(window, versions)
+    except:
+        cache.forget(key)
+        raise
+
+    _contexts.add(window.gl_context)
+    window.gl_context.make_current()
+    cache.store(key, window.gl_context)
+    _compressions = supported_compressions(window.gl_context)
+
 def handle_events():
     _manager.handle_events()
 
+def wait_events(timeout):
+    return _manager.wait_events(timeout)
+
 def create_drawable(data):
-    texture = Texture(data.width, data.height, data.get_data())
+    # No GL calls are made here, so this is safe to call from resource loading threads.
+    if data.pixel_format.compressed and data.pixel_format.compression not in _compressions:
+        # Reject now rather than fail halfway through a frame when uploading.
+        raise ValueError('{} compressed textures are not supported by the GL driver.'.format(data.pixel_format.compression))
+    texture = Texture(data.width, data.height, pixel_format=data.pixel_format)
+    upload.submit(texture, data)
     return Image(texture)
 
+def create_font(data):
+    return text.Font(data)
+
 
 ## Internals.
 
 _log = rave.log.get(__name__)
 _manager = None
+_probe = None
+_contexts = weakref.WeakSet()
+_compressions = set()
@@ -0,0 +1,421 @@
+"""
+Render-to-texture composition and post-processing.
+
+The compositor draws a window's layers. Layers can be given an offscreen target at a (possibly reduced) resolution scale,
+in which case their contents are cached and only re-rendered when the layer changed since this compositor last rendered it,
+is animated, or the compositor was invalidated. As cached layers do not bind their textures while being reused, the textures
+each layer used are recorded and marked as used for texture streaming on every frame the layer is displayed. After all layers are drawn, an optional chain of fullscreen passes (fades, blurs, color grading, ...)
+is applied, ping-ponging between offscreen targets that are pooled and reused across frames.
+"""
+from OpenGL import GL
+
+import rave.log
+from . import shaders, streaming
+
+
+## Render targets.
+
+class RenderTarget:
+    """ An offscreen framebuffer with a color texture attachment. """
+    __slots__ = ('width', 'height', 'texture', 'framebuffer')
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+        self.texture = GL.glGenTextures(1)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, self.texture)
+        GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGBA8, width, height, 0, GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, None)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_S, GL.GL_CLAMP_TO_EDGE)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_T, GL.GL_CLAMP_TO_EDGE)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+
+        self.framebuffer = GL.glGenFramebuffers(1)
+        GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, self.framebuffer)
+        GL.glFramebufferTexture2D(GL.GL_FRAMEBUFFER, GL.GL_COLOR_ATTACHMENT0, GL.GL_TEXTURE_2D, self.texture, 0)
+        status = GL.glCheckFramebufferStatus(GL.GL_FRAMEBUFFER)
+        GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, 0)
+
+        if status != GL.GL_FRAMEBUFFER_COMPLETE:
+            self.delete()
+            raise RuntimeError('Could not create {}x{} render target: framebuffer status {:#x}'.format(width, height, status))
+
+    def __repr__(self):
+        return '<{}: {}x{}>'.format(self.__class__.__qualname__, self.width, self.height)
+
+    @property
+    def size(self):
+        return (self.width, self.height)
+
+    def bind(self):
+        GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, self.framebuffer)
+        GL.glViewport(0, 0, self.width, self.height)
+
+    def delete(self):
+        if self.framebuffer:
+            GL.glDeleteFramebuffers(1, [ self.framebuffer ])
+            self.framebuffer = None
+        if self.texture:
+            GL.glDeleteTextures([ self.texture ])
+            self.texture = None
+
+
+class TargetPool:
+    """ A pool of render targets, so intermediate targets are reused rather than reallocated every frame. """
+
+    def __init__(self):
+        self.free = {}
+
+    def acquire(self, width, height):
+        targets = self.free.get((width, height))
+        if targets:
+            return targets.pop()
+        return RenderTarget(width, height)
+
+    def release(self, target):
+        self.free.setdefault(target.size, []).append(target)
+
+    def trim(self, keep=None):
+        """ Delete all pooled targets, except those of size `keep`. """
+        for size in list(self.free):
+            if size == keep:
+                continue
+            for target in self.free.pop(size):
+                target.delete()
+
+
+## Passes.
+
+class Pass:
+    """
+    A fullscreen post-processing pass. Subclasses provide a fragment shader in `FRAGMENT`, which samples the output of
+    the previous pass from `u_source` at `v_texcoord`, and set their own uniforms in `setup()`.
+    Set `animated` while the pass changes every frame, such as during a transition.
+    """
+    FRAGMENT = None
+
+    def __init__(self):
+        self.enabled = True
+        self.animated = False
+
+    def setup(self, program):
+        """ Set pass-specific uniforms on `program`. """
+        pass
+
+class FadePass(Pass):
+    """ Fade towards a solid color. """
+    FRAGMENT = """
+    #version 330 core
+    in vec2 v_texcoord;
+    out vec4 o_color;
+
+    uniform sampler2D u_source;
+    uniform vec4 u_color;
+    uniform float u_amount;
+
+    void main(void) {
+        o_color = mix(texture(u_source, v_texcoord), u_color, u_amount);
+    }
+    """.strip()
+
+    def __init__(self, color=(0.0, 0.0, 0.0, 1.0), amount=0.0):
+        super().__init__()
+        self.color = color
+        self.amount = amount
+
+    def setup(self, program):
+        GL.glUniform4f(program.get_index('u_color'), *self.color)
+        GL.glUniform1f(program.get_index('u_amount'), self.amount)
+
+class BlurPass(Pass):
+    """ A single direction of a separable gaussian blur. Use `blur()` to get both directions. """
+    FRAGMENT = """
+    #version 330 core
+    in vec2 v_texcoord;
+    out vec4 o_color;
+
+    uniform sampler2D u_source;
+    uniform vec2 u_texel;
+    uniform vec2 u_direction;
+
+    const float weights[5] = float[](0.227027, 0.1945946, 0.1216216, 0.054054, 0.016216);
+
+    void main(void) {
+        vec2 step = u_texel * u_direction;
+        vec4 color = texture(u_source, v_texcoord) * weights[0];
+        for (int i = 1; i < 5; i++) {
+            color += texture(u_source, v_texcoord + step * float(i)) * weights[i];
+            color += texture(u_source, v_texcoord - step * float(i)) * weights[i];
+        }
+        o_color = color;
+    }
+    """.strip()
+
+    def __init__(self, radius=1.0, horizontal=True):
+        super().__init__()
+        self.radius = radius
+        self.horizontal = horizontal
+
+    def setup(self, program):
+        if self.horizontal:
+            GL.glUniform2f(program.get_index('u_direction'), self.radius, 0.0)
+        else:
+            GL.glUniform2f(program.get_index('u_direction'), 0.0, self.radius)
+
+class ColorGradePass(Pass):
+    """ Transform colors by a 4x4 color matrix (row-major, acting on RGBA column vectors) and offset. """
+    FRAGMENT = """
+    #version 330 core
+    in vec2 v_texcoord;
+    out vec4 o_color;
+
+    uniform sampler2D u_source;
+    uniform mat4 u_matrix;
+    uniform vec4 u_offset;
+
+    void main(void) {
+        o_color = clamp(u_matrix * texture(u_source, v_texcoord) + u_offset, 0.0, 1.0);
+    }
+    """.strip()
+    IDENTITY = (
+        1.0, 0.0, 0.0, 0.0,
+        0.0, 1.0, 0.0, 0.0,
+        0.0, 0.0, 1.0, 0.0,
+        0.0, 0.0, 0.0, 1.0
+    )
+
+    def __init__(self, matrix=IDENTITY, offset=(0.0, 0.0, 0.0, 0.0)):
+        super().__init__()
+        self.matrix = matrix
+        self.offset = offset
+
+    def setup(self, program):
+        GL.glUniformMatrix4fv(program.get_index('u_matrix'), 1, GL.GL_TRUE, self.matrix)
+        GL.glUniform4f(program.get_index('u_offset'), *self.offset)
+
+def blur(radius=1.0):
+    """ Get the passes for a gaussian blur with the given radius, in texels. """
+    return [ BlurPass(radius, horizontal=True), BlurPass(radius, horizontal=False) ]
+
+
+## Compositor.
+
+class Compositor:
+    """ Composes layers and applies post-processing passes for a single window. """
+    VERTEX = """
+    #version 330 core
+    out vec2 v_texcoord;
+
+    void main(void) {
+        // A single triangle covering the entire viewport.
+        vec2 position = vec2((gl_VertexID << 1) & 2, gl_VertexID & 2);
+        v_texcoord = position;
+        gl_Position = vec4(position * 2.0 - 1.0, 0.0, 1.0);
+    }
+    """.strip()
+    BLIT = """
+    #version 330 core
+    in vec2 v_texcoord;
+    out vec4 o_color;
+
+    uniform sampler2D u_source;
+
+    void main(void) {
+        o_color = texture(u_source, v_texcoord);
+    }
+    """.strip()
+
+    def __init__(self, clear_color=(1.0, 1.0, 1.0, 1.0)):
+        self.clear_color = clear_color
+        self.layer_scales = {}
+        self.layer_targets = {}
+        # Layer generations our cached targets were rendered at.
+        self.layer_generations = {}
+        # Textures used by each layer when it was last rendered.
+        self.layer_textures = {}
+        self.passes = []
+        self.pool = TargetPool()
+        self.vao = None
+        self.size = None
+        self.invalidated = True
+
+
+    ## API.
+
+    def set_layer_scale(self, name, scale):
+        """
+        Render layer `name` to a cached offscreen target at `scale` times the window resolution,
+        or directly to the window if `scale` is None.
+        """
+        if scale is None:
+            self.layer_scales.pop(name, None)
+            target = self.layer_targets.pop(name, None)
+            self.layer_generations.pop(name, None)
+            self.layer_textures.pop(name, None)
+            if target:
+                target.delete()
+        else:
+            self.layer_scales[name] = scale
+        self.invalidate()
+
+    def add_pass(self, p):
+        self.passes.append(p)
+        self.invalidate()
+
+    def remove_pass(self, p):
+        self.passes.remove(p)
+        self.invalidate()
+
+    def invalidate(self):
+        """ Force all cached layers to be re-rendered on the next frame. """
+        self.invalidated = True
+
+    @property
+    def animated(self):
+        return any(p.enabled and p.animated for p in self.passes)
+
+    def touch(self):
+        """ Mark the textures of all layers as used, for frames in which they are displayed without being rendered. """
+        for textures in self.layer_textures.values():
+            for texture in textures:
+                streaming.touch(texture)
+
+    def delete(self):
+        """ Release all render targets and GL objects. Must be called with the GL context current. """
+        for target in self.layer_targets.values():
+            target.delete()
+        self.layer_targets.clear()
+        self.layer_generations.clear()
+        self.layer_textures.clear()
+        self.pool.trim()
+        if self.vao:
+            GL.glDeleteVertexArrays(1, [ self.vao ])
+            self.vao = None
+
+
+    ## Rendering.
+
+    def render(self, layers, size, target=None, timer=None):
+        """ Render `layers` to a window of `size`. If `timer` is given, layer rendering and post-processing are timed on the GPU. """
+        if size != self.size:
+            self.size = size
+            self.pool.trim(keep=size)
+            self.invalidate()
+        if not self.vao:
+            self.vao = GL.glGenVertexArrays(1)
+
+        width, height = size
+        passes = [ p for p in self.passes if p.enabled ]
+
+        # With post-processing, compose the scene offscreen first.
+        scene = self.pool.acquire(width, height) if passes else None
+        self._bind_output(scene)
+        GL.glClearColor(*self.clear_color)
+        GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+
+        # Forget textures of layers that are no longer displayed, so they can age out.
+        names = { layer.name for layer in layers }
+        for name in list(self.layer_textures):
+            if name not in names:
+                del self.layer_textures[name]
+
+        for layer in layers:
+            scale = self.layer_scales.get(layer.name)
+            if scale is None:
+                self._render_layer(layer, target, timer)
+                continue
+
+            cached, fresh = self._layer_target(layer.name, scale)
+            if fresh or self.invalidated or layer.animated or self.layer_generations.get(layer.name) != layer.generation:
+                cached.bind()
+                GL.glClearColor(0.0, 0.0, 0.0, 0.0)
+                GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+                self._render_layer(layer, target, timer)
+                self.layer_generations[layer.name] = layer.generation
+                self._bind_output(scene)
+            else:
+                for texture in self.layer_textures.get(layer.name, ()):
+                    streaming.touch(texture)
+
+            # Layer contents have premultiplied alpha after being blended onto a transparent target,
+            # as drawables blend alpha separately with GL_ONE, GL_ONE_MINUS_SRC_ALPHA.
+            GL.glEnable(GL.GL_BLEND)
+            GL.glBlendFunc(GL.GL_ONE, GL.GL_ONE_MINUS_SRC_ALPHA)
+            self._draw(self._blit_program(), cached)
+
+        self.invalidated = False
+        if not passes:
+            return
+
+        # Ping-pong through the pass chain, with the last pass drawing to the window.
+        GL.glDisable(GL.GL_BLEND)
+        if timer:
+            timer.begin('gpu.postprocess')
+        source = scene
+        for i, p in enumerate(passes):
+            output = self.pool.acquire(width, height) if i < len(passes) - 1 else None
+            self._bind_output(output)
+
+            program = shaders.get_program(vertex=self.VERTEX, fragment=p.FRAGMENT)
+            program.use()
+            p.setup(program)
+            self._draw(program, source)
+
+            self.pool.release(source)
+            source = output
+        if timer:
+            timer.end()
+
+    def _render_layer(self, layer, target, timer):
+        with streaming.recording() as textures:
+            if timer:
+                timer.begin('gpu.layer.' + layer.name)
+            layer.render(target)
+            if timer:
+                timer.end()
+        self.layer_textures[layer.name] = textures
+
+    def _layer_target(self, name, scale):
+        """ Get the offscreen target for layer `name`, (re)allocating it if needed. Returns a (target, fresh) tuple. """
+        width = max(1, int(self.size[0] * scale))
+        height = max(1, int(self.size[1] * scale))
+
+        target = self.layer_targets.get(name)
+        if target and target.size == (width, height):
+            return target, False
+        if target:
+            target.delete()
+
+        _log.debug('Allocating {w}x{h} target for layer {name}.', w=width, h=height, name=name)
+        target = self.layer_targets[name] = RenderTarget(width, height)
+        return target, True
+
+    def _bind_output(self, output):
+        if output:
+            output.bind()
+        else:
+            GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, 0)
+            GL.glViewport(0, 0, *self.size)
+
+    def _blit_program(self):
+        return shaders.get_program(vertex=self.VERTEX, fragment=self.BLIT)
+
+    def _draw(self, program, source):
+        """ Draw `source` target over the entire viewport using `program`. """
+        program.use()
+        GL.glActiveTexture(GL.GL_TEXTURE0)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, source.texture)
+        GL.glUniform1i(program.get_index('u_source'), 0)
+        if 'u_texel' in program.attribs:
+            GL.glUniform2f(program.get_index('u_texel'), 1 / source.width, 1 / source.height)
+
+        GL.glBindVertexArray(self.vao)
+        GL.glDrawArrays(GL.GL_TRIANGLES, 0, 3)
+        GL.glBindVertexArray(0)
+
+
+## Internals.
+
+_log = rave.log.get(__name__)
@@ -0,0 +1,130 @@
+"""
+Persistent shader program cache.
+
+Linking programs from GLSL source is slow, so linked program binaries (as returned by glGetProgramBinary) are stored
+on disk, together with their reflected attribute, uniform and uniform block locations. Entries are keyed by a hash of
+the shader sources and the driver vendor, renderer and version, since program binaries are only valid for the driver
+that produced them.
+"""
+import os
+import json
+import struct
+import hashlib
+import ctypes
+from OpenGL import GL
+
+import rave.log
+
+
+class ShaderCache:
+    """ A directory of cached program binaries. """
+    PATH = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'rave', 'shaders')
+    HEADER = struct.Struct('<II')
+
+    def __init__(self, path=None):
+        self.path = path or self.PATH
+        self.enabled = True
+
+    def supported(self):
+        """ Whether the current context supports retrieving and loading program binaries. """
+        if not self.enabled or not bool(GL.glGetProgramBinary) or not bool(GL.glProgramBinary):
+            return False
+        return GL.glGetIntegerv(GL.GL_NUM_PROGRAM_BINARY_FORMATS) > 0
+
+    def key(self, *sources):
+        """ Get cache key for shader sources, for the driver of the current context. """
+        hash = hashlib.sha256()
+        for name in (GL.GL_VENDOR, GL.GL_RENDERER, GL.GL_VERSION):
+            hash.update(GL.glGetString(name) or b'')
+            hash.update(b'\0')
+        for source in sources:
+            hash.update((source or '').encode('utf-8'))
+            hash.update(b'\0')
+        return hash.hexdigest()
+
+    def load(self, key):
+        """ Load cached entry for `key`. Returns a (binary format, binary, reflection) tuple, or None if there is no valid entry. """
+        try:
+            with open(self._filename(key), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        try:
+            fmt, reflection_size = self.HEADER.unpack_from(data)
+            offset = self.HEADER.size
+            reflection = json.loads(data[offset:offset + reflection_size].decode('utf-8'))
+            binary = data[offset + reflection_size:]
+        except (struct.error, ValueError) as e:
+            _log.debug('Ignoring corrupt shader cache entry {key}: {err}', key=key, err=e)
+            self.remove(key)
+            return None
+
+        return fmt, binary, reflection
+
+    def store(self, key, fmt, binary, reflection):
+        """ Store program binary `binary` in binary format `fmt` and its reflection data (a JSON-serializable dict) under `key`. """
+        reflection_data = json.dumps(reflection).encode('utf-8')
+        filename = self._filename(key)
+        temp = filename + '.tmp'
+
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            with open(temp, 'wb') as f:
+                f.write(self.HEADER.pack(fmt, len(reflection_data)))
+                f.write(reflection_data)
+                f.write(binary)
+            # Make sure concurrent readers never see partially written entries.
+            os.replace(temp, filename)
+        except OSError as e:
+            _log.warn('Could not write shader cache entry {key}: {err}', key=key, err=e)
+
+    def remove(self, key):
+        """ Remove entry for `key`, if it exists. """
+        try:
+            os.remove(self._filename(key))
+        except OSError:
+            pass
+
+    def _filename(self, key):
+        return os.path.join(self.path, key + '.bin')
+
+
+def get_binary(program):
+    """ Retrieve binary for linked program `program`. Returns a (binary format, binary) tuple. """
+    size = GL.glGetProgramiv(program, GL.GL_PROGRAM_BINARY_LENGTH)
+    buf = (ctypes.c_ubyte * size)()
+    length = GL.GLsizei()
+    fmt = GL.GLenum()
+
+    GL.glGetProgramBinary(program, size, length, fmt, buf)
+    return fmt.value, bytes(buf[:length.value])
+
+def load_binary(fmt, binary):
+    """ Create a program from binary `binary` in binary format `fmt`. Returns None if the driver rejected the binary. """
+    program = GL.glCreateProgram()
+    buf = (ctypes.c_ubyte * len(binary)).from_buffer_copy(binary)
+    GL.glProgramBinary(program, fmt, buf, len(binary))
+
+    if GL.glGetProgramiv(program, GL.GL_LINK_STATUS) != GL.GL_TRUE:
+        GL.glDeleteProgram(program)
+        return None
+    return program
+
+
+## API.
+
+def get():
+    return _cache
+
+def set_path(path):
+    _cache.path = path
+
+def set_enabled(enabled):
+    _cache.enabled = enabled
+
+
+## Internals.
+
+_log = rave.log.get(__name__)
+_cache = ShaderCache()
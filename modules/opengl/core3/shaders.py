@@ -1,33 +1,103 @@
+import weakref
+import collections
 from OpenGL import GL
+import rave.log
+
+from . import shadercache, uniforms
 
 
 class ShaderError(Exception):
     pass
 
 
-class ShaderProgram:
-    __slots__ = ('vertex', 'fragment', 'geometry', 'program', 'attribs')
-    CACHE = {}
+class ProgramRegistry:
+    """
+    Registry of compiled shader programs for a single GL context (or group of sharing contexts).
+
+    Programs are weakly referenced, so they are released once nothing uses them anymore, apart from the `KEEP` most
+    recently requested ones, which are kept alive to avoid recompiling programs for drawables that come and go.
+    Since programs can be garbage collected while their context is not current, their GL objects are deleted
+    the next time `collect()` is called.
+    """
+    KEEP = 16
+
+    def __init__(self, context=None):
+        self.context = context
+        self.programs = weakref.WeakValueDictionary()
+        self.recent = collections.OrderedDict()
+        self.released = []
+
+    def __repr__(self):
+        return '<{} for {!r}: {} programs>'.format(self.__class__.__qualname__, self.context, len(self.programs))
 
-    def __new__(cls, vertex=None, fragment=None, geometry=None):
-        if (vertex, fragment, geometry) in cls.CACHE:
-            return cls.CACHE[vertex, fragment, geometry]
+    def get(self, vertex=None, fragment=None, geometry=None):
+        """ Get compiled program for the given shader sources, compiling it if needed. Must be called with the context current. """
+        key = (vertex, fragment, geometry)
+        program = self.programs.get(key)
+
+        if program is None:
+            program = ShaderProgram(vertex, fragment, geometry, registry=self)
+            program.compile()
+            self.programs[key] = program
+
+        self.recent[key] = program
+        self.recent.move_to_end(key)
+        if len(self.recent) > self.KEEP:
+            self.recent.popitem(last=False)
+
+        return program
 
-        instance = super().__new__(cls)
-        cls.CACHE[vertex, fragment, geometry] = instance
-        return instance
+    def release(self, program):
+        """ Schedule GL program object `program` for deletion. Safe to call from any thread or context. """
+        self.released.append(program)
+
+    def collect(self):
+        """ Delete GL program objects of released programs. Must be called with the context current. """
+        while self.released:
+            GL.glDeleteProgram(self.released.pop())
+
+    def clear(self):
+        """ Forget about all programs. Programs still in use will be released when they are collected. """
+        self.recent.clear()
+        self.programs.clear()
+
+
+class ShaderProgram:
+    __slots__ = ('vertex', 'fragment', 'geometry', 'program', 'attribs', 'blocks', 'registry', '__weakref__')
 
     def __del__(self):
         self.delete()
 
-    def __init__(self, vertex=None, fragment=None, geometry=None):
+    def __init__(self, vertex=None, fragment=None, geometry=None, registry=None):
         self.vertex = vertex
         self.fragment = fragment
         self.geometry = geometry
         self.program = None
         self.attribs = None
+        self.blocks = None
+        self.registry = registry
 
     def compile(self):
+        cache = shadercache.get()
+        key = None
+
+        if cache.supported():
+            key = cache.key(self.vertex, self.fragment, self.geometry)
+            cached = cache.load(key)
+            if cached:
+                fmt, binary, reflection = cached
+                program = shadercache.load_binary(fmt, binary)
+                if program:
+                    self.program = program
+                    self.attribs = reflection['attribs']
+                    self.blocks = reflection['blocks']
+                    self.bind_blocks()
+                    return
+
+                # The driver rejected the binary, probably due to a driver update. Fall back to compiling from source.
+                _log.debug('Cached program binary rejected by driver, recompiling.')
+                cache.remove(key)
+
         vtid = fgid = gmid = None
         try:
             if self.vertex:
@@ -45,8 +115,14 @@ class ShaderProgram:
                 GL.glDeleteShader(gmid)
             raise
 
-        self.program = self.link(vtid, fgid, gmid)
+        self.program = self.link(vtid, fgid, gmid, retrievable=key is not None)
         self.attribs = self.extract_attributes(self.program)
+        self.blocks = self.extract_blocks(self.program)
+        self.bind_blocks()
+
+        if key:
+            fmt, binary = shadercache.get_binary(self.program)
+            cache.store(key, fmt, binary, { 'attribs': self.attribs, 'blocks': self.blocks })
 
     def compile_shader(self, source, kind):
         shader = GL.glCreateShader(kind)
@@ -60,8 +136,10 @@ class ShaderProgram:
 
         return shader
 
-    def link(self, vertex, fragment, geometry):
+    def link(self, vertex, fragment, geometry, retrievable=False):
         program = GL.glCreateProgram()
+        if retrievable:
+            GL.glProgramParameteri(program, GL.GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL.GL_TRUE)
         if vertex:
             GL.glAttachShader(program, vertex)
         if fragment:
@@ -115,9 +193,35 @@ class ShaderProgram:
 
         return attribs
 
+    def extract_blocks(self, program):
+        blocks = {}
+        count = GL.glGetProgramiv(program, GL.GL_ACTIVE_UNIFORM_BLOCKS)
+
+        bufsize = 64
+        buf = (GL.GLchar * bufsize)()
+        namesize = GL.GLsizei()
+
+        for i in range(count):
+            GL.glGetActiveUniformBlockName(program, i, bufsize, namesize, buf)
+            name = buf.value.decode('utf-8')
+            blocks[name] = i
+
+        return blocks
+
+    def bind_blocks(self):
+        """ Bind known uniform blocks to their shared binding points. """
+        for name, index in self.blocks.items():
+            if name in uniforms.BLOCK_BINDINGS:
+                GL.glUniformBlockBinding(self.program, index, uniforms.BLOCK_BINDINGS[name])
+
     def delete(self):
         if self.program:
-            GL.glDeleteProgram(self.program)
+            if self.registry:
+                # We might not be on the right context right now: let the registry delete it later.
+                self.registry.release(self.program)
+            else:
+                GL.glDeleteProgram(self.program)
+            self.program = None
 
     def use(self):
         if not self.program:
@@ -126,3 +230,24 @@ class ShaderProgram:
 
     def get_index(self, attribute):
         return self.attribs[attribute]
+
+
+## API.
+
+def get_program(vertex=None, fragment=None, geometry=None):
+    """ Get compiled program from the registry for the current context. """
+    return _registry.get(vertex, fragment, geometry)
+
+def get_registry():
+    return _registry
+
+def set_registry(registry):
+    """ Set the program registry for the context that was just made current. """
+    global _registry
+    _registry = registry
+
+
+## Internals.
+
+_log = rave.log.get(__name__)
+_registry = ProgramRegistry()
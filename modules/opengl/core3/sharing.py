@@ -0,0 +1,37 @@
+"""
+GL object sharing between contexts.
+
+Contexts created to share objects with each other form a share group, identified by the context's `group` attribute.
+Textures, buffers and programs are visible to every context in a group, so per-group state such as the program registry
+and glyph atlas is kept here. Container objects, like vertex array objects and framebuffers, are not shared:
+drawables keep those per context, using `current()` to find out which context they are rendering with.
+"""
+import weakref
+
+
+## API.
+
+def get_shared(context, name, factory):
+    """ Get object `name` shared within the share group of `context`, creating it with `factory()` if it doesn't exist yet. """
+    objects = _groups.get(context.group)
+    if objects is None:
+        objects = _groups[context.group] = {}
+    shared = objects.get(name)
+    if shared is None:
+        shared = objects[name] = factory()
+    return shared
+
+def make_current(context):
+    """ Mark `context` as the context being rendered with. The context itself must have been made current already. """
+    global _current
+    _current = context
+
+def current():
+    """ Get the context being rendered with. """
+    return _current
+
+
+## Internals.
+
+_groups = weakref.WeakKeyDictionary()
+_current = None
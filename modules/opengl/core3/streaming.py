@@ -0,0 +1,121 @@
+"""
+Texture streaming.
+
+The texture manager keeps track of how much GPU memory textures use. When usage exceeds the configured budget,
+textures that have not been used for a while are downscaled, and eventually evicted. Once such a texture is used again,
+its full resolution version is re-streamed through the upload queue, showing the lower resolution version in the meantime.
+
+Textures are marked as used when they are bound. Content that is displayed without binding its textures again, such as
+cached compositor layers, can record the textures it used with `recording()` and `touch()` them on every frame it is shown.
+"""
+import contextlib
+import weakref
+
+import rave.log
+from . import upload
+
+
+class TextureManager:
+    """ Tracks texture GPU memory usage and keeps it under budget. """
+    BUDGET = 512 * 1024 * 1024
+    # Amount of frames a texture has to be unused before it may be downscaled or evicted.
+    UNUSED_FRAMES = 120
+    # Amount of times a texture can be downscaled by half before it is evicted.
+    MAX_LEVEL = 2
+    # Textures smaller than this (in either dimension) are not downscaled any further.
+    MIN_SIZE = 64
+
+    def __init__(self, budget=None):
+        self.budget = budget or self.BUDGET
+        self.frame = 0
+        self.usage = 0
+        self.sizes = weakref.WeakKeyDictionary()
+        self.recorded = None
+
+    def track(self, texture):
+        """ Update bookkeeping for `texture` after it was uploaded. """
+        self.usage += texture.gpu_size - self.sizes.get(texture, 0)
+        self.sizes[texture] = texture.gpu_size
+
+    def untrack(self, texture):
+        """ Remove `texture` from bookkeeping after its GPU storage was freed. """
+        self.usage -= self.sizes.pop(texture, 0)
+
+    def touch(self, texture):
+        """ Mark `texture` as used this frame, re-streaming it at full resolution if needed. """
+        texture.last_used = self.frame
+        if self.recorded is not None:
+            self.recorded.add(texture)
+
+        if (texture.level or not texture.ready) and texture.source is not None and not texture.pending:
+            upload.submit(texture, texture.source)
+
+    @contextlib.contextmanager
+    def recording(self):
+        """ Record the textures touched within the context in the yielded set, which does not keep them alive. """
+        previous = self.recorded
+        self.recorded = textures = weakref.WeakSet()
+        try:
+            yield textures
+        finally:
+            self.recorded = previous
+            if previous is not None:
+                previous.update(textures)
+
+    def end_frame(self):
+        """ Advance the frame counter and trim textures if we are over budget. Must be called with the GL context current. """
+        self.frame += 1
+        if self.usage > self.budget:
+            self.trim()
+
+    def trim(self):
+        """ Downscale or evict least recently used textures until we are within budget. """
+        cutoff = self.frame - self.UNUSED_FRAMES
+        # Without source data, a texture could not be streamed back in again.
+        candidates = [ t for t in self.sizes.keys() if t.last_used < cutoff and t.source is not None and not t.pending ]
+        candidates.sort(key=lambda t: t.last_used)
+
+        for texture in candidates:
+            if self.usage <= self.budget:
+                break
+
+            level = texture.level + 1
+            if level <= min(self.MAX_LEVEL, texture.max_level) and min(texture.width, texture.height) >> level >= self.MIN_SIZE:
+                _log.trace('Downscaling texture {} to level {}.', texture.texture, level)
+                texture.upload_image(texture.source, level=level)
+            else:
+                _log.trace('Evicting texture {}.', texture.texture)
+                texture.evict()
+
+        if self.usage > self.budget:
+            _log.debug('Texture memory usage over budget after trimming: {} > {} bytes.', self.usage, self.budget)
+
+
+## API.
+
+def track(texture):
+    _manager.track(texture)
+
+def untrack(texture):
+    _manager.untrack(texture)
+
+def touch(texture):
+    _manager.touch(texture)
+
+def recording():
+    return _manager.recording()
+
+def end_frame():
+    _manager.end_frame()
+
+def get_usage():
+    return _manager.usage
+
+def set_budget(budget):
+    _manager.budget = budget
+
+
+## Internals.
+
+_log = rave.log.get(__name__)
+_manager = TextureManager()
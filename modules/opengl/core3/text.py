@@ -0,0 +1,458 @@
+"""
+Text rendering through a dynamic glyph atlas.
+
+Glyphs are rasterized on demand by the font's FontData and packed into a single-channel atlas texture shared by all fonts.
+Shaped runs, the laid out glyph quads for a (font, size, string, wrap width) combination, are cached,
+so redrawing or recreating the same text does not shape it again. Every text drawable is a single batched draw call,
+and revealing text incrementally only changes the amount of vertices drawn.
+"""
+import collections
+import ctypes
+import weakref
+import numpy
+from OpenGL import GL
+
+import rave.log
+import rave.rendering
+from . import shaders, uniforms, sharing
+
+
+class Glyph:
+    """ A glyph packed into the atlas: its quad relative to the pen position on the baseline, texture coordinates and advance. """
+    __slots__ = ('x0', 'y0', 'x1', 'y1', 'u0', 'v0', 'u1', 'v1', 'advance')
+
+    def __init__(self, x0, y0, x1, y1, u0, v0, u1, v1, advance):
+        self.x0, self.y0, self.x1, self.y1 = x0, y0, x1, y1
+        self.u0, self.v0, self.u1, self.v1 = u0, v0, u1, v1
+        self.advance = advance
+
+    @property
+    def empty(self):
+        return self.x0 == self.x1
+
+
+class ShapedRun:
+    """
+    Laid out text: interleaved (x, y, u, v) vertices for six vertices per visible glyph, and for every character index
+    the amount of glyph quads preceding it, so a prefix of the text can be drawn by limiting the vertex count.
+    """
+    __slots__ = ('vertices', 'offsets', 'width', 'height')
+
+    def __init__(self, vertices, offsets, width, height):
+        self.vertices = vertices
+        self.offsets = offsets
+        self.width = width
+        self.height = height
+
+    def quads(self, count=None):
+        """ Get the amount of quads to draw to show the first `count` characters, or all if `count` is None. """
+        if count is None or count >= len(self.offsets) - 1:
+            return self.offsets[-1]
+        return self.offsets[max(0, count)]
+
+
+class GlyphAtlas:
+    """
+    A single-channel texture that glyphs are packed into using a shelf packer.
+    When the atlas runs out of space, it is cleared and its `generation` is bumped, so users know to re-shape their text.
+    """
+    SIZE = 1024
+    PADDING = 1
+    KEEP_RUNS = 256
+
+    def __init__(self, size=None):
+        self.size = size or self.SIZE
+        self.pixels = numpy.zeros((self.size, self.size), dtype='uint8')
+        self.texture = None
+        self.generation = 0
+        self.glyphs = {}
+        self.runs = collections.OrderedDict()
+        self._reset_packer()
+
+    def __repr__(self):
+        return '<{}: {}x{}, {} glyphs, generation {}>'.format(self.__class__.__qualname__, self.size, self.size, len(self.glyphs), self.generation)
+
+    def _reset_packer(self):
+        self.shelf_x = self.PADDING
+        self.shelf_y = self.PADDING
+        self.shelf_height = 0
+        self.dirty = None
+
+    def clear(self):
+        """ Forget all packed glyphs and shaped runs. """
+        self.pixels[...] = 0
+        self.glyphs.clear()
+        self.runs.clear()
+        self.generation += 1
+        self._reset_packer()
+        self.dirty = (0, self.size)
+        # Text drawn with the old contents needs to be re-shaped.
+        rave.rendering.request_redraw()
+
+
+    ## Glyphs.
+
+    def get_glyph(self, font, size, char):
+        """ Get Glyph for character `char` of `font` at `size`, rasterizing and packing it if needed. Returns None if the atlas is full. """
+        key = (font, size, char)
+        glyph = self.glyphs.get(key)
+        if glyph:
+            return glyph
+
+        data = font.data.get_glyph(char, size)
+        if not data.width or not data.height:
+            glyph = Glyph(0, 0, 0, 0, 0, 0, 0, 0, data.advance)
+        else:
+            position = self._pack(data.width, data.height)
+            if not position:
+                return None
+            x, y = position
+
+            bitmap = numpy.frombuffer(data.data, dtype='uint8').reshape((data.height, data.width))
+            self.pixels[y:y + data.height, x:x + data.width] = bitmap
+            self._mark_dirty(y, y + data.height)
+
+            glyph = Glyph(
+                data.left, -data.top, data.left + data.width, data.height - data.top,
+                x / self.size, y / self.size, (x + data.width) / self.size, (y + data.height) / self.size,
+                data.advance
+            )
+
+        self.glyphs[key] = glyph
+        return glyph
+
+    def _pack(self, width, height):
+        padded_width = width + self.PADDING
+        padded_height = height + self.PADDING
+        if padded_width > self.size or padded_height > self.size:
+            return None
+
+        if self.shelf_x + padded_width > self.size:
+            # Start a new shelf.
+            self.shelf_y += self.shelf_height
+            self.shelf_x = self.PADDING
+            self.shelf_height = 0
+        if self.shelf_y + padded_height > self.size:
+            return None
+
+        position = (self.shelf_x, self.shelf_y)
+        self.shelf_x += padded_width
+        self.shelf_height = max(self.shelf_height, padded_height)
+        return position
+
+    def _mark_dirty(self, start, end):
+        if self.dirty:
+            self.dirty = (min(self.dirty[0], start), max(self.dirty[1], end))
+        else:
+            self.dirty = (start, end)
+
+
+    ## Shaping.
+
+    def shape(self, font, size, string, width=None):
+        """ Get ShapedRun for `string` in `font` at `size`, word-wrapped at `width` pixels if given. """
+        key = (font, size, string, width)
+        run = self.runs.get(key)
+        if run:
+            self.runs.move_to_end(key)
+            return run
+
+        run = self._shape(font, size, string, width)
+        if not run:
+            # Out of space: start over with an empty atlas, so at least the text at hand fits.
+            _log.debug('Glyph atlas full, clearing.')
+            self.clear()
+            run = self._shape(font, size, string, width)
+            if not run:
+                _log.err('Text does not fit in {size}x{size} glyph atlas: {text!r}', size=self.size, text=string)
+                run = ShapedRun(numpy.zeros((0, 4), dtype='float32'), [0] * (len(string) + 1), 0, 0)
+
+        self.runs[key] = run
+        if len(self.runs) > self.KEEP_RUNS:
+            self.runs.popitem(last=False)
+        return run
+
+    def _shape(self, font, size, string, width):
+        ascent, descent, line_height = font.data.get_metrics(size)
+        quads = []
+        offsets = []
+
+        pen_x = 0
+        baseline = ascent
+        max_width = 0
+        # Position in the current line where it can be broken, as a (character index, quad index, pen x) tuple.
+        wrap_point = None
+        previous = None
+
+        for i, char in enumerate(string):
+            offsets.append(len(quads))
+
+            if char == '\n':
+                max_width = max(max_width, pen_x)
+                pen_x = 0
+                baseline += line_height
+                wrap_point = None
+                previous = None
+                continue
+
+            glyph = self.get_glyph(font, size, char)
+            if not glyph:
+                return None
+            if previous:
+                pen_x += font.data.get_kerning(previous, char, size)
+            previous = char
+
+            if char.isspace():
+                pen_x += glyph.advance
+                wrap_point = (i + 1, len(quads), pen_x)
+                continue
+
+            if width and wrap_point and pen_x + glyph.x1 > width:
+                # Move the current word to the next line.
+                _, first_quad, shift = wrap_point
+                max_width = max(max_width, shift)
+                for quad in quads[first_quad:]:
+                    quad[0] -= shift
+                    quad[2] -= shift
+                    quad[1] += line_height
+                    quad[3] += line_height
+                pen_x -= shift
+                baseline += line_height
+                wrap_point = None
+
+            if not glyph.empty:
+                quads.append([
+                    pen_x + glyph.x0, baseline + glyph.y0, pen_x + glyph.x1, baseline + glyph.y1,
+                    glyph.u0, glyph.v0, glyph.u1, glyph.v1
+                ])
+            pen_x += glyph.advance
+
+        offsets.append(len(quads))
+        max_width = max(max_width, pen_x)
+
+        # Expand quads into two triangles each.
+        q = numpy.array(quads, dtype='float32').reshape((-1, 8))
+        vertices = numpy.empty((len(q), 6, 4), dtype='float32')
+        for n, (x, y, u, v) in enumerate(((0, 1, 4, 5), (2, 1, 6, 5), (0, 3, 4, 7), (2, 1, 6, 5), (2, 3, 6, 7), (0, 3, 4, 7))):
+            vertices[:, n, 0] = q[:, x]
+            vertices[:, n, 1] = q[:, y]
+            vertices[:, n, 2] = q[:, u]
+            vertices[:, n, 3] = q[:, v]
+
+        return ShapedRun(vertices.reshape((-1, 4)), offsets, max_width, baseline + descent)
+
+
+    ## Rendering.
+
+    def flush(self):
+        """ Upload changed parts of the atlas to the GPU. Must be called with the context current. """
+        if not self.texture:
+            self.texture = GL.glGenTextures(1)
+            GL.glBindTexture(GL.GL_TEXTURE_2D, self.texture)
+            GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_R8, self.size, self.size, 0, GL.GL_RED, GL.GL_UNSIGNED_BYTE, None)
+            GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_S, GL.GL_CLAMP_TO_EDGE)
+            GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_T, GL.GL_CLAMP_TO_EDGE)
+            GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
+            GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
+            self.dirty = (0, self.size)
+        else:
+            GL.glBindTexture(GL.GL_TEXTURE_2D, self.texture)
+
+        if self.dirty:
+            start, end = self.dirty
+            rows = numpy.ascontiguousarray(self.pixels[start:end])
+            GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 1)
+            GL.glTexSubImage2D(GL.GL_TEXTURE_2D, 0, 0, start, self.size, end - start, GL.GL_RED, GL.GL_UNSIGNED_BYTE, rows)
+            GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 4)
+            self.dirty = None
+
+    def bind(self):
+        self.flush()
+        GL.glBindTexture(GL.GL_TEXTURE_2D, self.texture)
+
+    def delete(self):
+        if self.texture:
+            GL.glDeleteTextures([ self.texture ])
+            self.texture = None
+
+
+class Font:
+    """ A font that can create text drawables. """
+
+    def __init__(self, data):
+        self.data = data
+
+    def __repr__(self):
+        return '<{}: {}>'.format(self.__class__.__qualname__, self.data.name)
+
+    def create_text(self, string, size=16, color=(0.0, 0.0, 0.0, 1.0), width=None):
+        """ Create a Text drawable for `string` at `size`, word-wrapped at `width` pixels if given. """
+        return Text(self, string, size, color, width)
+
+    def measure(self, string, size=16, width=None):
+        """ Get the (width, height) in pixels `string` takes up at `size`. Must be called with the context current. """
+        run = _atlas.shape(self, size, string, width)
+        return run.width, run.height
+
+
+class Text(rave.rendering.Drawable):
+    """
+    A block of text. Set `position` to move it and `reveal` to show only the first characters, such as for typewriter effects.
+    Setting `string` reshapes the text on next render, reusing its GL objects. Shaping and GL setup are deferred until first render, so text can be created off the GL context thread.
+    """
+    FRAGMENT = """
+    #version 330 core
+    in vec2 v_texcoord;
+    out vec4 o_color;
+
+    uniform sampler2D u_atlas;
+    uniform vec4 u_color;
+
+    void main(void) {
+        o_color = vec4(u_color.rgb, u_color.a * texture(u_atlas, v_texcoord).r);
+    }
+    """.strip()
+    VERTEX = """
+    #version 330 core
+    {frame_block}
+
+    in vec2 a_vertex;
+    in vec2 a_texcoord;
+    out vec2 v_texcoord;
+
+    uniform vec2 u_position;
+
+    void main(void) {{
+        gl_Position = u_projection * u_view * vec4(a_vertex + u_position, 0.0, 1.0);
+        v_texcoord = a_texcoord;
+    }}""".strip().format(frame_block=uniforms.FRAME_BLOCK_SOURCE)
+
+    def __init__(self, font, string, size, color, width=None):
+        self.font = font
+        self._string = string
+        self.size = size
+        self.color = color
+        self.width = width
+        self._position = (0, 0)
+        self._reveal = None
+
+        self.run = None
+        self.atlas = None
+        self.generation = None
+        self.program = None
+        self.vbo = None
+        # Vertex array objects can't be shared between contexts, so we need one for every context we're drawn in.
+        self.vaos = weakref.WeakKeyDictionary()
+
+    def __repr__(self):
+        return '<{}: {!r} in {!r} at {}px>'.format(self.__class__.__qualname__, self.string, self.font, self.size)
+
+    @property
+    def string(self):
+        return self._string
+
+    @string.setter
+    def string(self, string):
+        if string != self._string:
+            self._string = string
+            # Force the geometry to be updated on next render.
+            self.generation = None
+            self.changed()
+
+    @property
+    def position(self):
+        """ Position of the text in window coordinates. """
+        return self._position
+
+    @position.setter
+    def position(self, position):
+        if position != self._position:
+            self._position = position
+            self.changed()
+
+    @property
+    def reveal(self):
+        """ Amount of characters to show, or None to show all of them. """
+        return self._reveal
+
+    @reveal.setter
+    def reveal(self, count):
+        if count != self._reveal:
+            self._reveal = count
+            self.changed()
+
+    @property
+    def length(self):
+        return len(self.string)
+
+    def prepare(self):
+        self.program = shaders.get_program(fragment=self.FRAGMENT, vertex=self.VERTEX)
+        self.vbo = GL.glGenBuffers(1)
+
+        self.program.use()
+        GL.glUniform1i(self.program.get_index('u_atlas'), 0)
+
+    def prepare_vao(self):
+        """ Create vertex array object for the current context. """
+        vao = GL.glGenVertexArrays(1)
+        GL.glBindVertexArray(vao)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vbo)
+        stride = 4 * 4
+        GL.glEnableVertexAttribArray(self.program.get_index('a_vertex'))
+        GL.glVertexAttribPointer(self.program.get_index('a_vertex'), 2, GL.GL_FLOAT, GL.GL_FALSE, stride, None)
+        GL.glEnableVertexAttribArray(self.program.get_index('a_texcoord'))
+        GL.glVertexAttribPointer(self.program.get_index('a_texcoord'), 2, GL.GL_FLOAT, GL.GL_FALSE, stride, ctypes.c_void_p(2 * 4))
+        GL.glBindVertexArray(0)
+        return vao
+
+    def update(self):
+        """ (Re-)shape the text and upload its geometry. """
+        self.atlas = _atlas
+        self.generation = _atlas.generation
+        self.run = _atlas.shape(self.font, self.size, self.string, self.width)
+
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vbo)
+        GL.glBufferData(GL.GL_ARRAY_BUFFER, self.run.vertices.nbytes, self.run.vertices, GL.GL_STATIC_DRAW)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+
+    def render(self, target):
+        if not self.program:
+            self.prepare()
+        context = sharing.current()
+        vao = self.vaos.get(context)
+        if not vao:
+            vao = self.vaos[context] = self.prepare_vao()
+        if self.atlas is not _atlas or self.generation != _atlas.generation:
+            self.update()
+
+        count = self.run.quads(self._reveal)
+        if not count:
+            return
+
+        self.program.use()
+        GL.glUniform2f(self.program.get_index('u_position'), *self._position)
+        GL.glUniform4f(self.program.get_index('u_color'), *self.color)
+        GL.glActiveTexture(GL.GL_TEXTURE0)
+        _atlas.bind()
+        GL.glEnable(GL.GL_BLEND)
+        # Keep destination alpha at a + d(1 - a), so text in cached layers ends up with correctly premultiplied alpha.
+        GL.glBlendFuncSeparate(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA, GL.GL_ONE, GL.GL_ONE_MINUS_SRC_ALPHA)
+        GL.glBindVertexArray(vao)
+        GL.glDrawArrays(GL.GL_TRIANGLES, 0, count * 6)
+
+
+## API.
+
+def get_atlas():
+    return _atlas
+
+def set_atlas(atlas):
+    """ Set the glyph atlas for the context that was just made current. """
+    global _atlas
+    _atlas = atlas
+
+
+## Internals.
+
+_log = rave.log.get(__name__)
+_atlas = GlyphAtlas()
@@ -1,28 +1,189 @@
 from OpenGL import GL
 import numpy
 import ctypes
+import weakref
 
-from . import shaders
+import rave.rendering
+from . import shaders, streaming, uniforms, sharing
+
+PixelFormat = rave.rendering.PixelFormat
+
+# GL internal formats for compressed pixel formats. S3TC formats are only available with EXT_texture_compression_s3tc.
+COMPRESSED_FORMATS = {
+    PixelFormat.FORMAT_BC1:        0x83F0, # GL_COMPRESSED_RGB_S3TC_DXT1_EXT
+    PixelFormat.FORMAT_BC1A:       0x83F1, # GL_COMPRESSED_RGBA_S3TC_DXT1_EXT
+    PixelFormat.FORMAT_BC2:        0x83F2, # GL_COMPRESSED_RGBA_S3TC_DXT3_EXT
+    PixelFormat.FORMAT_BC3:        0x83F3, # GL_COMPRESSED_RGBA_S3TC_DXT5_EXT
+    PixelFormat.FORMAT_ETC2_RGB8:  0x9274, # GL_COMPRESSED_RGB8_ETC2
+    PixelFormat.FORMAT_ETC2_RGBA8: 0x9278, # GL_COMPRESSED_RGBA8_ETC2_EAC
+}
+# Extensions providing the compressed formats, by compression name. ETC2 is core since GL 4.3.
+COMPRESSION_EXTENSIONS = {
+    'BC1':  'GL_EXT_texture_compression_s3tc',
+    'BC2':  'GL_EXT_texture_compression_s3tc',
+    'BC3':  'GL_EXT_texture_compression_s3tc',
+    'ETC2': 'GL_ARB_ES3_compatibility',
+}
+
+
+def supported_compressions(context):
+    """ Get the set of compression names `context` can sample from. Must be called with the context current. """
+    supported = set()
+    for compression, extension in COMPRESSION_EXTENSIONS.items():
+        if compression == 'ETC2' and (context.major, context.minor) >= (4, 3):
+            supported.add(compression)
+        elif context.has_extension(extension):
+            supported.add(compression)
+    return supported
 
 
 class Texture:
-    __slots__ = ('width', 'height', 'data', 'texture')
+    """
+    A 2D texture. The GL texture object is created lazily on first use, filled with a placeholder until
+    image data is uploaded through `upload()`, which makes it safe to construct textures outside of the GL context thread.
+
+    Textures keep a reference to their source image data, so the texture manager can downscale or evict them
+    when they are unused and re-stream them at full resolution once they are used again.
+    """
+    __slots__ = ('width', 'height', 'pixel_format', 'data', 'texture', 'ready', 'pending', 'source', 'level', 'last_used', '__weakref__')
+    PLACEHOLDER = (ctypes.c_uint32 * 1)(0x00000000)
 
-    def __init__(self, width, height, data):
+    def __init__(self, width, height, data=None, pixel_format=None):
         self.width = width
         self.height = height
-        self.data = data
+        self.pixel_format = pixel_format or PixelFormat.FORMAT_BGRA8888
+        self.data = None
+        self.texture = None
+        self.ready = False
+        self.pending = False
+        self.source = None
+        self.level = 0
+        self.last_used = 0
+
+        if data is not None:
+            self.upload(data)
+
+    def create(self):
         self.texture = GL.glGenTextures(1)
 
         GL.glBindTexture(GL.GL_TEXTURE_2D, self.texture)
-        GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGBA8, self.width, self.height, 0, GL.GL_BGRA, GL.GL_UNSIGNED_INT_8_8_8_8, ctypes.cast(self.data, ctypes.c_void_p))
+        GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGBA8, 1, 1, 0, GL.GL_BGRA, GL.GL_UNSIGNED_INT_8_8_8_8, self.PLACEHOLDER)
         GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_S, GL.GL_CLAMP_TO_EDGE)
         GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_T, GL.GL_CLAMP_TO_EDGE)
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR_MIPMAP_LINEAR)
         GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
         GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
 
+    def upload(self, data, pbo=None, level=0):
+        """
+        Upload pixel data to the texture and generate its mipmaps, optionally staging it through pixel buffer object `pbo`.
+        If `level` is given, the data is downscaled by a factor of 2 ** `level` before uploading.
+        """
+        if not self.texture:
+            self.create()
+        self.data = data
+
+        width, height = self.width, self.height
+        if level:
+            scaled = self._downscale(data, level)
+            height, width = scaled.shape
+            data = scaled.ctypes.data_as(ctypes.c_void_p)
+        size = width * height * 4
+
+        GL.glBindTexture(GL.GL_TEXTURE_2D, self.texture)
+        if pbo:
+            # Copy into the PBO and let the driver transfer it to the texture asynchronously.
+            GL.glBindBuffer(GL.GL_PIXEL_UNPACK_BUFFER, pbo)
+            GL.glBufferData(GL.GL_PIXEL_UNPACK_BUFFER, size, None, GL.GL_STREAM_DRAW)
+            staging = GL.glMapBufferRange(GL.GL_PIXEL_UNPACK_BUFFER, 0, size, GL.GL_MAP_WRITE_BIT | GL.GL_MAP_INVALIDATE_BUFFER_BIT)
+            ctypes.memmove(staging, data, size)
+            GL.glUnmapBuffer(GL.GL_PIXEL_UNPACK_BUFFER)
+            GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGBA8, width, height, 0, GL.GL_BGRA, GL.GL_UNSIGNED_INT_8_8_8_8, None)
+            GL.glBindBuffer(GL.GL_PIXEL_UNPACK_BUFFER, 0)
+        else:
+            GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGBA8, width, height, 0, GL.GL_BGRA, GL.GL_UNSIGNED_INT_8_8_8_8, ctypes.cast(data, ctypes.c_void_p))
+        GL.glGenerateMipmap(GL.GL_TEXTURE_2D)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+
+        self.level = level
+        self.ready = True
+        self.pending = False
+        streaming.track(self)
+
+    def upload_compressed(self, levels, level=0):
+        """
+        Upload precompressed image data, given as a list of (width, height, data) mipmap levels, largest first.
+        If `level` is given, mipmap levels larger than it are skipped.
+        """
+        if not self.texture:
+            self.create()
+
+        internal_format = COMPRESSED_FORMATS[self.pixel_format]
+        level = min(level, len(levels) - 1)
+        levels = levels[level:]
+
+        GL.glBindTexture(GL.GL_TEXTURE_2D, self.texture)
+        for i, (width, height, data) in enumerate(levels):
+            GL.glCompressedTexImage2D(GL.GL_TEXTURE_2D, i, internal_format, width, height, 0, len(data), data)
+        # Only sample from the levels we actually have, since we can't generate mipmaps for compressed data.
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAX_LEVEL, len(levels) - 1)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+
+        self.level = level
+        self.ready = True
+        self.pending = False
+        streaming.track(self)
+
+    def upload_image(self, image, pbo=None, level=0):
+        """ Upload ImageData instance `image`, downscaled by `level` mipmap levels. """
+        if self.pixel_format.compressed:
+            levels = image.get_mipmaps() or [ (image.width, image.height, image.get_data()) ]
+            self.upload_compressed(levels, level=level)
+        else:
+            self.upload(image.get_data(), pbo=pbo, level=level)
+
+    def _downscale(self, data, level):
+        """ Downscale packed 32-bit pixel data by a factor of 2 ** `level`, using nearest neighbour sampling. """
+        factor = 1 << level
+        pixels = numpy.ctypeslib.as_array(ctypes.cast(data, ctypes.POINTER(ctypes.c_uint32)), shape=(self.height, self.width))
+        return numpy.ascontiguousarray(pixels[::factor, ::factor])
+
+    def evict(self):
+        """ Free the GPU storage for this texture. It will show the placeholder until uploaded again. """
+        if self.texture:
+            GL.glDeleteTextures([ self.texture ])
+            self.texture = None
+        self.ready = False
+        self.level = 0
+        streaming.untrack(self)
+
+    @property
+    def size(self):
+        """ Size of the full resolution texture data in bytes. """
+        return self.pixel_format.data_size(self.width, self.height)
+
+    @property
+    def gpu_size(self):
+        """ Size of the texture data currently on the GPU in bytes, including mipmaps. """
+        if not self.ready:
+            return 0
+        width = max(1, self.width >> self.level)
+        height = max(1, self.height >> self.level)
+        # A full mipmap chain adds a third to the size of the base level.
+        return self.pixel_format.data_size(width, height) * 4 // 3
+
+    @property
+    def max_level(self):
+        """ The highest mipmap level this texture can be downscaled to. """
+        if self.pixel_format.compressed:
+            # We can only drop the precompressed levels we have.
+            return max(0, len(self.source.get_mipmaps()) - 1) if self.source else 0
+        return max(0, min(self.width, self.height).bit_length() - 1)
+
     def bind(self):
+        if not self.texture:
+            self.create()
+        streaming.touch(self)
         GL.glBindTexture(GL.GL_TEXTURE_2D, self.texture)
 
     def unbind(self):
@@ -42,66 +203,91 @@ class Image:
     """.strip()
     VERTEX = """
     #version 330 core
-        in vec2 a_vertex;
+    {frame_block}
+
+    in vec2 a_vertex;
     in vec2 a_texcoord;
     out vec2 v_texcoord;
 
-    void main(void) {
-        gl_Position = vec4(a_vertex, 0.0, 1.0);
+    void main(void) {{
+        gl_Position = u_projection * u_view * vec4(a_vertex, 0.0, 1.0);
         v_texcoord = a_texcoord;
-        v_texcoord.y = -v_texcoord.y;
-    }""".strip()
+    }}""".strip().format(frame_block=uniforms.FRAME_BLOCK_SOURCE)
 
     def __init__(self, tex):
+        # A quad covering the texture, in pixels.
+        w, h = tex.width, tex.height
         self.vertexes = numpy.array([
-            1000.0     , -1800.0,
-            -1000.0  , -1800.0,
-            1000.0     , 1800.0,
+            w, 0,
+            0, 0,
+            w, h,
 
-            -1000.0     ,1800.0,
-            -1000.0  , -1800.0,
-            1000.0     , 1800.0,
+            0, h,
+            0, 0,
+            w, h,
         ], dtype='float32')
 
         self.texcoords = numpy.array([
-            1280.0     , -720.0,
-            -1280.0  , -720.0,
-            1280.0     , 720.0,
+            1.0, 0.0,
+            0.0, 0.0,
+            1.0, 1.0,
 
-            -1280.0     , 720.0,
-            -1280.0  , -720.0,
-            1280.0     , 720.0,
+            0.0, 1.0,
+            0.0, 0.0,
+            1.0, 1.0,
         ], dtype='float32')
         self.tex = tex
-        self.program = shaders.ShaderProgram(fragment=self.FRAGMENT, vertex=self.VERTEX)
-        self.program.compile()
+        self.program = None
+        self.vertex_vbo = None
+        self.texcoords_vbo = None
+        # Vertex array objects can't be shared between contexts, so we need one for every context we're drawn in.
+        self.vaos = weakref.WeakKeyDictionary()
 
-        self.vao = GL.glGenVertexArrays(1)
+    def prepare(self):
+        """ Set up GL state for this image. This is deferred until first render, so images can be created off the GL context thread. """
+        self.program = shaders.get_program(fragment=self.FRAGMENT, vertex=self.VERTEX)
         self.vertex_vbo, self.texcoords_vbo = GL.glGenBuffers(2)
 
         self.program.use()
-        GL.glBindVertexArray(self.vao)
+        # Samplers don't change between draws, so set them once.
+        GL.glUniform1i(self.program.get_index('u_tex'), 0)
 
         GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vertex_vbo)
         GL.glBufferData(GL.GL_ARRAY_BUFFER, len(self.vertexes) * 2 * 4, self.vertexes, GL.GL_STATIC_DRAW)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.texcoords_vbo)
+        GL.glBufferData(GL.GL_ARRAY_BUFFER, len(self.texcoords) * 2 * 4, self.texcoords, GL.GL_STATIC_DRAW)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+
+    def prepare_vao(self):
+        """ Create vertex array object for the current context. """
+        vao = GL.glGenVertexArrays(1)
+        GL.glBindVertexArray(vao)
+
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vertex_vbo)
         GL.glEnableVertexAttribArray(self.program.get_index('a_vertex'))
         GL.glVertexAttribPointer(self.program.get_index('a_vertex'), 2, GL.GL_FLOAT, GL.GL_FALSE, 0, None)
 
         GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.texcoords_vbo)
-        GL.glBufferData(GL.GL_ARRAY_BUFFER, len(self.texcoords) * 2 * 4, self.texcoords, GL.GL_STATIC_DRAW)
         GL.glEnableVertexAttribArray(self.program.get_index('a_texcoord'))
         GL.glVertexAttribPointer(self.program.get_index('a_texcoord'), 2, GL.GL_FLOAT, GL.GL_FALSE, 0, None)
 
         GL.glBindVertexArray(0)
+        return vao
 
     def render(self, target):
+        if not self.program:
+            self.prepare()
+        context = sharing.current()
+        vao = self.vaos.get(context)
+        if not vao:
+            vao = self.vaos[context] = self.prepare_vao()
+
         self.program.use()
         self.tex.bind()
         GL.glEnable(GL.GL_BLEND);
-        GL.glBlendFunc(GL.GL_SRC_ALPHA,GL.GL_ONE_MINUS_SRC_ALPHA);
-        GL.glUniform1i(self.program.get_index('u_tex'), 0)
-        GL.glBindTexture(GL.GL_TEXTURE_2D, self.tex.texture)
-        GL.glBindVertexArray(self.vao)
+        # Keep destination alpha at a + d(1 - a), so textures in cached layers end up with correctly premultiplied alpha.
+        GL.glBlendFuncSeparate(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA, GL.GL_ONE, GL.GL_ONE_MINUS_SRC_ALPHA);
+        GL.glBindVertexArray(vao)
         GL.glDrawArrays(GL.GL_TRIANGLES, 0, 6)
         #GL.glBindVertexArray(0)
         #GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
@@ -0,0 +1,67 @@
+"""
+GPU timing through timer queries.
+
+Timer query results only become available once the GPU has finished the measured commands, which is usually a few frames
+after they were issued. Queries are therefore kept in flight and collected on later frames without stalling the pipeline.
+"""
+import collections
+from OpenGL import GL
+
+import rave.log
+
+
+class GpuTimer:
+    """ Measures GPU time spent on named sections of a frame using GL_TIME_ELAPSED queries. Sections can not be nested. """
+
+    def __init__(self, context=None):
+        self.context = context
+        self.free = []
+        self.pending = collections.deque()
+        self.active = None
+        self._supported = None
+
+    def supported(self):
+        """ Whether timer queries are supported on our context. Must be called with the context current. """
+        if self._supported is None:
+            if self.context:
+                self._supported = (self.context.major, self.context.minor) >= (3, 3) or self.context.has_extension('GL_ARB_timer_query')
+            else:
+                self._supported = True
+            if not self._supported:
+                _log.debug('Timer queries not supported, GPU timings will not be available.')
+        return self._supported
+
+    def begin(self, name):
+        query = self.free.pop() if self.free else GL.glGenQueries(1)
+        GL.glBeginQuery(GL.GL_TIME_ELAPSED, query)
+        self.active = (name, query)
+
+    def end(self):
+        GL.glEndQuery(GL.GL_TIME_ELAPSED)
+        self.pending.append(self.active)
+        self.active = None
+
+    def collect(self, profiler):
+        """ Record timings of finished queries with `profiler`, in the order they were issued. """
+        while self.pending:
+            name, query = self.pending[0]
+            if not GL.glGetQueryObjectiv(query, GL.GL_QUERY_RESULT_AVAILABLE):
+                break
+            elapsed = GL.glGetQueryObjectui64v(query, GL.GL_QUERY_RESULT)
+            profiler.record(name, elapsed / 1000000000, category='gpu')
+
+            self.pending.popleft()
+            self.free.append(query)
+
+    def delete(self):
+        """ Release all queries, discarding pending timings. Must be called with the context current. """
+        queries = self.free + [ query for _, query in self.pending ]
+        if queries:
+            GL.glDeleteQueries(len(queries), queries)
+        self.free = []
+        self.pending.clear()
+
+
+## Internals.
+
+_log = rave.log.get(__name__)
@@ -0,0 +1,75 @@
+"""
+Shared per-frame uniform data.
+
+Data that is identical for every draw in a frame, like the projection and view matrices, is stored in a single uniform
+buffer object that is updated and bound once per frame. Programs declaring a uniform block named after an entry in
+`BLOCK_BINDINGS` get that block bound to the matching binding point when they are compiled.
+"""
+import numpy
+from OpenGL import GL
+
+from .. import common
+
+
+FRAME_BLOCK = 'FrameData'
+FRAME_BINDING = 0
+# Mapping of uniform block names to their binding points.
+BLOCK_BINDINGS = {
+    FRAME_BLOCK: FRAME_BINDING
+}
+
+# GLSL declaration of the per-frame block, for inclusion in shaders.
+FRAME_BLOCK_SOURCE = """
+layout(std140) uniform FrameData {
+    mat4 u_projection;
+    mat4 u_view;
+    vec4 u_viewport;
+};
+""".strip()
+
+
+class FrameUniforms:
+    """ A uniform buffer holding the per-frame uniforms, laid out according to std140 rules. """
+    # Offsets in floats.
+    PROJECTION_OFFSET = 0
+    VIEW_OFFSET = 16
+    VIEWPORT_OFFSET = 32
+    SIZE = 36
+
+    def __init__(self):
+        self.buffer = None
+        self.data = numpy.zeros(self.SIZE, dtype='float32')
+        self.dirty = True
+
+    def update(self, projection, view, viewport):
+        """ Update the per-frame uniforms from row-major 4 x 4 matrices. Changes will be uploaded on the next `bind()`. """
+        data = numpy.concatenate([ numpy.ravel(common.to_gl(projection)), numpy.ravel(common.to_gl(view)), viewport ]).astype('float32')
+        if not numpy.array_equal(data, self.data):
+            self.data = data
+            self.dirty = True
+
+    def bind(self):
+        """ Upload changed uniforms and bind the buffer to its binding point. Must be called with the context current. """
+        if not self.buffer:
+            self.buffer = GL.glGenBuffers(1)
+            GL.glBindBuffer(GL.GL_UNIFORM_BUFFER, self.buffer)
+            GL.glBufferData(GL.GL_UNIFORM_BUFFER, self.data.nbytes, None, GL.GL_DYNAMIC_DRAW)
+            self.dirty = True
+
+        if self.dirty:
+            GL.glBindBuffer(GL.GL_UNIFORM_BUFFER, self.buffer)
+            GL.glBufferSubData(GL.GL_UNIFORM_BUFFER, 0, self.data.nbytes, self.data)
+            GL.glBindBuffer(GL.GL_UNIFORM_BUFFER, 0)
+            self.dirty = False
+
+        GL.glBindBufferBase(GL.GL_UNIFORM_BUFFER, FRAME_BINDING, self.buffer)
+
+    def delete(self):
+        if self.buffer:
+            GL.glDeleteBuffers(1, [ self.buffer ])
+            self.buffer = None
+
+
+def screen_projection(width, height):
+    """ Get an orthographic projection mapping pixel coordinates, with the origin at the top left, to clip space. """
+    return common.ortho(0, width, 0, height, 1, -1)
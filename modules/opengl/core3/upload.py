@@ -0,0 +1,87 @@
+"""
+Texture upload queue.
+
+GL calls have to be made on the thread the context is current on, but image decoding does not.
+Textures can be created from any thread and have their image data queued with `submit()`, after which the render loop
+uploads queued data within a per-frame time and byte budget through `drain()`, optionally using pixel buffer objects.
+Textures show a placeholder until their upload has finished.
+"""
+import collections
+import time
+from OpenGL import GL
+
+import rave.log
+
+
+class UploadQueue:
+    """ A queue of pending texture uploads. """
+    TIME_BUDGET = 0.004
+    BYTE_BUDGET = 16 * 1024 * 1024
+    USE_PBO = False
+
+    def __init__(self, time_budget=None, byte_budget=None, use_pbo=None):
+        self.time_budget = time_budget or self.TIME_BUDGET
+        self.byte_budget = byte_budget or self.BYTE_BUDGET
+        self.use_pbo = use_pbo if use_pbo is not None else self.USE_PBO
+        # Appending and popping from a deque is atomic, so this doubles as our thread-safe hand-off.
+        self.pending = collections.deque()
+        self.pbo = None
+
+    def __len__(self):
+        return len(self.pending)
+
+    def submit(self, texture, data):
+        """ Queue image data `data` to be uploaded to `texture`. Safe to call from any thread. """
+        texture.source = data
+        texture.pending = True
+        self.pending.append((texture, data))
+
+    def drain(self):
+        """
+        Upload queued image data until the time or byte budget for this frame is exhausted. At least one upload is done per call.
+        Must be called with the GL context current. Returns the amount of textures uploaded.
+        """
+        if not self.pending:
+            return 0
+
+        if self.use_pbo and not self.pbo:
+            self.pbo = GL.glGenBuffers(1)
+
+        start = time.perf_counter()
+        count = 0
+        uploaded = 0
+
+        while self.pending:
+            texture, data = self.pending.popleft()
+            texture.upload_image(data, pbo=self.pbo if self.use_pbo else None)
+            count += 1
+            uploaded += texture.size
+
+            if uploaded >= self.byte_budget or time.perf_counter() - start >= self.time_budget:
+                break
+
+        _log.trace('Uploaded {count} textures ({bytes} bytes), {left} pending.', count=count, bytes=uploaded, left=len(self.pending))
+        return count
+
+    def delete(self):
+        if self.pbo:
+            GL.glDeleteBuffers(1, [ self.pbo ])
+            self.pbo = None
+
+
+## API.
+
+def submit(texture, data):
+    _queue.submit(texture, data)
+
+def drain():
+    return _queue.drain()
+
+def pending():
+    return len(_queue)
+
+
+## Internals.
+
+_log = rave.log.get(__name__)
+_queue = UploadQueue()
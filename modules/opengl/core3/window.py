@@ -1,5 +1,9 @@
 from OpenGL import GL
 import rave.rendering
+import rave.profiling
+
+from .. import common
+from . import shaders, upload, streaming, uniforms, compositor, text, timers, sharing
 
 
 class Window(rave.rendering.Drawable):
@@ -8,6 +12,13 @@ class Window(rave.rendering.Drawable):
         self.context = context
         self.layers = []
         self.layer_names = {}
+        # Programs and glyphs are shared with every window whose context shares objects with ours.
+        self.programs = sharing.get_shared(context, 'programs', lambda: shaders.ProgramRegistry(context.group))
+        self.glyphs = sharing.get_shared(context, 'glyphs', text.GlyphAtlas)
+        self.uniforms = uniforms.FrameUniforms()
+        self.view = common.identity(4)
+        self.compositor = compositor.Compositor()
+        self.timer = timers.GpuTimer(context)
 
     def add_layer(self, layer):
         self.layers.append(layer)
@@ -16,17 +27,56 @@ class Window(rave.rendering.Drawable):
     def get_layer(self, name):
         return self.layer_names[name]
 
+    def invalidate(self):
+        """ Force cached window contents to be re-rendered. """
+        self.compositor.invalidate()
+
+    @property
+    def animated(self):
+        # Keep rendering while uploads are pending, so the queue gets drained.
+        if upload.pending() or self.compositor.animated:
+            return True
+        return any(layer.animated for layer in self.layers)
+
     def render(self, target):
+        # Use and clean up the programs belonging to our context.
+        sharing.make_current(self.context)
+        shaders.set_registry(self.programs)
+        text.set_atlas(self.glyphs)
+        self.programs.collect()
+
+        # Upload whatever decoded textures we can afford to this frame. New textures can show up in any cached layer.
+        if upload.drain():
+            self.compositor.invalidate()
+
         w, h = self.parent.render_size
 
-        # Setup our rendering viewport.
-        GL.glViewport(0, 0, w, h)
-        # Basic black background.
-        GL.glClearColor(1.0, 1.0, 1.0, 1.0)
-        GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+        # Drawables are positioned in window coordinates, so map those to the render size.
+        sw, sh = self.parent.size
+        self.uniforms.update(uniforms.screen_projection(sw, sh), self.view, (0, 0, w, h))
+        self.uniforms.bind()
+
+        # Time layers on the GPU if we're being profiled.
+        timer = None
+        profiler = rave.profiling.current()
+        if profiler and profiler.enabled and self.timer.supported():
+            timer = self.timer
+            timer.collect(profiler)
+
+        # Let the compositor draw the layers and apply post-processing.
+        self.compositor.render(self.layers, (w, h), target, timer=timer)
+
+        # Free up memory from unused textures if we're over budget.
+        streaming.end_frame()
+
+    def delete(self):
+        """ Release the render targets and queries of this window. Must be called with its context current. """
+        self.compositor.delete()
+        self.timer.delete()
 
-        for layer in self.layers:
-            layer.render(target)
+    def touch(self):
+        """ Keep the textures displayed in this window in use for a frame in which it is not re-rendered. """
+        self.compositor.touch()
 
 def create_gl_window(parent, context):
     return Window(parent, context)
@@ -1,2 +1,2 @@
-from . import audio, video, input, image
+from . import audio, video, input, image, font
 
@@ -1,2 +1,2 @@
-from .events import events_for, handle_events
+from .events import events_for, wait_events, handle_events
 from .filesystem import rwops_open, fs_to_rwops
@@ -77,6 +77,13 @@ def events_for(subsystem):
         return _pending_events.pop(subsystem)
     return []
 
+def wait_events(timeout):
+    """ Block until an event is pending or `timeout` seconds have passed. Returns whether any events are pending. """
+    if _pending_events:
+        return True
+    # Passing no event structure makes SDL leave the event in the queue for the next pump.
+    return sdl2.SDL_WaitEventTimeout(None, int(timeout * 1000)) == 1
+
 def handle_events():
     """ Handle system events. """
     for ev in events_for('system'):
@@ -102,6 +109,7 @@ def _pump_events():
     if not _do_pump:
         return
 
+    trace = _log.isEnabledFor(rave.log.TRACE)
     while True:
         ev = sdl2.SDL_Event()
         if sdl2.SDL_PollEvent(byref(ev)) == 0:
@@ -111,7 +119,8 @@ def _pump_events():
         else:
             subsystem = 'unknown'
 
-        _log.trace('Got event {} -> {}.', ev.type, subsystem)
+        if trace:
+            _log.trace('Got event {} -> {}.', ev.type, subsystem)
         _pending_events.setdefault(subsystem, [])
         _pending_events[subsystem].append(ev)
 
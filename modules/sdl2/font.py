@@ -0,0 +1,116 @@
+"""
+Support for rasterizing TrueType and OpenType fonts using SDL2_ttf.
+"""
+import ctypes
+import sdl2
+import sdl2.ext
+import sdl2.sdlttf as sdl2ttf
+
+import rave.log
+import rave.events
+import rave.resources
+
+
+## Constants.
+
+FORMAT_PATTERNS = [ '.ttf$', '.otf$' ]
+
+
+## Module API.
+
+def load():
+    if sdl2ttf.TTF_Init() != 0:
+        raise sdl2.ext.SDLError()
+    rave.events.hook('engine.new_game', new_game)
+
+def unload():
+    sdl2ttf.TTF_Quit()
+
+
+## Module stuff.
+
+def new_game(event, game):
+    for pattern in FORMAT_PATTERNS:
+        game.resources.register_loader(FontLoader, pattern)
+    _log.debug('Loaded support for TrueType/OpenType fonts.')
+
+
+class FontData(rave.resources.FontData):
+    """ A font file kept in memory, with an SDL2_ttf font handle opened for every size it's used at. """
+    __slots__ = ('buffer', 'handles')
+
+    def __init__(self, data, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # SDL2_ttf reads from the font source lazily, so keep the data around for as long as we have handles.
+        self.buffer = ctypes.create_string_buffer(data, len(data))
+        self.handles = {}
+
+    def __del__(self):
+        for handle in self.handles.values():
+            sdl2ttf.TTF_CloseFont(handle)
+        self.handles.clear()
+
+    def get_handle(self, size):
+        handle = self.handles.get(size)
+        if not handle:
+            rw = sdl2.SDL_RWFromConstMem(self.buffer, len(self.buffer))
+            handle = sdl2ttf.TTF_OpenFontRW(rw, True, size)
+            if not handle:
+                raise sdl2.ext.SDLError()
+            self.handles[size] = handle
+        return handle
+
+    def get_metrics(self, size):
+        handle = self.get_handle(size)
+        return sdl2ttf.TTF_FontAscent(handle), -sdl2ttf.TTF_FontDescent(handle), sdl2ttf.TTF_FontLineSkip(handle)
+
+    def get_glyph(self, char, size):
+        handle = self.get_handle(size)
+        code = ord(char)
+
+        minx, maxx, miny, maxy, advance = (ctypes.c_int() for _ in range(5))
+        if code > 0xFFFF or sdl2ttf.TTF_GlyphMetrics(handle, code, minx, maxx, miny, maxy, advance) != 0:
+            return rave.resources.GlyphData(0, 0, 0, 0, 0, b'')
+        if maxx.value <= minx.value or maxy.value <= miny.value:
+            # Whitespace: nothing to draw.
+            return rave.resources.GlyphData(0, 0, 0, 0, advance.value, b'')
+
+        # The shaded renderer gives us an 8-bit surface where pixel values map linearly from background to foreground.
+        fg = sdl2.SDL_Color(255, 255, 255, 255)
+        bg = sdl2.SDL_Color(0, 0, 0, 0)
+        surface = sdl2ttf.TTF_RenderGlyph_Shaded(handle, code, fg, bg)
+        if not surface:
+            raise sdl2.ext.SDLError()
+
+        try:
+            contents = surface.contents
+            # The surface spans the full line height, starting at the ascent: crop it to the glyph bounds.
+            ascent = sdl2ttf.TTF_FontAscent(handle)
+            first = max(0, ascent - maxy.value)
+            last = min(contents.h, ascent - miny.value)
+            width = contents.w
+            rows = [ ctypes.string_at(contents.pixels + y * contents.pitch, width) for y in range(first, last) ]
+        finally:
+            sdl2.SDL_FreeSurface(surface)
+
+        return rave.resources.GlyphData(width, len(rows), 0, ascent - first, advance.value, b''.join(rows))
+
+    def get_kerning(self, left, right, size):
+        handle = self.get_handle(size)
+        if ord(left) > 0xFFFF or ord(right) > 0xFFFF:
+            return 0
+        return sdl2ttf.TTF_GetFontKerningSizeGlyphs(handle, ord(left), ord(right))
+
+class FontLoader:
+    @classmethod
+    def can_load(cls, path, fd):
+        return True
+
+    @classmethod
+    def load(cls, path, fd):
+        return FontData(fd.read(), path)
+
+
+## Internals.
+
+_log = rave.log.get(__name__)
@@ -31,19 +31,22 @@ def backend_load(category):
 ## Backend API.
 
 def handle_events():
+    # Look up the event bus once rather than for every single input event.
+    bus = rave.events.current()
+
     for ev in events_for('input'):
-        if keyboard.handle_event(ev):
+        if keyboard.handle_event(ev, bus):
             pass
-        elif mouse.handle_event(ev):
+        elif mouse.handle_event(ev, bus):
             pass
-        elif touch.handle_event(ev):
+        elif touch.handle_event(ev, bus):
             pass
-        elif controller.handle_event(ev):
+        elif controller.handle_event(ev, bus):
             pass
         else:
             _log.debug('Unknown input event ID: {}', ev.type)
 
-    rave.events.emit('input.dispatch')
+    bus.emit('input.dispatch')
 
 
 ## Internal API.
@@ -1,5 +1,5 @@
 import sdl2
 
 
-def handle_event(ev):
+def handle_event(ev, bus):
     pass
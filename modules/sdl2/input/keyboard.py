@@ -1,5 +1,4 @@
 from sdl2 import *
-import rave.events
 from rave.input import Key
 
 
@@ -199,7 +198,7 @@ ALSO_SEND = {
 
 
 
-def handle_event(ev):
+def handle_event(ev, bus):
     if ev.type in (SDL_KEYDOWN, SDL_KEYUP):
         sym = ev.key.keysym.sym
         nativesym = ('SDL', sym)
@@ -218,7 +217,7 @@ def handle_event(ev):
             event = 'input.keyboard.release'
 
         for mapsym in mapsyms:
-            rave.events.emit(event, mapsym, nativesym)
+            bus.emit(event, mapsym, nativesym)
     elif ev.type == SDL_TEXTEDITING:
         pass
     elif ev.type == SDL_TEXTINPUT:
@@ -1,4 +1,3 @@
-import rave.events
 from rave.input import MouseButton
 import sdl2
 
@@ -9,7 +8,7 @@ MOUSE_MAPPING = {
 }
 
 
-def handle_event(ev):
+def handle_event(ev, bus):
     if ev.type in (sdl2.SDL_MOUSEBUTTONDOWN, sdl2.SDL_MOUSEBUTTONUP):
         sym = ev.button.button
         mapsym = MOUSE_MAPPING.get(sym, MouseButton.OTHER)
@@ -25,13 +24,13 @@ def handle_event(ev):
         else:
             event = 'input.mouse.release'
 
-        rave.events.emit(event, mouse, mapsym, nativesym, clicks, (ev.motion.x, ev.motion.y))
+        bus.emit(event, mouse, mapsym, nativesym, clicks, (ev.motion.x, ev.motion.y))
     elif ev.type == sdl2.SDL_MOUSEMOTION:
         mouse = ev.motion.which
         if mouse == sdl2.SDL_TOUCH_MOUSEID:
             return True
 
-        rave.events.emit('input.mouse.move', mouse, (ev.motion.x, ev.motion.y), (ev.motion.xrel, ev.motion.yrel))
+        bus.emit('input.mouse.move', mouse, (ev.motion.x, ev.motion.y), (ev.motion.xrel, ev.motion.yrel))
     elif ev.type == sdl2.SDL_MOUSEWHEEL:
         mouse = ev.wheel.which
         if mouse == sdl2.SDL_TOUCH_MOUSEID:
@@ -42,7 +41,7 @@ def handle_event(ev):
             x = -ev.wheel.x
             y = -ev.wheel.y
 
-        rave.events.emit('input.mouse.scroll', mouse, (x, y))
+        bus.emit('input.mouse.scroll', mouse, (x, y))
     else:
         return False
 
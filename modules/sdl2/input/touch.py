@@ -2,7 +2,7 @@ import sdl2
 import rave.input
 
 
-def handle_event(ev):
+def handle_event(ev, bus):
     """ XXX: Broken right now with regard to coordinate handling. Need to investigate. """
     if ev.type in (sdl2.SDL_FINGERDOWN, sdl2.SDL_FINGERUP):
         device = ev.tfinger.touchId
@@ -12,12 +12,12 @@ def handle_event(ev):
         else:
             event = 'input.touch.release'
 
-        rave.events.emit(event, device, finger, (ev.tfinger.x, ev.tfinger.y), (ev.tfinger.dx, ev.tfinger.dy), ev.tfinger.pressure)
+        bus.emit(event, device, finger, (ev.tfinger.x, ev.tfinger.y), (ev.tfinger.dx, ev.tfinger.dy), ev.tfinger.pressure)
     elif ev.type == sdl2.SDL_FINGERMOTION:
         device = ev.tfinger.touchId
         finger = ev.tfinger.fingerId
 
-        rave.events.emit('input.touch.move', device, finger, (ev.tfinger.x, ev.tfinger.y), (ev.tfinger.dx, ev.tfinger.dy), ev.tfinger.pressure)
+        bus.emit('input.touch.move', device, finger, (ev.tfinger.x, ev.tfinger.y), (ev.tfinger.dx, ev.tfinger.dy), ev.tfinger.pressure)
     elif ev.type == sdl2.SDL_MULTIGESTURE:
         pass
     elif ev.type == sdl2.SDL_DOLLARGESTURE:
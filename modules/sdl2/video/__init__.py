@@ -22,5 +22,8 @@ def unload():
 ## Video backend API.
 
 create_window = window.create_window
+configure_window = window.configure_window
+get_driver_name = window.get_driver_name
 create_gl_context = window.create_gl_context
-handle_events = events.handle_events
\ No newline at end of file
+handle_events = events.handle_events
+wait_events = events.wait_events
\ No newline at end of file
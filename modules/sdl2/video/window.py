@@ -5,6 +5,7 @@ from ctypes import c_float, c_int, byref
 import rave.log
 import rave.events
 import rave.rendering
+import rave.profiling
 
 __requires__ = [ 'opengl' ]
 
@@ -47,9 +48,10 @@ class Window(rave.rendering.Drawable):
         self._borders = borders
         self._resizable = resizable
         self._vsync = vsync
-
-        rave.events.hook('video.window.resized', self.on_resize)
-        rave.events.hook('video.window.close', self.on_close)
+        self._damaged = True
+        self._events = None
+        self._hooks = []
+        self.register_hooks()
 
     def __del__(self):
         self.close()
@@ -58,6 +60,12 @@ class Window(rave.rendering.Drawable):
     ## API.
 
     def close(self):
+        self.unregister_hooks()
+        if self.gl_window:
+            # Release GL objects while their context is still around.
+            self.gl_context.make_current()
+            self.gl_window.delete()
+            self.gl_window = None
         if self.gl_context:
             self.gl_context.close()
             self.gl_context = None
@@ -81,17 +89,37 @@ class Window(rave.rendering.Drawable):
         sdl2.SDL_RestoreWindow(self.handle)
 
     def render(self, target):
-        if self.gl_context:
-            self.gl_context.make_current()
-            self.gl_window.render(target)
+        if not self.gl_context:
+            return
+        # Don't bother rendering and swapping if nothing changed since the last frame,
+        # but keep what is still on screen from being streamed out.
+        if not self._damaged and not self.animated:
+            self.gl_window.touch()
+            return
+
+        self._damaged = False
+        self.gl_context.make_current()
+        self.gl_window.render(target)
+        with rave.profiling.section('window.swap'):
             self.gl_context.swap()
 
     def refresh(self):
         pass
 
+    def request_redraw(self):
+        """ Mark the window contents as changed, so it will be redrawn on the next frame. """
+        self._damaged = True
+
+    def invalidate(self):
+        """ Discard any cached window contents and redraw everything on the next frame. """
+        if self.gl_window:
+            self.gl_window.invalidate()
+        self.request_redraw()
+
     def add_layer(self, layer):
         if self.gl_window:
             self.gl_window.add_layer(layer)
+            self.request_redraw()
 
     def get_layer(self, name):
         if self.gl_window:
@@ -110,6 +138,27 @@ class Window(rave.rendering.Drawable):
 
     ## Events.
 
+    def register_hooks(self):
+        """ Hook into the event bus of the current environment, unhooking from any previous one. """
+        self.unregister_hooks()
+        # Hook weakly, so windows that are dropped without being closed don't linger on the bus.
+        self._events = rave.events.current()
+        self._hooks = [
+            self._events.hook('video.window.resized', self.on_resize, weak=True),
+            self._events.hook('video.window.exposed', self.on_expose, weak=True),
+            self._events.hook('video.window.close', self.on_close, weak=True),
+            self._events.hook('video.redraw', self.on_redraw, weak=True),
+            self._events.hook('video.reset', self.on_reset, weak=True),
+        ]
+
+    def unregister_hooks(self):
+        if not self._events:
+            return
+        for hook in self._hooks:
+            self._events.unhook(hook)
+        self._events = None
+        self._hooks = []
+
     def on_resize(self, event, window, w, h):
         if window and window != self.id:
             return
@@ -121,12 +170,29 @@ class Window(rave.rendering.Drawable):
             sdl2.SDL_GL_GetDrawableSize(self.handle, byref(w), byref(h))
             w, h = w.value, h.value
         self._render_size = (w, h)
+        self.invalidate()
+
+    def on_expose(self, event, window):
+        if window and window != self.id:
+            return
+        self.invalidate()
+
+    def on_redraw(self, event, window=None):
+        if window and window is not self and window != self.id:
+            return
+        # Only changed layers need to be re-rendered, so keep any cached contents.
+        self.request_redraw()
+
+    def on_reset(self, event, window=None):
+        if window and window != self.id:
+            return
+        self.invalidate()
 
     def on_close(self, event, window):
         if window and window != self.id:
             return
         self.close()
-        rave.events.emit('game.stop')
+        rave.events.emit('video.window.closed', self)
 
 
     ## Properties.
@@ -149,6 +215,11 @@ class Window(rave.rendering.Drawable):
         sdl2.SDL_SetWindowSize(self.handle, *new)
         self._size = new
 
+    @property
+    def animated(self):
+        """ Whether anything in the window changes every frame. """
+        return bool(self.gl_window and self.gl_window.animated)
+
     @property
     def render_size(self):
         return self._render_size
@@ -175,13 +246,18 @@ class Window(rave.rendering.Drawable):
 
     @borders.setter
     def borders(self, new):
-        sdl2.SDL_SetWindowBordered(int(new))
+        sdl2.SDL_SetWindowBordered(self.handle, int(new))
         self._borders = new
 
     @property
     def resizable(self):
         return self._resizable
 
+    @resizable.setter
+    def resizable(self, new):
+        sdl2.SDL_SetWindowResizable(self.handle, int(new))
+        self._resizable = new
+
     @property
     def vsync(self):
         # SDL_GL_GetSwapInterval() is not reliable, so return cached value.
@@ -203,19 +279,27 @@ class Window(rave.rendering.Drawable):
 
 
 class Context:
+    """
+    An OpenGL context. Contexts created to share objects with another context are in the same share group,
+    identified by `group`, which is the first context created in the group.
+    """
+    # The context that is current on the (main) thread, shared between all contexts.
     CURRENT = None
 
-    def __init__(self, window, handle, profile, major, minor):
+    def __init__(self, window, handle, profile, major, minor, share=None):
         self.window = window
         self.context = handle
         self.profile = profile
         self.major = major
         self.minor = minor
+        self.group = share.group if share else self
 
     def __del__(self):
         self.close()
 
     def close(self):
+        if Context.CURRENT is self:
+            Context.CURRENT = None
         if self.context:
             sdl2.SDL_GL_DeleteContext(self.context)
             self.context = None
@@ -243,12 +327,12 @@ class Context:
         return sdl2.SDL_GL_GetProcAddress(name)
 
     def make_current(self):
-        if self.CURRENT is self:
+        if Context.CURRENT is self:
             return
 
         if sdl2.SDL_GL_MakeCurrent(self.window, self.context) < 0:
             raise sdl2.ext.SDLError()
-        self.CURRENT = self
+        Context.CURRENT = self
 
     def set_vsync(self, vsync):
         self.make_current()
@@ -279,11 +363,45 @@ def create_window(title, width, height, fullscreen=False, borders=True, resizabl
 
     return Window(window, title, width, height, fullscreen, borders, resizable, vsync)
 
-def create_gl_context(window, versions):
+def configure_window(window, title, width, height, fullscreen=False, borders=True, resizable=True, vsync=True, visible=True):
+    """ Reconfigure existing window `window` as if it was created by create_window() with the given arguments, keeping its GL context. """
+    window.title = title
+    window.size = (width, height)
+    window.on_resize(None, None, width, height)
+    if borders != window.borders:
+        window.borders = borders
+    if resizable != window.resizable:
+        window.resizable = resizable
+    if fullscreen != window.fullscreen:
+        window.fullscreen = fullscreen
+    if vsync != window.vsync:
+        window.vsync = vsync
+    # The window might be handed over to a different environment than it was created in.
+    window.register_hooks()
+    if visible:
+        window.show()
+    else:
+        window.hide()
+
+def get_driver_name():
+    """ Get the name of the video driver in use. """
+    driver = sdl2.SDL_GetCurrentVideoDriver()
+    return driver.decode('utf-8') if driver else 'unknown'
+
+def create_gl_context(window, versions, share=None):
+    """ Create GL context for `window`, trying the (profile, major, minor) tuples in `versions` in order. If `share` is given, the new context shares objects with it. """
     # Base OpenGL flags.
     sdl2.SDL_GL_SetAttribute(sdl2.SDL_GL_DOUBLEBUFFER, 1)
     sdl2.SDL_GL_SetAttribute(sdl2.SDL_GL_CONTEXT_FLAGS, sdl2.SDL_GL_CONTEXT_FORWARD_COMPATIBLE_FLAG | sdl2.SDL_GL_CONTEXT_RESET_ISOLATION_FLAG)
 
+    if share:
+        # SDL shares with whatever context is current, and sharing requires contexts of the same version.
+        share.make_current()
+        sdl2.SDL_GL_SetAttribute(sdl2.SDL_GL_SHARE_WITH_CURRENT_CONTEXT, 1)
+        versions = [ (share.profile, share.major, share.minor) ]
+    else:
+        sdl2.SDL_GL_SetAttribute(sdl2.SDL_GL_SHARE_WITH_CURRENT_CONTEXT, 0)
+
     # Try every deduced profile.
     for (profile, major, minor) in versions:
         if (profile, major, minor) in _gl_blacklist:
@@ -299,12 +417,15 @@ def create_gl_context(window, versions):
             # Found a working context.
             break
 
-        # Don't try this combo again.
-        _gl_blacklist.add((profile, major, minor))
+        # Don't try this combo again, unless we only failed to share.
+        if not share:
+            _gl_blacklist.add((profile, major, minor))
     else:
         raise RuntimeError('Could not create appropriate GL context.')
 
-    context = Context(window.handle, context, profile, major, minor)
+    # SDL_GL_CreateContext() makes the new context current.
+    context = Context(window.handle, context, profile, major, minor, share=share)
+    Context.CURRENT = context
     gl_window = _gl.create_gl_window(window, context)
     window.enable_gl(context, gl_window)
 
@@ -7,6 +7,8 @@ __license__ = 'BSD'
 
 from . import common
 from . import log
+from . import logsink
+from . import tasks
 from . import events
 from . import execution
 
@@ -15,6 +17,8 @@ from . import loader
 from . import modularity
 
 from . import backends
+from . import timing
+from . import profiling
 from . import rendering
 from . import input
 from . import resources
@@ -3,12 +3,15 @@ rave entry point. Parse command line arguments and launch game.
 """
 import argparse
 import rave.bootstrap
+import rave.logsink
 
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='A modular and extensible visual novel engine.', prog='rave')
     parser.add_argument('-b', '--bootstrapper', help='Select bootstrapper to bootstrap the engine with. (default: autoselect)')
     parser.add_argument('-B', '--game-bootstrapper', metavar='BOOTSTRAPPER', help='Select bootstrapper to bootstrap the game with. (default: autoselect)')
+    parser.add_argument('--log-sink', metavar='PATH', help='Write structured log records to PATH, for use with tools/logtool.py.')
+    parser.add_argument('--log-sink-format', choices=sorted(rave.logsink.FORMATS), default='json', help='Format of structured log records. (default: json)')
     parser.add_argument('game', metavar='GAME', nargs='?', help='The game to run. Format dependent on used bootstrapper.')
 
     arguments = parser.parse_args()
@@ -16,6 +19,11 @@ def parse_arguments():
 
 def main():
     args = parse_arguments()
+    sink = None
+    if args.log_sink:
+        sink = rave.logsink.StructuredSink(args.log_sink, args.log_sink_format)
+        sink.install()
+
     engine = rave.bootstrap.bootstrap_engine(args.bootstrapper)
 
     if args.game:
@@ -24,4 +32,7 @@ def main():
         engine.run_game(game)
         engine.shutdown()
 
+    if sink:
+        sink.close()
+
 main()
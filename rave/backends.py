@@ -11,10 +11,14 @@ Any code that uses `register(category, backend)` has to implement the following
 - backend_available(category): a function that returns whether or not the backend is available for this platform.
 - backend_load(category): a callback called when this module has decided this backend.
 
+Backends can optionally implement the following API:
+- wait_events(timeout): block until events are pending or `timeout` seconds have passed, and return whether events are pending.
+
 Code that needs access to a certain backend can then use `select(category)` ensure a backend is selected for the given category,
 and from then on use `rave.backends.<category>` to access the selected backend.
 """
 import heapq
+import time
 import rave.log
 
 
@@ -125,6 +129,20 @@ def handle_events(game):
                 backend.handle_events()
     game.events.emit('backend.events.stop')
 
+def wait_events(game, timeout):
+    """ Block until any selected backend has pending events, or `timeout` seconds have passed. """
+    for category in [ BACKEND_VIDEO, BACKEND_AUDIO, BACKEND_INPUT ]:
+        if category not in _selected:
+            continue
+        targets = [ _selected[category] ] if category in SINGLE_BACKEND_CATEGORIES else _selected[category]
+        for backend in targets:
+            if hasattr(backend, 'wait_events'):
+                # Only one backend can block on its event source; the others will be polled afterwards.
+                return backend.wait_events(timeout)
+
+    # No backend can block on events, so just sleep.
+    time.sleep(timeout)
+    return False
 
 
 ## Internals.
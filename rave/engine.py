@@ -24,6 +24,7 @@ class Engine:
 
     def shutdown(self):
         rave.loader.remove_hooks()
+        rave.log.shutdown()
 
     def run_game(self, game):
         self.games.append(game)
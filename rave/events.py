@@ -1,7 +1,15 @@
 """
 rave event bus.
 """
+import bisect
+import collections
+import heapq
+import inspect
+import re
+import time
+import weakref
 import rave.log
+import rave.tasks
 
 _log = rave.log.get(__name__)
 
@@ -10,63 +18,431 @@ class StopProcessing(BaseException):
     """ Exception raised to indicate this event should not be processed further. """
     pass
 
+class Hook:
+    """ A handler hooked to an event, as returned by `EventBus.hook()`. Pass it to `EventBus.unhook()` to remove the handler. """
+    __slots__ = ('event', 'handler', 'priority', 'order', 'key', 'ref', '__weakref__')
+
+    def __init__(self, event, handler, priority, order):
+        self.event = event
+        self.handler = handler
+        self.priority = priority
+        self.order = order
+        # Hooks sort in calling order: by descending priority, then by order of hooking.
+        self.key = (-priority, order)
+        self.ref = None
+
+    def __repr__(self):
+        return '<{}: {} -> {!r} (priority {})>'.format(self.__class__.__qualname__, self.event, self.target(), self.priority)
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+    def target(self):
+        """ Get the handler as it was hooked, or None if it was weakly referenced and has been collected. """
+        if self.ref:
+            return self.ref()
+        return self.handler
+
 class HookContext:
     def __init__(self, bus, event, handler):
         self.bus = bus
         self.event = event
         self.handler = handler
+        self.token = None
 
     def __enter__(self):
-        self.bus.hook(self.event, self.handler)
+        self.token = self.bus.hook(self.event, self.handler)
         return self
 
     def __exit__(self, exctype, excval, exctb):
-        self.bus.unhook(self.event, self.handler)
+        self.bus.unhook(self.token)
 
 class EventBus:
-    def __init__(self):
+    """
+    An event bus, dispatching events to the handlers hooked to them.
+
+    Handlers are called in order of descending priority, and in order of hooking for equal priorities.
+    Handlers can also be hooked to patterns of dotted event names, where `*` matches a single name component and `**` one or more:
+    `input.*` matches `input.dispatch` but not `input.mouse.move`, while `video.**` matches both `video.redraw` and `video.window.resized`.
+    Patterns are resolved into the handler table of an event when either the pattern or the event is first seen, so emitting never matches patterns.
+
+    Coroutine functions can be hooked as well: the coroutines they return are spawned as tasks on the bus task loop.
+    Such handlers can not stop processing of the event, as they only start running on the next step of the loop.
+
+    When instrumented (see `instrument()`), the bus records call counts, timings and swallowed exceptions per event and handler.
+    Hooks are kept sorted in calling order, and the handler tuples emitting uses are rebuilt from them lazily on the next emit
+    after an (un)hook rather than modified in place, so emitting never has to copy them, and handlers can safely (un)hook
+    while an event is being emitted.
+
+    Events can be marked as deferred: emitting them appends them to a bounded queue instead of dispatching them right away,
+    and the queue is dispatched on `drain()`. Repeated deferred events can be coalesced so only the latest one is delivered.
+    Deferred events can name events that flush the queue before they are dispatched, so they are never delivered after those.
+    """
+    QUEUE_SIZE = 4096
+
+    def __init__(self, tasks=None):
         self.handlers = {}
+        self.tasks = tasks or rave.tasks.TaskLoop()
+        self.deferred = {}
+        self.barriers = set()
+        self.queue = collections.deque(maxlen=self.QUEUE_SIZE)
+        self.dropped = 0
+        self._hooks = {}
+        self._patterns = {}
+        self._known = set()
+        self._stale = set()
+        self._order = 0
+        self._pending = {}
+        self._flush_on = {}
+        self._stats = {}
 
-    def hook(self, event, handler=None):
+    def hook(self, event, handler=None, priority=0, weak=False):
+        """
+        Hook `handler` to `event`, returning a token that can be used to unhook it. Handlers with higher `priority` are called first.
+        If `weak` is True, only a weak reference to the handler is kept, and it is unhooked automatically when it is collected.
+        Bound methods are referenced through their instance, so the method is unhooked once its owner dies.
+        """
         if not handler:
             def do_hook(f):
-                self.hook(event, f)
+                self.hook(event, f, priority, weak)
                 return f
             return do_hook
 
-        self.handlers.setdefault(event, [])
-        self.handlers[event].append(handler)
+        self._order += 1
+        return self._add(event, handler, priority, self._order, weak)
 
-    def hook_first(self, event, handler=None):
+    def hook_first(self, event, handler=None, priority=0, weak=False):
+        """ Hook `handler` to `event` before all other handlers of the same priority. """
         if not handler:
             def do_hook(f):
-                self.hook_first(event, f)
+                self.hook_first(event, f, priority, weak)
                 return f
             return do_hook
 
-        self.handlers.setdefault(event, [])
-        self.handlers[event].insert(0, handler)
+        self._order += 1
+        return self._add(event, handler, priority, -self._order, weak)
 
-    def unhook(self, event, handler):
-        self.handlers[event].remove(handler)
+    def unhook(self, event, handler=None):
+        """ Unhook a handler, either by the token returned from `hook()`, or by event and handler. """
+        if isinstance(event, Hook):
+            self._remove(event)
+            return
+
+        for token in self._hooks.get(event, ()):
+            if token.target() == handler:
+                self._remove(token)
+                return
+        raise ValueError('Handler {!r} is not hooked to event {}.'.format(handler, event))
 
     def hooked(self, event, handler):
         return HookContext(self, event, handler)
 
     def emit(self, event, *args, **kwargs):
+        if self.deferred and event in self.deferred:
+            self._enqueue(event, args, kwargs)
+            return
+        if self.queue and event in self.barriers:
+            self.drain()
+        handlers = self.handlers.get(event)
+        if handlers is None and (event in self._stale or self._patterns and event not in self._known):
+            handlers = self._resolve(event)
+        if handlers:
+            self._dispatch(handlers, event, args, kwargs)
+
+    def emit_batch(self, event, batch):
+        """ Emit `event` once for every argument tuple in `batch`, looking up its handlers only once. """
+        if self.queue and event in self.barriers:
+            self.drain()
         handlers = self.handlers.get(event)
+        if handlers is None and (event in self._stale or self._patterns and event not in self._known):
+            handlers = self._resolve(event)
+        if not handlers:
+            return
+        for args in batch:
+            self._dispatch(handlers, event, args, {})
+
+    def emitter(self, event):
+        """ Get a function that emits `event` on this bus with the arguments it's called with, for code that emits an event often. """
+        handlers = self.handlers
+        deferred = self.deferred
+        barriers = self.barriers
+        bus = self
+        patterns = self._patterns
+        known = self._known
+        stale = self._stale
+        dispatch = self._dispatch
+        enqueue = self._enqueue
+        resolve = self._resolve
+
+        def emit(*args, **kwargs):
+            if event in deferred:
+                enqueue(event, args, kwargs)
+                return
+            if bus.queue and event in barriers:
+                bus.drain()
+            event_handlers = handlers.get(event)
+            if event_handlers is None and (event in stale or patterns and event not in known):
+                event_handlers = resolve(event)
+            if event_handlers:
+                dispatch(event_handlers, event, args, kwargs)
+        return emit
+
+    async def wait_for(self, event, check=None):
+        """
+        Wait until `event` is emitted with arguments for which `check(*args, **kwargs)` is true, if given.
+        Returns the positional event arguments.
+        """
+        future = self.tasks.loop.create_future()
+        def handler(event, *args, **kwargs):
+            if not future.done() and (not check or check(*args, **kwargs)):
+                future.set_result(args)
+
+        token = self.hook(event, handler)
+        try:
+            return await future
+        finally:
+            self.unhook(token)
+
+    def defer(self, event, coalesce=False, flush_on=()):
+        """
+        Queue `event` when it's emitted instead of dispatching it immediately.
+        If `coalesce` is True, a queued event that has not been delivered yet is replaced by newer ones from the same source,
+        the source being the first argument. `coalesce` can also be a function taking the old and new argument tuples and returning merged ones.
+        Emitting any of the events in `flush_on` drains the queue first, so queued instances are delivered before them.
+        """
+        self.deferred[event] = coalesce
+        self._flush_on[event] = frozenset(flush_on)
+        self._update_barriers()
+
+    def undefer(self, event):
+        """ Dispatch `event` immediately again when it's emitted. Already queued instances are still delivered on `drain()`. """
+        del self.deferred[event]
+        del self._flush_on[event]
+        self._update_barriers()
+
+    def drain(self):
+        """ Dispatch all queued events in order. Events queued while draining are delivered on the next drain. """
+        if not self.queue:
+            return 0
+        queue = self.queue
+        self.queue = collections.deque(maxlen=self.QUEUE_SIZE)
+        self._pending = {}
+
+        handlers = self.handlers
+        for event, args, kwargs in queue:
+            event_handlers = handlers.get(event)
+            if event_handlers is None and (event in self._stale or self._patterns and event not in self._known):
+                event_handlers = self._resolve(event)
+            if event_handlers:
+                self._dispatch(event_handlers, event, args, kwargs)
+        return len(queue)
+
+
+    ## Instrumentation.
+
+    @property
+    def instrumented(self):
+        return '_invoke_handler' in self.__dict__
+
+    def instrument(self, enabled=True):
+        """ Enable or disable recording of handler statistics. Handlers are invoked without any overhead while disabled. """
+        if enabled:
+            self._invoke_handler = self._invoke_handler_instrumented
+        else:
+            self.__dict__.pop('_invoke_handler', None)
+
+    def stats(self):
+        """ Get a list of (event, handler name, calls, total seconds, max seconds, exceptions) tuples, most expensive first. """
+        stats = [ (event, _describe(handler), *values) for (event, handler), values in self._stats.items() ]
+        return sorted(stats, key=lambda s: s[3], reverse=True)
+
+    def reset_stats(self):
+        self._stats = {}
+
+    def dump_stats(self, limit=None):
+        """ Log recorded handler statistics, limited to the `limit` most expensive handlers if given. """
+        stats = self.stats()
+        _log('Event handler statistics ({n} handlers):', n=len(stats))
+        for event, name, calls, total, peak, exceptions in stats[:limit]:
+            _log('  {event} -> {name}: {calls} calls, {total:.2f}ms total, {avg:.3f}ms avg, {peak:.3f}ms max, {exceptions} exceptions',
+                event=event, name=name, calls=calls, total=total * 1000, avg=total / calls * 1000 if calls else 0, peak=peak * 1000, exceptions=exceptions)
+
+
+    def _add(self, event, handler, priority, order, weak):
+        token = Hook(event, handler, priority, order)
+        if weak:
+            bus = weakref.ref(self)
+            def collected(ref):
+                live = bus()
+                if live:
+                    live._remove(token)
+
+            if inspect.ismethod(handler):
+                ref = weakref.WeakMethod(handler, collected)
+            else:
+                ref = weakref.ref(handler, collected)
+            def call(*args, **kwargs):
+                target = ref()
+                if target is not None:
+                    return target(*args, **kwargs)
+
+            call.__qualname__ = getattr(handler, '__qualname__', call.__qualname__)
+            call.__module__ = getattr(handler, '__module__', call.__module__)
+            token.ref = ref
+            token.handler = call
+
+        bisect.insort(self._hooks.setdefault(event, []), token)
+        if _is_pattern(event):
+            if event not in self._patterns:
+                self._patterns[event] = _compile_pattern(event)
+            self._invalidate_matching(event)
+        else:
+            self._known.add(event)
+            self._invalidate(event)
+        return token
+
+    def _remove(self, token):
+        event = token.event
+        hooks = self._hooks.get(event)
+        if not hooks:
+            return
+        # Hook keys are unique, so the token can only be at its sort position.
+        index = bisect.bisect_left(hooks, token)
+        if index == len(hooks) or hooks[index] is not token:
+            return
+        del hooks[index]
+        if not hooks:
+            del self._hooks[event]
+
+        if event in self._patterns:
+            self._invalidate_matching(event)
+            if not hooks:
+                del self._patterns[event]
+        else:
+            self._invalidate(event)
+
+    def _resolve(self, event):
+        self._known.add(event)
+        self._stale.discard(event)
+        self._rebuild(event)
+        return self.handlers.get(event)
+
+    def _invalidate(self, event):
+        # Drop the handler tuple, so it's rebuilt on the next emit.
+        self.handlers.pop(event, None)
+        self._stale.add(event)
+
+    def _invalidate_matching(self, pattern):
+        regex = self._patterns[pattern]
+        for event in self._known:
+            if regex.fullmatch(event):
+                self._invalidate(event)
+
+    def _rebuild(self, event):
+        # All hook lists are sorted already, so they only need to be merged.
+        lists = [ self._hooks.get(event, ()) ]
+        for pattern, regex in self._patterns.items():
+            if regex.fullmatch(event):
+                lists.append(self._hooks[pattern])
+
+        tokens = heapq.merge(*lists) if len(lists) > 1 else lists[0]
+        handlers = tuple(token.handler for token in tokens)
         if handlers:
-            for handler in handlers:
-                try:
-                    self._invoke_handler(handler, event, args, kwargs)
-                except StopProcessing:
-                    break
-                except Exception as e:
-                    _log.exception(e, 'Exception thrown while processing event {event}.', event=event)
+            self.handlers[event] = handlers
+        else:
+            self.handlers.pop(event, None)
+
+    def _update_barriers(self):
+        # Update in place, as emitters hold on to the set.
+        self.barriers.clear()
+        self.barriers.update(*self._flush_on.values())
+
+    def _enqueue(self, event, args, kwargs):
+        coalesce = self.deferred[event]
+        if coalesce:
+            key = _coalesce_key(event, args)
+            entry = self._pending.get(key)
+            if entry:
+                # Update the entry in place, so the event keeps its original position in the queue.
+                entry[1] = coalesce(entry[1], args) if callable(coalesce) else args
+                entry[2] = kwargs
+                return
+            entry = self._pending[key] = [event, args, kwargs]
+        else:
+            entry = (event, args, kwargs)
 
+        if len(self.queue) == self.queue.maxlen:
+            oldest = self.queue[0]
+            if isinstance(oldest, list):
+                self._pending.pop(_coalesce_key(oldest[0], oldest[1]), None)
+            self.dropped += 1
+            if self.dropped == 1:
+                _log.warn('Event queue full, dropping oldest events.')
+        self.queue.append(entry)
+
+    def _dispatch(self, handlers, event, args, kwargs):
+        for handler in handlers:
+            try:
+                result = self._invoke_handler(handler, event, args, kwargs)
+                if result is not None and inspect.isawaitable(result):
+                    self.tasks.spawn(result)
+            except StopProcessing:
+                break
+            except Exception as e:
+                _log.exception(e, 'Exception thrown while processing event {event}.', event=event)
 
     def _invoke_handler(self, handler, event, args, kwargs):
-        handler(event, *args, **kwargs)
+        return handler(event, *args, **kwargs)
+
+    def _invoke_handler_instrumented(self, handler, event, args, kwargs):
+        stats = self._stats.get((event, handler))
+        if stats is None:
+            stats = self._stats[event, handler] = [0, 0.0, 0.0, 0]
+
+        start = time.perf_counter()
+        try:
+            return handler(event, *args, **kwargs)
+        except Exception:
+            stats[3] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            stats[0] += 1
+            stats[1] += elapsed
+            if elapsed > stats[2]:
+                stats[2] = elapsed
+
+
+## Internals.
+
+def _is_pattern(event):
+    return '*' in event
+
+def _compile_pattern(pattern):
+    parts = []
+    for part in pattern.split('.'):
+        if part == '**':
+            parts.append(r'[^.]+(?:\.[^.]+)*')
+        elif part == '*':
+            parts.append(r'[^.]+')
+        else:
+            parts.append(re.escape(part))
+    return re.compile(r'\.'.join(parts))
+
+def _describe(handler):
+    name = getattr(handler, '__qualname__', None)
+    if not name:
+        return repr(handler)
+    module = getattr(handler, '__module__', None)
+    return '{}.{}'.format(module, name) if module else name
+
+def _coalesce_key(event, args):
+    source = args[0] if args else None
+    try:
+        hash(source)
+    except TypeError:
+        source = id(source)
+    return (event, source)
 
 
 ## Stateful API.
@@ -82,11 +458,30 @@ def current():
 def emit(event, *args, **kwargs):
     return current().emit(event, *args, **kwargs)
 
-def hook(event, handler=None):
-    return current().hook(event, handler)
+def hook(event, handler=None, priority=0, weak=False):
+    return current().hook(event, handler, priority, weak)
 
-def hook_first(event, handler=None):
-    return current().hook_first(event, handler)
+def hook_first(event, handler=None, priority=0, weak=False):
+    return current().hook_first(event, handler, priority, weak)
 
-def unhook(event, handler):
+def unhook(event, handler=None):
     return current().unhook(event, handler)
+
+def defer(event, coalesce=False, flush_on=()):
+    return current().defer(event, coalesce, flush_on)
+
+def undefer(event):
+    return current().undefer(event)
+
+def emit_batch(event, batch):
+    return current().emit_batch(event, batch)
+
+def wait_for(event, check=None):
+    return current().wait_for(event, check)
+
+def instrument(enabled=True):
+    return current().instrument(enabled)
+
+def emitter(event):
+    """ Get a function that emits `event` on the current event bus, without looking up the current bus every time. """
+    return current().emitter(event)
@@ -1,7 +1,15 @@
 """
 rave Python execution environments.
+
+The stack of active environments is kept in a context variable, making lookups lock-free and giving every thread
+and asyncio task its own stack. Other parallel mechanisms can be supported by registering identifier functions
+through `register_identifier()`: environments are then tracked per combination of identifiers instead.
+Environments active in the calling context are carried over when identifiers change, while those active in other contexts
+are adopted by the first keyed push or pop there. Identifiers can not be changed while other contexts have environments
+tracked per identifier, as they would no longer be found.
 """
 import threading
+import contextvars
 import types
 
 import rave.log
@@ -11,7 +19,16 @@ _log = rave.log.get(__name__)
 _lock = threading.Lock()
 _ident_funcs = [ lambda: threading.current_thread().ident ]
 _current_envs = {}
+_stack = contextvars.ContextVar('rave.execution.stack', default=())
+_keyed = False
+
+
+def register_identifier(func):
+    """ Register a function returning an identifier for the current unit of some parallel mechanism. """
+    _change_identifiers(lambda: _ident_funcs.append(func))
 
+def remove_identifier(func):
+    _change_identifiers(lambda: _ident_funcs.remove(func))
 
 def identifier():
     """ Get unique identifier for all possible parallel mechanisms. """
@@ -19,40 +36,56 @@ def identifier():
 
 def current():
     """ Get current execution environment object for whatever parallel mechanism is used, or None if no environment is active. """
-    with _lock:
-        ident = identifier()
-
-        envs = _current_envs.get(ident)
-        if envs:
-            return envs[-1]
-        return None
+    if _keyed:
+        envs = _current_envs.get(identifier())
+        if envs is None:
+            envs = _stack.get()
+    else:
+        envs = _stack.get()
+    if envs:
+        return envs[-1]
+    return None
 
 def push(env):
     """ Set current execution environment for whatever parallel mechanism is used. """
-    with _lock:
-        ident = identifier()
+    if not _keyed:
+        envs = _stack.get()
+        if envs:
+            envs[-1].deactivate()
+        _stack.set(envs + (env,))
+        env.activate()
+        return
 
-        _current_envs.setdefault(ident, [])
-        if _current_envs[ident]:
-            current = _current_envs[ident][-1]
-            current.deactivate()
+    with _lock:
+        envs = _keyed_envs(identifier())
+        if envs:
+            envs[-1].deactivate()
 
-        _current_envs[ident].append(env)
+        envs.append(env)
         env.activate()
 
 def pop():
     """ Clear the current execution environment for whatever parallel mechanism is used. """
-    with _lock:
-        ident = identifier()
+    if not _keyed:
+        envs = _stack.get()
+        if not envs:
+            raise ValueError('No environment to clear.')
+
+        env = envs[-1]
+        _stack.set(envs[:-1])
+        env.deactivate()
+        if len(envs) > 1:
+            envs[-2].activate()
+        return env
 
-        envs = _current_envs.get(ident)
+    with _lock:
+        envs = _keyed_envs(identifier())
         if envs:
             env = envs.pop()
             env.deactivate()
 
-            if _current_envs[ident]:
-                current = _current_envs[ident][-1]
-                current.activate()
+            if envs:
+                envs[-1].activate()
 
             return env
 
@@ -105,3 +138,32 @@ class ExecutionEnvironment:
 
     def register_api(self, name, api):
         self.apis[name] = api
+
+
+## Internals.
+
+def _keyed_envs(ident):
+    """ Get the environment stack for `ident`, adopting the context stack of environments pushed before switching over. """
+    envs = _current_envs.get(ident)
+    if envs is None:
+        envs = _current_envs[ident] = list(_stack.get())
+        _stack.set(())
+    return envs
+
+def _change_identifiers(change):
+    """ Change the identifier functions through `change()`, carrying over the environments active in the calling context. """
+    global _keyed
+    with _lock:
+        own = identifier()
+        if any(envs for ident, envs in _current_envs.items() if ident != own):
+            raise ValueError('Can not change identifiers while environments are active for them in other contexts.')
+
+        envs = _keyed_envs(own) if _keyed else list(_stack.get())
+        change()
+        _keyed = len(_ident_funcs) > 1
+        _current_envs.clear()
+        if _keyed:
+            _current_envs[identifier()] = envs
+            _stack.set(())
+        else:
+            _stack.set(tuple(envs))
@@ -3,6 +3,7 @@ rave game module.
 
 This contains the code that ties everything together to run a single game.
 """
+import os
 import threading
 import rave.log
 import rave.events
@@ -11,6 +12,9 @@ import rave.execution
 import rave.backends
 import rave.input
 import rave.resources
+import rave.tasks
+import rave.timing
+import rave.profiling
 
 _log = rave.log.get(__name__)
 
@@ -23,23 +27,43 @@ class Game:
         self.active_lock = threading.Lock()
 
         self.fs = rave.filesystem.FileSystem()
-        self.events = rave.events.EventBus()
+        self.tasks = rave.tasks.TaskLoop()
+        self.events = rave.events.EventBus(self.tasks)
+        if os.environ.get('RAVE_EVENT_STATS'):
+            self.events.instrument()
         self.env = rave.execution.ExecutionEnvironment(self)
         self.dispatcher = rave.input.Dispatcher(self.events)
         self.resources = rave.resources.ResourceManager()
-        self.window = None
+        self.scheduler = rave.timing.FrameScheduler()
+        self.profiler = rave.profiling.FrameProfiler()
+        self.windows = []
         self.mixer = None
 
     def init(self):
         """ Initialize a game. """
         self.events.hook('game.suspend', self.suspend)
         self.events.hook('game.resume', self.resume)
+        self.events.hook('video.redraw', self.redraw)
+        self.events.hook('video.window.closed', self.window_closed)
+        self.events.defer('video.window.resized', coalesce=True)
         self.dispatcher.register_hooks()
 
         with self.env:
-            self.window = rave.backends.video.create_window('YUNG NAKIGE', 1280, 720)
+            self.create_window('YUNG NAKIGE', 1280, 720)
             self.events.emit('game.init', self)
 
+    @property
+    def window(self):
+        """ The main window of the game. """
+        return self.windows[0] if self.windows else None
+
+    def create_window(self, title, width, height, **kwargs):
+        """ Create an additional window. The first window created is the main window. """
+        with self.env:
+            window = rave.backends.video.create_window(title, width, height, **kwargs)
+        self.windows.append(window)
+        return window
+
     def run(self):
         """ Run the game. """
         running = True
@@ -51,22 +75,54 @@ class Game:
 
         with self.events.hooked('game.stop', stop), self.env:
             self.events.emit('game.start', self)
+            self.scheduler.start()
+
             # Typical handle events -> update game state -> render loop.
             while running:
                 with self.active_lock:
                     # Suspend main loop while lock is active: useful for when the OS requests an application suspend.
                     pass
 
-                rave.backends.handle_events(self)
-                self.events.emit('game.tick', self)
+                if self.scheduler.idle:
+                    # Nothing is animating: block on the event source instead of spinning.
+                    rave.backends.wait_events(self, self.tasks.timeout(self.scheduler.idle_timeout))
+                    self.scheduler.idled()
+
+                profiler = self.profiler
+                profiler.begin_frame()
+                with profiler.section('backend.handle_events'):
+                    rave.backends.handle_events(self)
+                with profiler.section('events.drain'):
+                    # Deliver events deferred while handling backend events.
+                    self.events.drain()
+                with profiler.section('game.tick'):
+                    for dt in self.scheduler.ticks():
+                        self.events.emit('game.tick', self, dt)
+                with profiler.section('game.tasks'):
+                    self.tasks.step()
+                if self.tasks.ready:
+                    # Tasks ran out of budget: don't go idle on them.
+                    self.scheduler.wake()
                 if self.mixer:
-                    self.mixer.render(None)
-                if self.window:
-                    self.window.render(None)
+                    with profiler.section('mixer.render'):
+                        self.mixer.render(None)
+                for window in self.windows:
+                    with profiler.section('window.render'):
+                        window.render(None)
+                    if window.animated:
+                        # Keep rendering frames as long as anything is animating.
+                        self.scheduler.wake()
+                profiler.end_frame()
+
+                self.scheduler.wait()
 
     def shutdown(self):
         """ Shut game down. """
         with self.env:
+            self.tasks.close()
+            if self.events.instrumented:
+                self.events.dump_stats()
+            self.resources.shutdown()
             self.fs.clear()
 
     def suspend(self, event):
@@ -77,6 +133,19 @@ class Game:
         _log('Game resuming, releasing main loop lock.')
         self.active_lock.release()
 
+    def window_closed(self, event, window):
+        if window not in self.windows:
+            return
+        main = window is self.window
+        self.windows.remove(window)
+        # Closing the main window ends the game.
+        if main:
+            self.events.emit('game.stop')
+
+    def redraw(self, event, window=None):
+        # Make sure the requested redraw happens promptly rather than after an idle wait.
+        self.scheduler.wake()
+
     def __repr__(self):
         return '<{}: {}>'.format(self.__class__.__qualname__, self.name)
 
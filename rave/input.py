@@ -242,6 +242,8 @@ class Gesture(rave.common.IncrementingEnum):
 
 class Dispatcher:
     """ Keep track of input state and dispatch to contexts. """
+    MOUSE_MOVE_BARRIERS = ('input.mouse.press', 'input.mouse.release', 'input.mouse.scroll', 'input.dispatch')
+
     def __init__(self, bus):
         self.contexts = collections.OrderedDict()
         self.input_state = frozenset()
@@ -257,16 +259,15 @@ class Dispatcher:
 
     def register_hooks(self):
         """ Hook events from native input layer. """
-        self.bus.hook('input.keyboard.press', self.on_keyboard_key)
-        self.bus.hook('input.keyboard.repeat', self.on_keyboard_key)
-        self.bus.hook('input.keyboard.release', self.on_keyboard_key)
+        self.bus.hook('input.keyboard.*', self.on_keyboard_key)
         self.bus.hook('input.mouse.press', self.on_mouse_button)
         self.bus.hook('input.mouse.release', self.on_mouse_button)
         self.bus.hook('input.mouse.move', self.on_mouse_move)
         self.bus.hook('input.mouse.scroll', self.on_mouse_scroll)
-        self.bus.hook('input.controller.press', self.on_controller_button)
-        self.bus.hook('input.controller.release', self.on_controller_button)
+        self.bus.hook('input.controller.*', self.on_controller_button)
         self.bus.hook('input.dispatch', self.cached_dispatch)
+        # Deliver moves before any button presses or dispatch that follow them.
+        self.bus.defer('input.mouse.move', coalesce=self.coalesce_mouse_move, flush_on=self.MOUSE_MOVE_BARRIERS)
 
     def on_keyboard_key(self, event, sym, nativesym):
         sym = nativesym if sym == Key.OTHER else sym
@@ -285,6 +286,13 @@ class Dispatcher:
     def on_mouse_move(self, event, mouse, pos, relpos):
         pass
 
+    @staticmethod
+    def coalesce_mouse_move(old, new):
+        """ Merge two queued mouse move events, keeping the latest position and accumulating relative motion. """
+        mouse, pos, relpos = new
+        relpos = (old[2][0] + relpos[0], old[2][1] + relpos[1])
+        return (mouse, pos, relpos)
+
     def on_mouse_scroll(self, event, mouse, relpos):
         pass
 
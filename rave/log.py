@@ -10,9 +10,11 @@ As a module, use `rave.log.get(__name__)` to get the logger for your module.
 - err(message, *args, **kwargs): log message on ERROR level. See `inform`.
 - fatal(message, *args, **kwargs): log message on FATAL level. See `inform`.
 - exception(exception, message, *args, **kwargs): log exception. See `inform`.
+- isEnabledFor(level): whether messages on given level will be recorded, to avoid expensive work for messages that would be dropped.
 
-- hook(level, callback): hook any message from logger on given level. Callback will be called with the message level and message as arguments.
-- unhook(level, callback): remove previously installed hook.
+- hook(level, callback, raw=False): hook any message from logger on given level. Callback will be called with the message level and message as arguments.
+  Raw hooks are called with the logger, the message level and the unformatted `Message` instead, which carries the exception for EXCEPTION messages.
+- unhook(level, callback, raw=False): remove previously installed hook.
 - file: the file the logger is logging to.
 - formatter: the Python logging.Formatter instance associated with this logger.
 
@@ -20,37 +22,153 @@ As a module, use `rave.log.get(__name__)` to get the logger for your module.
 - DATE_FORMAT (static): the default format for the date used in the logging format.
 - FILE (static): the default logfile.
 - LEVEL (static): the level cutoff for which messages will be recorded.
+
+Messages are only formatted when they are actually written out or passed to hooks: the underlying logging records carry
+a `Message` object, which keeps the unformatted message and its arguments around for handlers that want them.
+
+Writing messages out happens on a shared background thread, so slow terminals or disks don't hold up the threads logging.
+The buffer between them is bounded: when it's full, messages below ERROR level are dropped or block according to the policy
+set with `set_policy()`, while more important messages always block. Call `flush()` to wait for all messages to be written,
+and `shutdown()` to stop the writer thread; messages are written synchronously after that.
 """
+import sys
+import atexit
+import queue
 import logging
+import logging.handlers
+import traceback
 
 
 ## Internals.
 
 _loggers = {}
+_global_hooks = []
+_names = {}
+
+class Message:
+    """ A log message that is formatted with its arguments on first use, usable as a LogRecord message. """
+    __slots__ = ('template', 'args', 'kwargs', 'exception', '_text')
+
+    def __init__(self, template, args, kwargs, exception=None):
+        self.template = template
+        self.args = args
+        self.kwargs = kwargs
+        self.exception = exception
+        self._text = None
+
+    def __str__(self):
+        if self._text is None:
+            self._text = self.template.format(*self.args, **self.kwargs)
+        return self._text
 
 class LogFilter(logging.Filter):
     """ Filter that adds current game information to every message, and reformats some of the names. """
     def filter(self, record):
-        from . import game
-
-        current = game.current()
-        if current:
-            record.source = current.name
-        else:
-            record.source = '<engine>'
+        record.source = get_source()
 
-        if record.name.startswith('rave.modules.'):
-            record.name = 'module:' + record.name.replace('rave.modules.', '', 1).split('.', 1)[0]
-        elif record.name.startswith('rave.'):
-            record.name = record.name.replace('rave.', '', 1)
+        name = _names.get(record.name)
+        if name is None:
+            name = _names[record.name] = _display_name(record.name)
+        record.name = name
 
         return True
 
+class LogPipeline:
+    """ A bounded queue of (record, handlers) items, written out by a background thread. """
+    SIZE = 4096
+
+    def __init__(self, size=None, policy=None):
+        self.queue = queue.Queue(size or self.SIZE)
+        self.policy = policy or DROP
+        self.dropped = 0
+        self.writer = None
+
+    def start(self):
+        if self.writer:
+            return
+        self.writer = LogWriter(self.queue)
+        self.writer.start()
+
+    def put(self, item, important=False):
+        """ Queue (record, handlers) `item` for writing. Important items are never dropped. """
+        if not self.writer:
+            _write(item)
+            return
+
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            if self.policy == BLOCK or important:
+                self.queue.put(item)
+            else:
+                self.dropped += 1
+
+    def flush(self):
+        """ Wait until all queued messages have been written. """
+        if self.writer:
+            self.queue.join()
+
+    def stop(self):
+        """ Write all queued messages and stop the writer thread. """
+        if not self.writer:
+            return
+        self.writer.stop()
+        self.writer = None
+        if self.dropped:
+            sys.stderr.write('rave.log: dropped {} messages because the log queue was full.\n'.format(self.dropped))
+            self.dropped = 0
+
+class LogWriter(logging.handlers.QueueListener):
+    """ Queue listener writing (record, handlers) items to the handlers of the logger they originate from. """
+    def handle(self, item):
+        _write(item)
+
+    def enqueue_sentinel(self):
+        # Block rather than fail when the queue is full at shutdown.
+        self.queue.put(self._sentinel)
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    """ Handler passing records to the shared pipeline, along with the handlers they should be written to. """
+    def __init__(self, pipeline, handlers):
+        super().__init__(pipeline.queue)
+        self.pipeline = pipeline
+        self.handlers = handlers
+
+    def prepare(self, record):
+        # Format in the logging thread: the writer thread should never touch objects passed as message arguments.
+        record.message = record.getMessage()
+        return (record, self.handlers)
+
+    def enqueue(self, item):
+        self.pipeline.put(item, item[0].levelno >= logging.ERROR)
+
+def _write(item):
+    record, handlers = item
+    for handler in handlers:
+        try:
+            handler.handle(record)
+        except Exception:
+            # Like logging.Handler.handleError(): report and carry on, as an exception would kill the writer thread.
+            if logging.raiseExceptions:
+                sys.stderr.write('rave.log: error writing message to {!r}:\n'.format(handler))
+                traceback.print_exc(file=sys.stderr)
+
+def _display_name(name):
+    if name.startswith('rave.modules.'):
+        return 'module:' + name.replace('rave.modules.', '', 1).split('.', 1)[0]
+    elif name.startswith('rave.'):
+        return name.replace('rave.', '', 1)
+    return name
+
 logging.addLevelName(5, 'TRACE')
 
 
 ## API.
 
+# Policies for when the log queue is full.
+DROP = 'drop'
+BLOCK = 'block'
+
 # Log levels.
 EXCEPTION = 0x1
 FATAL = 0x2
@@ -78,6 +196,7 @@ class Logger:
         self._filter = filter or LogFilter()
         self._formatter = formatter or logging.Formatter(self.FORMAT, datefmt=self.DATE_FORMAT, style='{')
         self._hooks = { FATAL: [], ERROR: [], WARNING: [], INFO: [], DEBUG: [], TRACE: [], EXCEPTION: [] }
+        self._raw_hooks = { FATAL: [], ERROR: [], WARNING: [], INFO: [], DEBUG: [], TRACE: [], EXCEPTION: [] }
         self._level = level or self.LEVEL
 
         if name:
@@ -92,35 +211,51 @@ class Logger:
     def _setup_logger(self):
         """ Set logger settings. """
         self.logger.setLevel(0)
+        self.logger.addFilter(self.filter)
 
+        # Actual writing happens on the pipeline thread.
+        handlers = []
         handler = logging.StreamHandler()
         handler.setFormatter(self.formatter)
-        self.logger.addHandler(handler)
-        self.logger.addFilter(self.filter)
+        handlers.append(handler)
 
         if self.file:
             handler = logging.FileHandler(self.file)
             handler.setFormatter(self.formatter)
-            self.logger.addHandler(handler)
+            handlers.append(handler)
+
+        self.logger.addHandler(LogQueueHandler(_pipeline, handlers))
 
     def _call_hooks(self, level, message):
         """ Call hooks for `message` at log level `level`. """
-        for hook in self._hooks[level]:
-            hook(level, message)
+        for hook in self._raw_hooks[level]:
+            hook(self, level, message)
+
+        hooks = self._hooks[level]
+        if hooks:
+            message = str(message)
+            for hook in hooks:
+                hook(level, message)
+
+    def _log(self, level, pylevel, message, args, kwargs):
+        message = Message(message, args, kwargs)
+        self.logger.log(pylevel, message)
+        self._call_hooks(level, message)
 
 
-    def hook(self, level, callback):
+    def hook(self, level, callback, raw=False):
         """
         Hook logger messages at `level` with `callback`.
         The callback will be called for each message at the given level with two arguments:
         - The log level the message applies to.
         - The actual log message.
+        If `raw` is True, the callback is called with this logger, the log level and the unformatted `Message` instead.
         """
-        self._hooks[level].append(callback)
+        (self._raw_hooks if raw else self._hooks)[level].append(callback)
 
-    def unhook(self, level, callback):
+    def unhook(self, level, callback, raw=False):
         """ Unhook level with callback. """
-        self._hooks[level].remove(callback)
+        (self._raw_hooks if raw else self._hooks)[level].remove(callback)
 
     @property
     def name(self):
@@ -169,6 +304,10 @@ class Logger:
     def level(self, value):
         self._level = value
 
+    def isEnabledFor(self, level):
+        """ Whether messages on `level` will be recorded. Levels are bits of the level mask, so this is a single test. """
+        return self._level & level != 0
+
 
 
     def __call__(self, *args, **kwargs):
@@ -176,64 +315,97 @@ class Logger:
 
     def trace(self, message, *args, **kwargs):
         """ Log TRACE message. """
-        if self.level & TRACE:
-            message = message.format(*args, **kwargs)
-            self.logger.log(5, message)
-            self._call_hooks(TRACE, message)
+        if self._level & TRACE:
+            self._log(TRACE, 5, message, args, kwargs)
 
     def debug(self, message, *args, **kwargs):
         """ Log DEBUG message. """
-        if self.level & DEBUG:
-            message = message.format(*args, **kwargs)
-            self.logger.debug(message)
-            self._call_hooks(DEBUG, message)
+        if self._level & DEBUG:
+            self._log(DEBUG, logging.DEBUG, message, args, kwargs)
 
     def inform(self, message, *args, **kwargs):
         """ Log INFO message. """
-        if self.level & INFO:
-            message = message.format(*args, **kwargs)
-            self.logger.info(message)
-            self._call_hooks(INFO, message)
+        if self._level & INFO:
+            self._log(INFO, logging.INFO, message, args, kwargs)
 
     def warn(self, message, *args, **kwargs):
         """ Log WARNING message. """
-        if self.level & WARNING:
-            message = message.format(*args, **kwargs)
-            self.logger.warning(message)
-            self._call_hooks(WARNING, message)
+        if self._level & WARNING:
+            self._log(WARNING, logging.WARNING, message, args, kwargs)
 
     def err(self, message, *args, **kwargs):
         """ Log ERROR message. """
-        if self.level & ERROR:
-            message = message.format(*args, **kwargs)
-            self.logger.error(message)
-            self._call_hooks(ERROR, message)
+        if self._level & ERROR:
+            self._log(ERROR, logging.ERROR, message, args, kwargs)
 
     def fatal(self, message, *args, **kwargs):
         """ Log FATAL message. """
-        if self.level & FATAL:
-            message = message.format(*args, **kwargs)
-            self.logger.fatal(message)
-            self._call_hooks(FATAL, message)
+        if self._level & FATAL:
+            self._log(FATAL, logging.FATAL, message, args, kwargs)
 
     def exception(self, exception, message='', *args, **kwargs):
         """ Log exception. """
-        if self.level & EXCEPTION:
+        if self._level & EXCEPTION:
             self.logger.exception(exception)
-            self._call_hooks(EXCEPTION, message)
+            self._call_hooks(EXCEPTION, Message(message, args, kwargs, exception))
 
 
 def get(name, file=None):
     """ Get logger by module name. """
     if name not in _loggers:
-        _loggers[name] = Logger(name, file=file)
+        logger = _loggers[name] = Logger(name, file=file)
+        for level, callback, raw in _global_hooks:
+            logger.hook(level, callback, raw)
     else:
         if file and _loggers[name].file != file:
             _loggers[name].file = file
     return _loggers[name]
 
+def hook(level, callback, raw=False):
+    """ Hook messages at `level` from all current and future loggers with `callback`. See `Logger.hook()`. """
+    _global_hooks.append((level, callback, raw))
+    for logger in _loggers.values():
+        logger.hook(level, callback, raw)
+
+def unhook(level, callback, raw=False):
+    _global_hooks.remove((level, callback, raw))
+    for logger in _loggers.values():
+        logger.unhook(level, callback, raw)
+
+def get_source():
+    """ Get the name of the game code is currently running for, or '<engine>' if it's running for the engine itself. """
+    from . import execution
+
+    # Environment lookups are a context variable read, and games can be renamed, so the name is not cached.
+    env = execution.current()
+    if not env or not env.game:
+        return '<engine>'
+    return env.game.name
+
+def set_policy(policy):
+    """ Set what to do with messages below ERROR level when the log queue is full: DROP them or BLOCK until there is room. """
+    _pipeline.policy = policy
+
+def write(handler, record, important=False):
+    """ Have `handler.handle(record)` called on the writer thread, subject to the queue policy unless `important` is set. """
+    _pipeline.put((record, [handler]), important)
+
+def flush():
+    """ Wait until all logged messages have been written. """
+    _pipeline.flush()
+
+def shutdown():
+    """ Write all queued messages and stop the writer thread. Messages logged afterwards are written synchronously. """
+    _pipeline.stop()
+
 def set_level(level):
     """ Set rave loggers log level. """
     Logger.LEVEL = level
     for logger in _loggers.values():
         logger.level = level
+
+
+# The shared writer thread.
+_pipeline = LogPipeline()
+_pipeline.start()
+atexit.register(_pipeline.stop)
@@ -0,0 +1,209 @@
+"""
+rave structured log output.
+
+Rather than human-oriented text, a structured sink writes log records consisting of timestamp, level, source game,
+logger name, unformatted message template and arguments, and the formatted traceback for exceptions, so logs can be
+filtered and aggregated afterwards using tools/logtool.py. Records are written as JSON lines, or in a more compact binary format:
+
+    header:  b'RAVELOG\\x02'
+    record:  u32 length, f64 timestamp, u8 level, followed by source, logger name, template, JSON-encoded [args, kwargs]
+             and traceback, each as u32 length and UTF-8 data. The traceback is empty for messages without exception.
+             All integers are little endian.
+
+JSON records only have an `exception` field when there is a traceback.
+
+Arguments that are not JSON scalars are stored as their repr(). Text that can not be encoded as UTF-8, such as lone
+surrogates, is written as backslash escapes. Records are written on the shared log writer thread, and files are rotated
+once they would exceed a maximum size. Write errors are reported to stderr rather than raised, like logging handlers do.
+"""
+import os
+import sys
+import json
+import time
+import struct
+import traceback
+
+import rave.log
+
+
+LEVEL_NAMES = {
+    rave.log.EXCEPTION: 'EXCEPTION',
+    rave.log.FATAL: 'FATAL',
+    rave.log.ERROR: 'ERROR',
+    rave.log.WARNING: 'WARNING',
+    rave.log.INFO: 'INFO',
+    rave.log.DEBUG: 'DEBUG',
+    rave.log.TRACE: 'TRACE',
+}
+IMPORTANT = rave.log.EXCEPTION | rave.log.FATAL | rave.log.ERROR
+
+
+class JSONFormat:
+    """ One JSON object per line. """
+    HEADER = b''
+
+    def encode(self, entry):
+        timestamp, level, source, name, template, args, kwargs, exception = entry
+        record = { 'time': timestamp, 'level': LEVEL_NAMES[level], 'source': source, 'logger': name, 'template': template, 'args': args, 'kwargs': kwargs }
+        if exception:
+            record['exception'] = exception
+        return (json.dumps(record, separators=(',', ':'), ensure_ascii=False) + '\n').encode('utf-8', 'backslashreplace')
+
+class BinaryFormat:
+    """ Length-prefixed binary records. """
+    HEADER = b'RAVELOG\x02'
+
+    def encode(self, entry):
+        timestamp, level, source, name, template, args, kwargs, exception = entry
+        fields = (source, name, template, json.dumps([ args, kwargs ], separators=(',', ':'), ensure_ascii=False), exception or '')
+        body = [ struct.pack('<dB', timestamp, level) ]
+        for field in fields:
+            data = field.encode('utf-8', 'backslashreplace')
+            body.append(struct.pack('<I', len(data)))
+            body.append(data)
+        body = b''.join(body)
+        return struct.pack('<I', len(body)) + body
+
+FORMATS = {
+    'json': JSONFormat,
+    'binary': BinaryFormat,
+}
+
+
+class StructuredSink:
+    """
+    Writes structured records of messages from all rave loggers to `path`, in `format` ('json' or 'binary').
+    Once the file would exceed `max_bytes`, it is rotated to `path`.1, keeping up to `backups` older files.
+    """
+    MAX_BYTES = 16 * 1024 * 1024
+    BACKUPS = 5
+    LEVEL = rave.log.EXCEPTION | rave.log.FATAL | rave.log.ERROR | rave.log.WARNING | rave.log.INFO | rave.log.DEBUG | rave.log.TRACE
+
+    def __init__(self, path, format='json', max_bytes=None, backups=None, level=None):
+        self.path = path
+        self.format = FORMATS[format]()
+        self.max_bytes = max_bytes if max_bytes is not None else self.MAX_BYTES
+        self.backups = backups if backups is not None else self.BACKUPS
+        self.level = level or self.LEVEL
+        self.installed = False
+        self.errors = 0
+        self._file = None
+        self._size = 0
+
+    def __repr__(self):
+        return '<{}: {} ({})>'.format(self.__class__.__qualname__, self.path, self.format.__class__.__name__)
+
+    def install(self):
+        """ Start recording messages from all current and future loggers. """
+        if self.installed:
+            return
+        for level in LEVEL_NAMES:
+            if self.level & level:
+                rave.log.hook(level, self.on_message, raw=True)
+        self.installed = True
+
+    def uninstall(self):
+        if not self.installed:
+            return
+        for level in LEVEL_NAMES:
+            if self.level & level:
+                rave.log.unhook(level, self.on_message, raw=True)
+        self.installed = False
+
+    def close(self):
+        """ Stop recording messages and close the file once everything queued has been written. """
+        self.uninstall()
+        rave.log.flush()
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+    def on_message(self, logger, level, message):
+        # Arguments are converted here rather than on the writer thread, which should not touch game objects.
+        args = [ _convert(arg) for arg in message.args ]
+        kwargs = { key: _convert(value) for key, value in message.kwargs.items() }
+        exception = _format_exception(message.exception) if message.exception is not None else None
+        entry = (time.time(), level, rave.log.get_source(), logger.name, message.template, args, kwargs, exception)
+        rave.log.write(self, entry, important=bool(level & IMPORTANT))
+
+    def handle(self, entry):
+        """ Write `entry`. Called on the writer thread. """
+        try:
+            data = self.format.encode(entry)
+            if self._file is None:
+                self._open()
+            elif self.max_bytes and self._size + len(data) > self.max_bytes and self._size > len(self.format.HEADER):
+                self._rotate()
+
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+        except (OSError, ValueError) as e:
+            self._error(e)
+
+    def _error(self, error):
+        # Only report the first error, as a full disk or missing directory would fail every record.
+        self.errors += 1
+        if self.errors == 1:
+            sys.stderr.write('rave.logsink: could not write to {}: {}\n'.format(self.path, error))
+
+        # Reopen the file on the next record, in case the problem was temporary.
+        if isinstance(error, OSError) and self._file:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.format.HEADER and not self._compatible():
+            # Never append to a file in another format or format version.
+            self._shift()
+        self._file = open(self.path, 'ab')
+        self._size = self._file.tell()
+        if not self._size and self.format.HEADER:
+            self._file.write(self.format.HEADER)
+            self._size = len(self.format.HEADER)
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        self._shift()
+        self._open()
+
+    def _shift(self):
+        """ Move the current file to the first backup, shifting older backups along. """
+        if self.backups:
+            for i in range(self.backups - 1, 0, -1):
+                source = '{}.{}'.format(self.path, i)
+                if os.path.exists(source):
+                    os.replace(source, '{}.{}'.format(self.path, i + 1))
+            os.replace(self.path, self.path + '.1')
+        else:
+            os.remove(self.path)
+
+    def _compatible(self):
+        """ Whether the file at our path is missing, empty or starts with our format header. """
+        try:
+            with open(self.path, 'rb') as f:
+                header = f.read(len(self.format.HEADER))
+        except FileNotFoundError:
+            return True
+        return not header or header == self.format.HEADER
+
+
+## Internals.
+
+def _convert(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return repr(value)
+
+def _format_exception(exception):
+    if not isinstance(exception, BaseException):
+        return str(exception)
+    return ''.join(traceback.format_exception(type(exception), exception, exception.__traceback__)).rstrip('\n')
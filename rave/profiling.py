@@ -0,0 +1,246 @@
+"""
+rave frame profiler.
+
+The frame profiler records how long every phase of a frame takes, both on the CPU (measured around sections of code)
+and on the GPU (as reported by the video backend). It keeps a rolling window of timings per section, from which
+percentiles can be computed, and a bounded trace of recent sections that can be exported in the Chrome trace event format,
+for viewing in chrome://tracing or Perfetto.
+
+Profiling is disabled by default and costs next to nothing in that state: enable it with `FrameProfiler.enable()`
+or `rave.profiling.enable()` for the current game.
+"""
+import os
+import json
+import math
+import time
+import threading
+import collections
+import rave.log
+import rave.rendering
+
+_log = rave.log.get(__name__)
+
+
+class NullSection:
+    """ Section context used while profiling is disabled. """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exctype, excval, exctb):
+        pass
+
+class Section:
+    """ Context manager timing a section of code. """
+    __slots__ = ('profiler', 'name', 'category', 'start')
+
+    def __init__(self, profiler, name, category):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exctype, excval, exctb):
+        end = time.perf_counter()
+        self.profiler.record(self.name, end - self.start, start=self.start, category=self.category)
+
+_null_section = NullSection()
+
+
+class FrameProfiler:
+    """
+    Per-section frame timing, with timings in seconds.
+    Timings of the last `HISTORY` frames are kept per section, and trace events for the last `TRACE_FRAMES` frames.
+    """
+    HISTORY = 300
+    TRACE_FRAMES = 600
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, history=None, trace_frames=None):
+        self.history = history or self.HISTORY
+        self.trace_frames = trace_frames or self.TRACE_FRAMES
+        self.enabled = False
+        self.frame = 0
+        self.timings = {}
+        self.trace = collections.deque()
+        self._frame_start = None
+        self._epoch = time.perf_counter()
+
+    def __repr__(self):
+        return '<{}: {}, {} sections>'.format(self.__class__.__qualname__, 'enabled' if self.enabled else 'disabled', len(self.timings))
+
+
+    ## Control.
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        """ Forget all recorded timings. """
+        self.frame = 0
+        self.timings.clear()
+        self.trace.clear()
+
+
+    ## Recording.
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self.frame += 1
+        self._frame_start = time.perf_counter()
+
+        # Drop trace events of frames that fell out of the window.
+        oldest = self.frame - self.trace_frames
+        while self.trace and self.trace[0][0] <= oldest:
+            self.trace.popleft()
+
+    def end_frame(self):
+        if not self.enabled or self._frame_start is None:
+            return
+        end = time.perf_counter()
+        self.record('frame', end - self._frame_start, start=self._frame_start)
+        self._frame_start = None
+
+    def section(self, name, category='cpu'):
+        """ Get a context manager timing the enclosed code as section `name`. """
+        if not self.enabled:
+            return _null_section
+        return Section(self, name, category)
+
+    def record(self, name, duration, start=None, category='cpu'):
+        """
+        Record that section `name` took `duration` seconds, starting at `start` as given by time.perf_counter().
+        Timings measured elsewhere, such as on the GPU, can be recorded without a start time; they won't show up in traces.
+        """
+        if not self.enabled:
+            return
+
+        timings = self.timings.get(name)
+        if timings is None:
+            timings = self.timings[name] = collections.deque(maxlen=self.history)
+        timings.append(duration)
+
+        if start is not None:
+            self.trace.append((self.frame, name, category, start, duration, threading.get_ident()))
+
+
+    ## Statistics.
+
+    def percentiles(self, name, percentiles=None):
+        """ Get a {percentile: seconds} dict for section `name` over the rolling window, or None if it has no timings. """
+        timings = self.timings.get(name)
+        if not timings:
+            return None
+
+        ordered = sorted(timings)
+        result = {}
+        for p in (percentiles or self.PERCENTILES):
+            # Nearest-rank percentile.
+            rank = max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))
+            result[p] = ordered[rank]
+        return result
+
+    def stats(self, percentiles=None):
+        """ Get a {section: {percentile: seconds}} dict for all sections. """
+        return { name: self.percentiles(name, percentiles) for name in self.timings if self.timings[name] }
+
+    def summary(self, percentiles=None):
+        """ Get a human-readable summary of all section timings, in milliseconds. """
+        percentiles = percentiles or self.PERCENTILES
+        lines = []
+        for name, values in sorted(self.stats(percentiles).items()):
+            lines.append('{}: {}'.format(name, ' '.join('p{}={:.2f}ms'.format(p, values[p] * 1000) for p in percentiles)))
+        return '\n'.join(lines)
+
+
+    ## Export.
+
+    def export_trace(self, path):
+        """ Write recorded trace events to `path` on the host filesystem as Chrome trace event JSON. """
+        pid = os.getpid()
+        events = []
+        for frame, name, category, start, duration, tid in self.trace:
+            events.append({
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': (start - self._epoch) * 1000000,
+                'dur': duration * 1000000,
+                'pid': pid,
+                'tid': tid,
+                'args': { 'frame': frame },
+            })
+
+        with open(path, 'w') as f:
+            json.dump({ 'traceEvents': events, 'displayTimeUnit': 'ms' }, f)
+        _log.debug('Exported {n} trace events to {path}.', n=len(events), path=path)
+
+
+class Overlay(rave.rendering.Drawable):
+    """ A drawable showing a summary of profiler timings, refreshed every `interval` seconds, using `font` created by the video backend. """
+    INTERVAL = 0.5
+    animated = True
+
+    def __init__(self, profiler, font, size=12, color=(1.0, 0.0, 0.0, 1.0), interval=None):
+        self.profiler = profiler
+        self.font = font
+        self.size = size
+        self.color = color
+        self.interval = interval or self.INTERVAL
+        self.position = (0, 0)
+        self.text = None
+        self._updated = None
+
+    def render(self, target):
+        now = time.perf_counter()
+        if self._updated is None or now - self._updated >= self.interval:
+            self._updated = now
+            summary = self.profiler.summary() or 'No timings.'
+            # Reuse the same text drawable, so its GL objects aren't recreated every interval.
+            if self.text is None:
+                self.text = self.font.create_text(summary, size=self.size, color=self.color)
+            else:
+                self.text.string = summary
+            self.text.position = self.position
+        self.text.render(target)
+
+
+## Stateful API.
+
+def current():
+    """ Get the frame profiler of the current game. """
+    import rave.game
+    game = rave.game.current()
+    if not game:
+        return None
+    return game.profiler
+
+def enable():
+    current().enable()
+
+def disable():
+    current().disable()
+
+def section(name, category='cpu'):
+    profiler = current()
+    if not profiler:
+        return _null_section
+    return profiler.section(name, category)
+
+def record(name, duration, start=None, category='cpu'):
+    profiler = current()
+    if profiler:
+        profiler.record(name, duration, start=start, category=category)
+
+def enabled():
+    profiler = current()
+    return bool(profiler and profiler.enabled)
@@ -1,6 +1,7 @@
 """
 rave rendering primitives.
 """
+import rave.events
 
 
 ## Base classes.
@@ -12,8 +13,20 @@ class Renderable:
 
 
 class Drawable(Renderable):
-    """ Something that can be rendered visually. """
-    pass
+    """
+    Something that can be rendered visually.
+    Drawables that change every frame should set `animated`, so windows containing them are redrawn continuously.
+    Other drawables should call `changed()` whenever they change. `layer` is the layer containing the drawable, if any.
+    """
+    animated = False
+    layer = None
+
+    def changed(self):
+        """ Mark the drawable as changed, invalidating the layer it is in, or requesting a redraw if it is in none. """
+        if self.layer is not None:
+            self.layer.invalidate()
+        else:
+            request_redraw()
 
 
 class Soundable(Renderable):
@@ -25,30 +38,53 @@ class Soundable(Renderable):
 ## Visual rendering.
 
 class Layer(Drawable):
-    """ A layer of drawables within a window. """
-    __slots__ = ('name', 'children')
+    """
+    A layer of drawables within a window.
+    The layer `generation` is increased whenever its contents change. Renderers that cache layer contents can compare it
+    against the generation they last rendered to know when to refresh them, even when the layer is shown in several windows.
+    """
+    __slots__ = ('name', 'children', 'generation')
 
     def __init__(self, name):
         self.name = name
         self.children = []
+        self.generation = 0
 
     def add_child(self, child):
         self.children.append(child)
+        child.layer = self
+        self.invalidate()
+
+    def remove_child(self, child):
+        self.children.remove(child)
+        child.layer = None
+        self.invalidate()
+
+    def invalidate(self):
+        """ Mark layer contents as changed and schedule a redraw. Cached contents of other layers are kept. """
+        self.generation += 1
+        request_redraw()
+
+    @property
+    def animated(self):
+        return any(child.animated for child in self.children)
 
     def render(self, target):
         for child in self.children:
             child.render(target)
 
 class PixelFormat:
-    """ Image pixel format. """
+    """ Image pixel format. Compressed formats store pixels in fixed-size blocks of `block_width` x `block_height` pixels. """
     __slots__ = (
         'r_bits', 'g_bits', 'b_bits', 'a_bits',
         'type', 'order',
         'r_mask', 'g_mask', 'b_mask', 'a_mask',
-        'r_shift', 'g_shift', 'b_shift', 'a_shift'
+        'r_shift', 'g_shift', 'b_shift', 'a_shift',
+        'compression', 'block_width', 'block_height', 'block_size'
     )
-    TYPE_ARRAY  = 1
-    TYPE_PACKED = 2
+    TYPE_ARRAY      = 1
+    TYPE_PACKED     = 2
+    TYPE_COMPRESSED = 3
 
     def __init__(self, **kwargs):
         self.r_bits  = kwargs.get('r_bits', 8)
@@ -65,6 +101,24 @@ class PixelFormat:
         self.g_shift = kwargs.get('g_shift', 16)
         self.b_shift = kwargs.get('b_shift', 24)
         self.a_shift = kwargs.get('a_shift', 0)
+        self.compression  = kwargs.get('compression', None)
+        self.block_width  = kwargs.get('block_width', 4)
+        self.block_height = kwargs.get('block_height', 4)
+        self.block_size   = kwargs.get('block_size', 16)
+
+    @property
+    def compressed(self):
+        return self.type == self.TYPE_COMPRESSED
+
+    def data_size(self, width, height):
+        """ Get the size in bytes of image data of the given dimensions in this format. """
+        if self.compressed:
+            blocks_x = (width + self.block_width - 1) // self.block_width
+            blocks_y = (height + self.block_height - 1) // self.block_height
+            return blocks_x * blocks_y * self.block_size
+
+        bits = self.r_bits + self.g_bits + self.b_bits + self.a_bits
+        return width * height * bits // 8
 
 # Some standard formats.
 PixelFormat.FORMAT_RGB565   = PixelFormat(r_bits=5, g_bits=6, b_bits=5, a_bits=0, type=PixelFormat.TYPE_PACKED, r_mask=0xF800, g_mask=0x07E0, b_mask=0x1F, r_shift=11, g_shift=5, b_shift=0)
@@ -72,3 +126,22 @@ PixelFormat.FORMAT_RGBA8888 = PixelFormat(type=PixelFormat.TYPE_ARRAY, order=['r
 PixelFormat.FORMAT_ABGR8888 = PixelFormat(type=PixelFormat.TYPE_ARRAY, order=['a', 'b', 'g', 'r'])
 PixelFormat.FORMAT_BGRA8888 = PixelFormat(type=PixelFormat.TYPE_ARRAY, order=['b', 'g', 'r', 'a'])
 PixelFormat.FORMAT_ARGB8888 = PixelFormat(type=PixelFormat.TYPE_ARRAY, order=['a', 'r', 'g', 'b'])
+
+# Some standard block compressed formats.
+PixelFormat.FORMAT_BC1        = PixelFormat(type=PixelFormat.TYPE_COMPRESSED, compression='BC1', r_bits=5, g_bits=6, b_bits=5, a_bits=0, block_size=8)
+PixelFormat.FORMAT_BC1A       = PixelFormat(type=PixelFormat.TYPE_COMPRESSED, compression='BC1', r_bits=5, g_bits=6, b_bits=5, a_bits=1, block_size=8)
+PixelFormat.FORMAT_BC2        = PixelFormat(type=PixelFormat.TYPE_COMPRESSED, compression='BC2', r_bits=5, g_bits=6, b_bits=5, a_bits=4, block_size=16)
+PixelFormat.FORMAT_BC3        = PixelFormat(type=PixelFormat.TYPE_COMPRESSED, compression='BC3', r_bits=5, g_bits=6, b_bits=5, a_bits=8, block_size=16)
+PixelFormat.FORMAT_ETC2_RGB8  = PixelFormat(type=PixelFormat.TYPE_COMPRESSED, compression='ETC2', a_bits=0, block_size=8)
+PixelFormat.FORMAT_ETC2_RGBA8 = PixelFormat(type=PixelFormat.TYPE_COMPRESSED, compression='ETC2', block_size=16)
+
+
+## Stateful API.
+
+def request_redraw(window=None):
+    """
+    Request `window` to be redrawn on the next frame, or all windows if no window is given.
+    This only schedules a frame: cached layers are only re-rendered if they were invalidated, so drawables in layers
+    should use `Drawable.changed()` instead.
+    """
+    rave.events.emit('video.redraw', window)
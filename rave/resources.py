@@ -4,11 +4,17 @@ rave resource manager.
 Resource loaders can register themselves with the ResourceManager using register_loader().
 Loaders registered should take the following API:
  - loader.can_load(path, obj): Figure out if the given file object (a rave.filesystem.File instance) is fit to be loaded. Seeking/reading allowed.
- - loader.load(path, obj): Decode the given file object. Must return either ImageData, AudioData, or Renderable. ImageData and AudioData instances
-     will be passed to create_drawable()/create_soundable() of the current video/audio backends.
+ - loader.load(path, obj): Decode the given file object. Must return either ImageData, AudioData, FontData or Renderable. ImageData and AudioData instances
+     will be passed to create_drawable()/create_soundable() of the current video/audio backends, FontData instances to create_font()
+     of the current video backend.
+
+Resources can be loaded in worker threads using load_deferred(). In that case, loaders and create_drawable()/create_soundable()
+of the current backends are invoked from the worker thread, and should not make calls that are bound to the main thread.
 """
 import os
 import re
+import concurrent.futures
+import rave.execution
 import rave.common
 import rave.filesystem
 import rave.rendering
@@ -44,6 +50,10 @@ class ImageData:
     def get_data(self, amount=None):
         raise NotImplementedError()
 
+    def get_mipmaps(self):
+        """ Get precomputed mipmap levels as a list of (width, height, data) tuples, largest first, or an empty list if there are none. """
+        return []
+
 class AudioData:
     """ Abstract class to hold decoded audio data. """
     __slots__ = ('channels', 'sample_rate', 'bit_depth', 'streaming')
@@ -58,11 +68,49 @@ class AudioData:
         raise NotImplementedError()
 
 
+class GlyphData:
+    """
+    A rasterized glyph: an 8-bit coverage bitmap of `width` x `height` pixels in `data`, with rows tightly packed.
+    The bitmap should be drawn `left` pixels right of the pen position and `top` pixels above the baseline,
+    after which the pen advances by `advance` pixels.
+    """
+    __slots__ = ('width', 'height', 'left', 'top', 'advance', 'data')
+
+    def __init__(self, width, height, left, top, advance, data):
+        self.width = width
+        self.height = height
+        self.left = left
+        self.top = top
+        self.advance = advance
+        self.data = data
+
+class FontData:
+    """ Abstract class to hold a loaded font, from which glyphs can be rasterized at any size. """
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def get_metrics(self, size):
+        """ Get an (ascent, descent, line height) tuple in pixels for the font at `size`. """
+        raise NotImplementedError()
+
+    def get_glyph(self, char, size):
+        """ Rasterize character `char` at `size`, returning a GlyphData instance. """
+        raise NotImplementedError()
+
+    def get_kerning(self, left, right, size):
+        """ Get the kerning adjustment in pixels between characters `left` and `right` at `size`. """
+        return 0
+
+
 class ResourceManager:
     """ Resource manager. Manages a game's loaders and resource loading. """
+    WORKERS = 2
 
     def __init__(self):
         self.loaders = {}
+        self._executor = None
 
     def load(self, path):
         loaders = []
@@ -80,8 +128,31 @@ class ResourceManager:
             return rave.backends.video.create_drawable(res)
         if isinstance(res, AudioData):
             return rave.backends.audio.create_soundable(res)
+        if isinstance(res, FontData):
+            return rave.backends.video.create_font(res)
         return res
 
+    def load_deferred(self, path):
+        """ Load resource in a worker thread. Returns a concurrent.futures.Future for the loaded resource. """
+        if not self._executor:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.WORKERS)
+
+        # Make sure the worker runs in the same execution environment as us.
+        env = rave.execution.current()
+        return self._executor.submit(self._load_in, env, path)
+
+    def _load_in(self, env, path):
+        if not env:
+            return self.load(path)
+        with env:
+            return self.load(path)
+
+    def shutdown(self):
+        """ Wait for pending deferred loads and stop worker threads. """
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
     def try_load(self, path, file, loaders):
         errs = []
 
@@ -124,6 +195,9 @@ def current():
 def load(path):
     return current().load(path)
 
+def load_deferred(path):
+    return current().load_deferred(path)
+
 def register_loader(loader, pattern=None):
     return current().load(loader, pattern=pattern)
 
@@ -0,0 +1,103 @@
+"""
+rave asynchronous tasks.
+
+Coroutines are run on an asyncio event loop that is not run continuously, but stepped by the game's main loop every frame
+for at most a given time budget. Tasks can do I/O and wait for events without blocking frames, while still running on the
+main thread in between frames, so they can safely touch game state.
+"""
+import asyncio
+import time
+import rave.log
+
+_log = rave.log.get(__name__)
+
+
+class TaskLoop:
+    """
+    An asyncio event loop stepped from the main loop.
+
+    Every `step()` runs loop iterations until no callbacks are ready or the time budget is spent.
+    I/O readiness and timers are only checked while stepping, so a task waiting on them resumes on the first frame after.
+    """
+    BUDGET = 0.004
+
+    def __init__(self, budget=None):
+        self.budget = budget if budget is not None else self.BUDGET
+        self.tasks = set()
+        self._loop = None
+
+    def __repr__(self):
+        return '<{}: {} tasks>'.format(self.__class__.__qualname__, len(self.tasks))
+
+    @property
+    def loop(self):
+        """ The underlying asyncio event loop, created on first use. """
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop
+
+    @property
+    def ready(self):
+        """ Whether the loop has callbacks ready to run, meaning the next step has work to do. """
+        # There is no public API for this; without it we just step once every frame.
+        return bool(self._loop and getattr(self._loop, '_ready', None))
+
+    def timeout(self, limit):
+        """ Get the time in seconds until the loop needs to be stepped again, capped at `limit`. """
+        if not self.tasks:
+            return limit
+        if self.ready:
+            return 0
+        scheduled = getattr(self._loop, '_scheduled', None)
+        if scheduled:
+            return max(0, min(limit, scheduled[0].when() - self._loop.time()))
+        return limit
+
+    def spawn(self, coro):
+        """ Schedule coroutine or other awaitable `coro` to run on the loop, returning its task. """
+        task = asyncio.ensure_future(coro, loop=self.loop)
+        self.tasks.add(task)
+        task.add_done_callback(self._finished)
+        return task
+
+    def step(self, budget=None):
+        """ Run the loop until nothing is ready anymore or `budget` seconds have passed. """
+        if not self.tasks:
+            return
+        loop = self._loop
+        deadline = time.perf_counter() + (budget if budget is not None else self.budget)
+
+        while True:
+            # Stopping from a callback makes run_forever() return after a single iteration.
+            loop.call_soon(loop.stop)
+            loop.run_forever()
+            if not self.ready or time.perf_counter() >= deadline:
+                break
+
+    def close(self):
+        """ Cancel all tasks and close the loop. """
+        if self._loop is None:
+            return
+        for task in self.tasks:
+            task.cancel()
+        if self.tasks:
+            self._loop.run_until_complete(asyncio.gather(*self.tasks, return_exceptions=True))
+        self._loop.close()
+        self._loop = None
+
+
+    def _finished(self, task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            _log.exception(task.exception(), 'Exception thrown in task {task}.', task=task)
+
+
+## Stateful API.
+
+def current():
+    """ Get current task loop. """
+    import rave.events
+    return rave.events.current().tasks
+
+def spawn(coro):
+    return current().spawn(coro)
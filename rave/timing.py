@@ -0,0 +1,136 @@
+"""
+rave frame timing.
+
+The frame scheduler paces a game's main loop: it runs game updates at a fixed timestep, limits the frame rate to a target,
+and tells the loop to block on the event source instead of spinning when nothing is animating.
+"""
+import time
+import rave.log
+
+_log = rave.log.get(__name__)
+
+
+class FrameScheduler:
+    """
+    Frame pacing and update scheduling for the main loop.
+
+    While anything is animating (see `begin_animation()`) or the scheduler has been woken (see `wake()`),
+    updates run at `tick_rate` fixed steps per second and frames are limited to `fps` frames per second.
+    When nothing is animating, the scheduler goes idle: the main loop should block on the event source for at most
+    `idle_timeout` seconds and run a single update with the delta time accumulated while waiting.
+    """
+    FPS = 60
+    TICK_RATE = 60
+    MAX_TICKS = 5
+    IDLE_TIMEOUT = 0.5
+
+    def __init__(self, fps=None, tick_rate=None, max_ticks=None, idle_timeout=None):
+        self.fps = fps if fps is not None else self.FPS
+        self.tick_rate = tick_rate or self.TICK_RATE
+        self.max_ticks = max_ticks or self.MAX_TICKS
+        self.idle_timeout = idle_timeout if idle_timeout is not None else self.IDLE_TIMEOUT
+
+        self._animations = 0
+        self._awake = True
+        self._idled = False
+        self._accumulator = 0.0
+        self._last = None
+        self._deadline = None
+
+    def __repr__(self):
+        return '<{}: {} FPS, {} ticks/s>'.format(self.__class__.__qualname__, self.fps or 'unlimited', self.tick_rate)
+
+
+    ## Idle handling.
+
+    def begin_animation(self):
+        """ Indicate something started animating, keeping the scheduler from going idle until `end_animation()`. """
+        self._animations += 1
+
+    def end_animation(self):
+        """ Indicate an animation started with `begin_animation()` has finished. """
+        if self._animations > 0:
+            self._animations -= 1
+
+    def wake(self):
+        """ Keep the scheduler active for at least the next frame. """
+        self._awake = True
+
+    @property
+    def animating(self):
+        """ Whether anything is currently animating. """
+        return self._animations > 0
+
+    @property
+    def idle(self):
+        """ Whether the main loop can block on the event source for the next frame. """
+        return not self._animations and not self._awake
+
+
+    ## Frame scheduling.
+
+    @property
+    def tick_interval(self):
+        """ The fixed timestep of a single update, in seconds. """
+        return 1 / self.tick_rate
+
+    @property
+    def frame_interval(self):
+        """ The target duration of a single frame, in seconds, or 0 if the frame rate is unlimited. """
+        return 1 / self.fps if self.fps else 0
+
+    def start(self):
+        """ (Re)start timing, forgetting about any accumulated time. """
+        self._last = time.perf_counter()
+        self._deadline = self._last
+        self._accumulator = 0.0
+        self._awake = True
+        self._idled = False
+
+    def idled(self):
+        """ Indicate the main loop has just been blocked waiting on events. """
+        self._idled = True
+
+    def ticks(self):
+        """
+        Advance the clock and return a list of delta times, one for every update to run this frame.
+
+        When active, this returns as many fixed timesteps as fit in the accumulated time, capped at `max_ticks`
+        to avoid spiraling when updates are slower than the tick rate. After idling, this returns a single update
+        with the time accumulated while waiting.
+        """
+        if self._last is None:
+            self.start()
+
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self._last = now
+        self._awake = False
+
+        if self._idled:
+            # Time spent blocking on events is passed as-is rather than caught up on in fixed steps.
+            self._idled = False
+            self._accumulator = 0.0
+            self._deadline = now
+            return [ elapsed ]
+
+        interval = self.tick_interval
+        self._accumulator = min(self._accumulator + elapsed, interval * self.max_ticks)
+
+        count = int(self._accumulator / interval)
+        self._accumulator -= count * interval
+        return [ interval ] * count
+
+    def wait(self):
+        """ Sleep until the next frame is due according to the target frame rate. """
+        interval = self.frame_interval
+        if not interval:
+            return
+
+        self._deadline += interval
+        now = time.perf_counter()
+        if self._deadline > now:
+            time.sleep(self._deadline - now)
+        else:
+            # We fell behind: don't try to catch up by rendering frames back-to-back.
+            self._deadline = now
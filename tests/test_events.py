@@ -1,5 +1,7 @@
+import gc
 from rave import events
 from .support.events import *
+from pytest import raises
 
 
 def test_dispatch(bus):
@@ -110,3 +112,239 @@ def test_dispatch_unhook_multiple_hooks(bus):
 	bus.emit('rave.testing.other')
 	assert cb_call_count == 1
 	assert cb2_call_count == 2
+
+def test_dispatch_hook_first(bus):
+	calls = []
+	bus.hook('rave.testing.test', lambda ev: calls.append(1))
+	bus.hook_first('rave.testing.test', lambda ev: calls.append(0))
+
+	bus.emit('rave.testing.test')
+	assert calls == [0, 1]
+
+def test_dispatch_unhook_during_emit(bus):
+	calls = []
+	def cb(ev):
+		calls.append(cb)
+		bus.unhook('rave.testing.test', cb)
+
+	def cb2(ev):
+		calls.append(cb2)
+
+	bus.hook('rave.testing.test', cb)
+	bus.hook('rave.testing.test', cb2)
+
+	bus.emit('rave.testing.test')
+	assert calls == [cb, cb2]
+
+	bus.emit('rave.testing.test')
+	assert calls == [cb, cb2, cb2]
+
+def test_emitter(bus):
+	args = []
+	def cb(ev, *a):
+		args.append(a)
+
+	emit = bus.emitter('rave.testing.test')
+	emit(1)
+	assert args == []
+
+	bus.hook('rave.testing.test', cb)
+	emit(2, 3)
+	assert args == [(2, 3)]
+
+def test_emit_batch(bus):
+	args = []
+	bus.hook('rave.testing.test', lambda ev, *a: args.append(a))
+
+	bus.emit_batch('rave.testing.test', [(1,), (2, 3), ()])
+	assert args == [(1,), (2, 3), ()]
+
+def test_deferred(bus):
+	calls = []
+	bus.hook('rave.testing.test', lambda ev, x: calls.append(x))
+	bus.defer('rave.testing.test')
+
+	bus.emit('rave.testing.test', 1)
+	bus.emitter('rave.testing.test')(2)
+	assert calls == []
+
+	assert bus.drain() == 2
+	assert calls == [1, 2]
+
+	bus.undefer('rave.testing.test')
+	bus.emit('rave.testing.test', 3)
+	assert calls == [1, 2, 3]
+
+def test_deferred_emit_during_drain(bus):
+	calls = []
+	def cb(ev, x):
+		calls.append(x)
+		if x < 2:
+			bus.emit('rave.testing.test', x + 1)
+
+	bus.hook('rave.testing.test', cb)
+	bus.defer('rave.testing.test')
+
+	bus.emit('rave.testing.test', 0)
+	bus.drain()
+	assert calls == [0]
+	bus.drain()
+	assert calls == [0, 1]
+
+def test_deferred_coalesce(bus):
+	calls = []
+	bus.hook('rave.testing.test', lambda ev, source, x: calls.append((source, x)))
+	bus.hook('rave.testing.other', lambda ev, source, x: calls.append((source, x)))
+	bus.defer('rave.testing.test', coalesce=True)
+	bus.defer('rave.testing.other')
+
+	a, b = object(), object()
+	bus.emit('rave.testing.test', a, 1)
+	bus.emit('rave.testing.other', a, 2)
+	bus.emit('rave.testing.test', b, 3)
+	bus.emit('rave.testing.test', a, 4)
+	bus.drain()
+	assert calls == [(a, 4), (a, 2), (b, 3)]
+
+def test_deferred_coalesce_merge(bus):
+	calls = []
+	bus.hook('rave.testing.test', lambda ev, source, x: calls.append(x))
+	bus.defer('rave.testing.test', coalesce=lambda old, new: (new[0], old[1] + new[1]))
+
+	for x in range(5):
+		bus.emit('rave.testing.test', None, x)
+	bus.drain()
+	assert calls == [10]
+
+def test_deferred_flush_on(bus):
+	calls = []
+	bus.hook('rave.testing.test', lambda ev, source, x: calls.append(x))
+	bus.hook('rave.testing.other', lambda ev, x: calls.append(x))
+	bus.defer('rave.testing.test', coalesce=True, flush_on=['rave.testing.other'])
+
+	bus.emit('rave.testing.test', None, 1)
+	bus.emit('rave.testing.test', None, 2)
+	bus.emit('rave.testing.other', 3)
+	bus.emitter('rave.testing.test')(None, 4)
+	bus.emitter('rave.testing.other')(5)
+	assert calls == [2, 3, 4, 5]
+
+	bus.undefer('rave.testing.test')
+	assert bus.barriers == set()
+
+def test_dispatch_priority(bus):
+	calls = []
+	bus.hook('rave.testing.test', lambda ev: calls.append(1))
+	bus.hook('rave.testing.test', lambda ev: calls.append(3), priority=-1)
+	bus.hook('rave.testing.test', lambda ev: calls.append(0), priority=10)
+	bus.hook('rave.testing.test', lambda ev: calls.append(2))
+
+	bus.emit('rave.testing.test')
+	assert calls == [0, 1, 2, 3]
+
+def test_dispatch_priority_unhook(bus):
+	calls = []
+	tokens = [ bus.hook('rave.testing.test', lambda ev, i=i: calls.append(i), priority=i % 3) for i in range(6) ]
+	bus.hook('rave.testing.*', lambda ev: calls.append('pattern'), priority=1)
+	bus.unhook(tokens[4])
+	bus.unhook(tokens[0])
+	bus.hook_first('rave.testing.test', lambda ev: calls.append('first'), priority=1)
+
+	bus.emit('rave.testing.test')
+	assert calls == [2, 5, 'first', 1, 'pattern', 3]
+
+def test_dispatch_unhook_token(bus):
+	calls = []
+	cb = lambda ev: calls.append(ev)
+
+	first = bus.hook('rave.testing.test', cb)
+	second = bus.hook('rave.testing.test', cb)
+	bus.unhook(first)
+	bus.emit('rave.testing.test')
+	assert calls == ['rave.testing.test']
+
+	bus.unhook(second)
+	bus.unhook(second)
+	assert 'rave.testing.test' not in bus.handlers
+
+def test_dispatch_unhook_unknown(bus):
+	with raises(ValueError):
+		bus.unhook('rave.testing.test', lambda ev: None)
+
+def test_dispatch_weak(bus):
+	calls = []
+	class Owner:
+		def cb(self, ev):
+			calls.append(ev)
+
+	owner = Owner()
+	bus.hook('rave.testing.test', owner.cb, weak=True)
+	bus.emit('rave.testing.test')
+	assert calls == ['rave.testing.test']
+
+	del owner
+	gc.collect()
+	assert 'rave.testing.test' not in bus.handlers
+	bus.emit('rave.testing.test')
+	assert calls == ['rave.testing.test']
+
+def test_dispatch_wildcard(bus):
+	calls = []
+	bus.hook('rave.testing.test', lambda ev: calls.append(('exact', ev)))
+	bus.hook('rave.*.test', lambda ev: calls.append(('single', ev)), priority=1)
+	bus.hook('rave.**', lambda ev: calls.append(('multi', ev)))
+
+	bus.emit('rave.testing.test')
+	bus.emit('rave.testing.other.test')
+	bus.emit('rave.new')
+	bus.emit('other.testing.test')
+	assert calls == [
+		('single', 'rave.testing.test'), ('exact', 'rave.testing.test'), ('multi', 'rave.testing.test'),
+		('multi', 'rave.testing.other.test'),
+		('multi', 'rave.new'),
+	]
+
+def test_dispatch_wildcard_after_emit(bus):
+	calls = []
+	emit = bus.emitter('rave.testing.test')
+	emit()
+
+	token = bus.hook('rave.testing.*', lambda ev: calls.append(ev))
+	emit()
+	bus.emit('rave.testing.other')
+	assert calls == ['rave.testing.test', 'rave.testing.other']
+
+	bus.unhook(token)
+	emit()
+	bus.emit('rave.testing.other')
+	assert calls == ['rave.testing.test', 'rave.testing.other']
+	assert not bus.handlers
+
+def test_instrument(bus):
+	def cb(ev):
+		pass
+	def failing(ev):
+		raise ValueError
+
+	bus.hook('rave.testing.test', cb)
+	bus.hook('rave.testing.test', failing)
+	bus.emit('rave.testing.test')
+	assert not bus.instrumented
+	assert bus.stats() == []
+
+	bus.instrument()
+	for _ in range(3):
+		bus.emit('rave.testing.test')
+
+	stats = { name.rsplit('.', 1)[1]: rest for event, name, *rest in bus.stats() }
+	assert stats['cb'][0] == 3
+	assert stats['cb'][3] == 0
+	assert stats['failing'][0] == 3
+	assert stats['failing'][3] == 3
+	assert stats['cb'][2] <= stats['cb'][1]
+
+	bus.instrument(False)
+	bus.emit('rave.testing.test')
+	assert bus.stats()[0][2] == 3
+	bus.reset_stats()
+	assert bus.stats() == []
@@ -0,0 +1,116 @@
+import threading
+from rave import execution
+from pytest import raises
+
+
+def test_push_pop():
+	env = execution.ExecutionEnvironment()
+	assert execution.current() is None
+
+	with env:
+		assert execution.current() is env
+	assert execution.current() is None
+
+def test_nesting():
+	outer = execution.ExecutionEnvironment()
+	inner = execution.ExecutionEnvironment()
+
+	with outer:
+		with inner:
+			assert execution.current() is inner
+		assert execution.current() is outer
+
+def test_pop_empty():
+	with raises(ValueError):
+		execution.pop()
+
+def test_threads_isolated():
+	env = execution.ExecutionEnvironment()
+	seen = []
+
+	def worker():
+		seen.append(execution.current())
+
+	with env:
+		thread = threading.Thread(target=worker)
+		thread.start()
+		thread.join()
+
+	assert seen == [None]
+
+def test_custom_identifier():
+	unit = 'a'
+	ident = lambda: unit
+	env = execution.ExecutionEnvironment()
+
+	execution.register_identifier(ident)
+	try:
+		with env:
+			assert execution.current() is env
+			unit = 'b'
+			assert execution.current() is None
+			unit = 'a'
+	finally:
+		execution.remove_identifier(ident)
+
+	assert execution.current() is None
+
+def test_identifier_keeps_active():
+	ident = lambda: 'a'
+	outer = execution.ExecutionEnvironment()
+	inner = execution.ExecutionEnvironment()
+
+	with outer:
+		execution.register_identifier(ident)
+		try:
+			assert execution.current() is outer
+			with inner:
+				assert execution.current() is inner
+			assert execution.current() is outer
+		finally:
+			execution.remove_identifier(ident)
+		assert execution.current() is outer
+	assert execution.current() is None
+
+def test_identifier_adopts_other_threads():
+	ident = lambda: 'a'
+	env = execution.ExecutionEnvironment()
+	pushed, switched, done = threading.Event(), threading.Event(), threading.Event()
+	seen = []
+
+	def worker():
+		with env:
+			pushed.set()
+			switched.wait()
+			seen.append(execution.current())
+		seen.append(execution.current())
+		done.set()
+
+	thread = threading.Thread(target=worker)
+	thread.start()
+	pushed.wait()
+	execution.register_identifier(ident)
+	try:
+		switched.set()
+		done.wait()
+	finally:
+		execution.remove_identifier(ident)
+	thread.join()
+
+	assert seen == [env, None]
+
+def test_identifier_refused_while_active_elsewhere():
+	unit = 'a'
+	ident = lambda: unit
+	env = execution.ExecutionEnvironment()
+
+	execution.register_identifier(ident)
+	try:
+		execution.push(env)
+		unit = 'b'
+		with raises(ValueError):
+			execution.remove_identifier(ident)
+		unit = 'a'
+		assert execution.pop() is env
+	finally:
+		execution.remove_identifier(ident)
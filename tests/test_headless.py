@@ -0,0 +1,119 @@
+import zlib
+import struct
+import numpy
+from rave import events, rendering, resources
+from modules.headless import Window, Image
+from pytest import fixture, approx
+
+
+class Pixels(resources.ImageData):
+	__slots__ = ('data',)
+
+	def __init__(self, width, height, data):
+		super().__init__(width, height)
+		self.data = data
+
+	def get_data(self, amount=None):
+		return self.data
+
+
+@fixture
+def bus(monkeypatch):
+	bus = events.EventBus()
+	monkeypatch.setattr(events, 'current', lambda: bus)
+	return bus
+
+@fixture
+def window(bus):
+	window = Window('test', 4, 3)
+	yield window
+	window.close()
+
+def quad(window, color, width=2, height=2):
+	layer = rendering.Layer('test')
+	layer.add_child(Image(Pixels(width, height, bytes(color) * width * height)))
+	window.add_layer(layer)
+	return layer
+
+def read_png(path):
+	with open(path, 'rb') as f:
+		data = f.read()
+	assert data[:8] == b'\x89PNG\r\n\x1a\n'
+
+	chunks = {}
+	offset = 8
+	while offset < len(data):
+		length, = struct.unpack_from('>I', data, offset)
+		kind = data[offset + 4:offset + 8]
+		body = data[offset + 8:offset + 8 + length]
+		crc, = struct.unpack_from('>I', data, offset + 8 + length)
+		assert crc == zlib.crc32(kind + body) & 0xFFFFFFFF
+		chunks[kind] = body
+		offset += 12 + length
+
+	width, height, depth, kind, _, _, _ = struct.unpack('>IIBBBBB', chunks[b'IHDR'])
+	assert (depth, kind) == (8, 6)
+	scanlines = numpy.frombuffer(zlib.decompress(chunks[b'IDAT']), dtype='uint8').reshape((height, 1 + width * 4))
+	assert not scanlines[:, 0].any()
+	return scanlines[:, 1:].reshape((height, width, 4))
+
+
+def test_render_quad(window):
+	quad(window, (255, 0, 0, 255))
+	window.render(None)
+	pixels = window.snapshot()
+
+	assert pixels.shape == (3, 4, 4)
+	assert (pixels[:2, :2] == (255, 0, 0, 255)).all()
+	assert (pixels[2:, :] == 255).all()
+	assert (pixels[:, 2:] == 255).all()
+
+def test_render_blend(window):
+	quad(window, (0, 0, 255, 51))
+	window.render(None)
+
+	assert window.framebuffer[0, 0] == approx([0.8, 0.8, 1.0, 1.0])
+
+def test_render_damage(window):
+	layer = quad(window, (255, 0, 0, 255))
+	window.render(None)
+	window.render(None)
+	assert window.frames == 1
+
+	layer.invalidate()
+	window.render(None)
+	assert window.frames == 2
+
+def test_dump(window, tmpdir):
+	quad(window, (0, 255, 0, 128))
+	window.render(None)
+	path = str(tmpdir.join('frame.png'))
+	window.dump(path)
+
+	assert (read_png(path) == window.snapshot()).all()
+
+def test_dump_path(window, tmpdir):
+	window.dump_path = str(tmpdir)
+	quad(window, (0, 255, 0, 255))
+	window.render(None)
+
+	assert (read_png(str(tmpdir.join(Window.DUMP_PATTERN.format(1)))) == window.snapshot()).all()
+
+def test_resize(window, bus):
+	resized = []
+	bus.hook('video.window.resized', lambda ev, *args: resized.append(args))
+	window.size = (8, 6)
+
+	assert resized == [(window.id, 8, 6)]
+	assert window.framebuffer.shape == (6, 8, 4)
+
+def test_close_other_bus(bus, monkeypatch):
+	window = Window('test', 4, 3)
+	window.render(None)
+	other = events.EventBus()
+	monkeypatch.setattr(events, 'current', lambda: other)
+	window.close()
+
+	bus.emit('video.redraw')
+	window.render(None)
+	assert window.frames == 1
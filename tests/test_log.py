@@ -0,0 +1,161 @@
+import time
+import logging
+import threading
+from rave import log, execution
+from pytest import fixture
+
+
+class Formattable:
+	def __init__(self):
+		self.count = 0
+
+	def __format__(self, spec):
+		self.count += 1
+		return 'formatted'
+
+class Capture(logging.Handler):
+	def __init__(self):
+		super().__init__()
+		self.records = []
+
+	def emit(self, record):
+		self.records.append(record)
+
+
+@fixture
+def logger():
+	logger = log.Logger('rave.testing', level=log.INFO)
+	logger.logger.handlers = []
+	logger.capture = Capture()
+	logger.logger.addHandler(logger.capture)
+	return logger
+
+def test_enabled(logger):
+	assert logger.isEnabledFor(log.INFO)
+	assert not logger.isEnabledFor(log.DEBUG)
+	logger.level = log.INFO | log.DEBUG
+	assert logger.isEnabledFor(log.DEBUG)
+
+def test_disabled_not_formatted(logger):
+	value = Formattable()
+	logger.debug('Value: {}', value)
+	assert value.count == 0
+	assert logger.capture.records == []
+
+def test_lazy_format(logger):
+	value = Formattable()
+	logger.inform('Value: {}', value)
+	assert value.count == 0
+
+	record, = logger.capture.records
+	assert record.msg.template == 'Value: {}'
+	assert record.msg.args == (value,)
+	assert record.getMessage() == 'Value: formatted'
+	assert record.getMessage() == 'Value: formatted'
+	assert value.count == 1
+
+def test_hooks_formatted(logger):
+	messages = []
+	logger.hook(log.INFO, lambda level, message: messages.append((level, message)))
+	logger.inform('Hello, {name}!', name='world')
+	assert messages == [(log.INFO, 'Hello, world!')]
+
+def test_hooks_raw_exception(logger):
+	messages = []
+	logger.level |= log.EXCEPTION
+	logger.hook(log.EXCEPTION, lambda logger, level, message: messages.append(message), raw=True)
+	error = ValueError('broken')
+	logger.exception(error, 'While {}:', 'testing')
+
+	message, = messages
+	assert message.exception is error
+	assert str(message) == 'While testing:'
+
+def test_filter_source(logger):
+	class Game:
+		name = 'testgame'
+
+	logger.inform('Engine.')
+	with execution.ExecutionEnvironment(Game()):
+		logger.inform('Game.')
+
+	engine, game = logger.capture.records
+	assert engine.source == '<engine>'
+	assert game.source == 'testgame'
+	assert game.name == 'testing'
+
+def test_filter_source_renamed(logger):
+	class Game:
+		name = 'testgame'
+
+	game = Game()
+	with execution.ExecutionEnvironment(game):
+		logger.inform('Before.')
+		game.name = 'renamed'
+		logger.inform('After.')
+
+	before, after = logger.capture.records
+	assert before.source == 'testgame'
+	assert after.source == 'renamed'
+
+def make_record(level=logging.INFO):
+	return logging.LogRecord('rave.testing', level, __file__, 0, 'Test.', (), None)
+
+def test_pipeline_threaded():
+	capture = Capture()
+	pipeline = log.LogPipeline()
+	pipeline.start()
+	try:
+		for _ in range(3):
+			pipeline.put((make_record(), [capture]))
+		pipeline.flush()
+		assert len(capture.records) == 3
+	finally:
+		pipeline.stop()
+
+def test_pipeline_handler_error(capsys):
+	class Failing(logging.Handler):
+		def emit(self, record):
+			raise ValueError('failing')
+		def handleError(self, record):
+			raise
+
+	capture = Capture()
+	pipeline = log.LogPipeline()
+	pipeline.start()
+	try:
+		pipeline.put((make_record(), [Failing(), capture]))
+		pipeline.put((make_record(), [capture]))
+		pipeline.flush()
+		assert len(capture.records) == 2
+	finally:
+		pipeline.stop()
+	assert 'ValueError: failing' in capsys.readouterr().err
+
+def test_pipeline_drop():
+	release = threading.Event()
+	class Blocking(Capture):
+		def emit(self, record):
+			release.wait()
+			super().emit(record)
+
+	capture = Blocking()
+	pipeline = log.LogPipeline(size=1)
+	pipeline.start()
+	try:
+		pipeline.put((make_record(), [capture]))
+		while not pipeline.queue.empty():
+			time.sleep(0.001)
+		pipeline.put((make_record(), [capture]))
+		pipeline.put((make_record(), [capture]))
+		assert pipeline.dropped == 1
+	finally:
+		release.set()
+		pipeline.stop()
+	assert len(capture.records) == 2
+
+def test_pipeline_stopped():
+	capture = Capture()
+	pipeline = log.LogPipeline()
+	pipeline.put((make_record(), [capture]))
+	assert len(capture.records) == 1
@@ -0,0 +1,145 @@
+import json
+import struct
+from rave import log, logsink
+from pytest import fixture
+
+
+@fixture
+def logger():
+	logger = log.Logger('rave.testing.sink', level=log.INFO | log.ERROR)
+	logger.logger.handlers = []
+	return logger
+
+def attach(sink, logger):
+	for level in logsink.LEVEL_NAMES:
+		logger.hook(level, sink.on_message, raw=True)
+
+def test_json(tmp_path, logger):
+	path = str(tmp_path / 'log.jsonl')
+	sink = logsink.StructuredSink(path, 'json')
+	attach(sink, logger)
+
+	value = object()
+	logger.inform('Hello, {}!', 'world')
+	logger.err('Broken: {thing}', thing=value)
+	sink.close()
+
+	with open(path) as f:
+		records = [ json.loads(line) for line in f ]
+	assert [ r['level'] for r in records ] == ['INFO', 'ERROR']
+	assert records[0]['template'] == 'Hello, {}!'
+	assert records[0]['args'] == ['world']
+	assert records[0]['logger'] == 'rave.testing.sink'
+	assert records[0]['source'] == '<engine>'
+	assert records[1]['kwargs'] == { 'thing': repr(value) }
+
+def test_binary(tmp_path, logger):
+	path = str(tmp_path / 'log.bin')
+	sink = logsink.StructuredSink(path, 'binary')
+	attach(sink, logger)
+
+	logger.inform('Count: {}', 3)
+	sink.close()
+
+	with open(path, 'rb') as f:
+		data = f.read()
+	assert data.startswith(logsink.BinaryFormat.HEADER)
+	data = data[len(logsink.BinaryFormat.HEADER):]
+
+	length, = struct.unpack_from('<I', data)
+	assert len(data) == 4 + length
+	timestamp, level = struct.unpack_from('<dB', data, 4)
+	assert level == log.INFO
+
+	offset = 4 + struct.calcsize('<dB')
+	fields = []
+	for _ in range(4):
+		size, = struct.unpack_from('<I', data, offset)
+		fields.append(data[offset + 4:offset + 4 + size].decode('utf-8'))
+		offset += 4 + size
+	assert fields[:3] == ['<engine>', 'rave.testing.sink', 'Count: {}']
+	assert json.loads(fields[3]) == [[3], {}]
+	size, = struct.unpack_from('<I', data, offset)
+	assert size == 0
+
+def test_rotation(tmp_path, logger):
+	path = str(tmp_path / 'log.jsonl')
+	sink = logsink.StructuredSink(path, 'json', max_bytes=300, backups=2)
+	attach(sink, logger)
+
+	for i in range(20):
+		logger.inform('Message {}', i)
+	sink.close()
+
+	assert sorted(p.name for p in tmp_path.iterdir()) == ['log.jsonl', 'log.jsonl.1', 'log.jsonl.2']
+	for name in ('log.jsonl', 'log.jsonl.1', 'log.jsonl.2'):
+		assert (tmp_path / name).stat().st_size <= 300
+	with open(path) as f:
+		assert json.loads(f.readlines()[-1])['args'] == [19]
+
+def test_surrogates(tmp_path, logger):
+	path = str(tmp_path / 'log.jsonl')
+	sink = logsink.StructuredSink(path, 'json')
+	attach(sink, logger)
+
+	logger.inform('Bad \udc80 path: {}', '\udcff')
+	sink.close()
+
+	with open(path, encoding='utf-8') as f:
+		record = json.loads(f.read())
+	assert record['template'] == 'Bad \udc80 path: {}'
+	assert record['args'] == ['\udcff']
+	assert sink.errors == 0
+
+def test_surrogates_binary(tmp_path, logger):
+	sink = logsink.StructuredSink(str(tmp_path / 'log.bin'), 'binary')
+	attach(sink, logger)
+
+	logger.inform('Bad \udc80 path: {}', '\udcff')
+	sink.close()
+	assert sink.errors == 0
+
+def test_write_error(tmp_path, logger, capsys):
+	(tmp_path / 'file').write_text('')
+	sink = logsink.StructuredSink(str(tmp_path / 'file' / 'log.jsonl'), 'json')
+	attach(sink, logger)
+
+	logger.inform('First.')
+	logger.inform('Second.')
+	sink.close()
+
+	assert sink.errors == 2
+	assert capsys.readouterr().err.count('rave.logsink: could not write') == 1
+
+def test_exception(tmp_path, logger):
+	path = str(tmp_path / 'log.jsonl')
+	sink = logsink.StructuredSink(path, 'json')
+	attach(sink, logger)
+	logger.level |= log.EXCEPTION
+
+	logger.inform('Fine.')
+	try:
+		raise ValueError('broken')
+	except ValueError as e:
+		logger.exception(e, 'While doing {}:', 'things')
+	sink.close()
+
+	with open(path) as f:
+		fine, failed = [ json.loads(line) for line in f ]
+	assert 'exception' not in fine
+	assert failed['level'] == 'EXCEPTION'
+	assert failed['args'] == ['things']
+	assert failed['exception'].startswith('Traceback (most recent call last):')
+	assert failed['exception'].endswith('ValueError: broken')
+
+def test_binary_incompatible(tmp_path, logger):
+	path = tmp_path / 'log.bin'
+	path.write_bytes(b'RAVELOG\x01old')
+	sink = logsink.StructuredSink(str(path), 'binary')
+	attach(sink, logger)
+
+	logger.inform('New.')
+	sink.close()
+
+	assert (tmp_path / 'log.bin.1').read_bytes() == b'RAVELOG\x01old'
+	assert path.read_bytes().startswith(logsink.BinaryFormat.HEADER)
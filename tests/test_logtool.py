@@ -0,0 +1,97 @@
+import os
+import time
+import importlib.util
+from rave import log, logsink
+from pytest import fixture
+
+
+@fixture(scope='module')
+def logtool():
+	# The tool is a standalone script rather than part of a package.
+	path = os.path.join(os.path.dirname(__file__), '..', 'tools', 'logtool.py')
+	spec = importlib.util.spec_from_file_location('rave_testing_logtool', path)
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	return module
+
+@fixture
+def logger():
+	logger = log.Logger('rave.testing.logtool', level=log.DEBUG | log.INFO | log.WARNING | log.ERROR | log.EXCEPTION)
+	logger.logger.handlers = []
+	return logger
+
+@fixture(params=['json', 'binary'])
+def written(request, tmp_path, logger):
+	""" Write some records through a sink, returning the path and the time between the first and the rest. """
+	path = str(tmp_path / ('log.' + request.param))
+	sink = logsink.StructuredSink(path, request.param)
+	for level in logsink.LEVEL_NAMES:
+		logger.hook(level, sink.on_message, raw=True)
+
+	logger.debug('Starting {}.', 'up')
+	# Records are timestamped when logged, so make sure they end up on either side of the split.
+	time.sleep(0.01)
+	split = time.time()
+	time.sleep(0.01)
+	logger.inform('Loaded {count} files.', count=3)
+	logger.warn('Slow frame: {:.1f}ms', 20.5)
+	logger.warn('Slow frame: {:.1f}ms', 30.5)
+	try:
+		raise ValueError('broken')
+	except ValueError as e:
+		logger.exception(e, 'Failed to {}:', 'load')
+	sink.close()
+	return path, split
+
+def filter_args(logtool, *argv):
+	return logtool.make_filter(logtool.parse_arguments(list(argv) + ['unused']))
+
+
+def test_read(logtool, written):
+	path, _ = written
+	records = list(logtool.read_records(path))
+
+	assert [ r['level'] for r in records ] == ['DEBUG', 'INFO', 'WARNING', 'WARNING', 'EXCEPTION']
+	assert { r['logger'] for r in records } == { 'rave.testing.logtool' }
+	assert { r['source'] for r in records } == { '<engine>' }
+	assert [ logtool.format_message(r) for r in records[:3] ] == ['Starting up.', 'Loaded 3 files.', 'Slow frame: 20.5ms']
+	assert records[0]['exception'] is None
+	assert records[4]['exception'].endswith('ValueError: broken')
+	assert logtool.format_record(records[4]).endswith('EXCEPTION: Failed to load:\n' + records[4]['exception'])
+
+def test_truncated(logtool, written):
+	path, _ = written
+	with open(path, 'rb') as f:
+		data = f.read()
+	with open(path, 'wb') as f:
+		f.write(data[:-10])
+
+	assert [ r['level'] for r in logtool.read_records(path) ] == ['DEBUG', 'INFO', 'WARNING', 'WARNING']
+
+def test_min_level(logtool, written):
+	path, _ = written
+	matches = filter_args(logtool, '--min-level', 'warning')
+
+	assert [ r['level'] for r in logtool.read_records(path) if matches(r) ] == ['WARNING', 'WARNING', 'EXCEPTION']
+
+def test_since(logtool, written):
+	path, split = written
+	matches = filter_args(logtool, '--since', str(split))
+	assert [ r['level'] for r in logtool.read_records(path) if matches(r) ] == ['INFO', 'WARNING', 'WARNING', 'EXCEPTION']
+
+	matches = filter_args(logtool, '--until', str(split))
+	assert [ r['level'] for r in logtool.read_records(path) if matches(r) ] == ['DEBUG']
+
+def test_grep(logtool, written):
+	path, _ = written
+	assert len([ r for r in logtool.read_records(path) if filter_args(logtool, '-g', '30.5ms')(r) ]) == 1
+	assert len([ r for r in logtool.read_records(path) if filter_args(logtool, '-g', 'ValueError')(r) ]) == 1
+
+def test_aggregate(logtool, written):
+	path, _ = written
+	counts = logtool.aggregate(logtool.read_records(path), 'template')
+
+	assert [ (value, count) for value, count, _, _ in counts ][0] == ('Slow frame: {:.1f}ms', 2)
+	assert len(counts) == 4
+	for _, _, first, last in counts:
+		assert first <= last
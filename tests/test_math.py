@@ -0,0 +1,76 @@
+import os
+import importlib.util
+import numpy
+from pytest import fixture, approx
+
+
+@fixture(scope='module')
+def glmath():
+	# Load the module by path: importing the modules.opengl package requires PyOpenGL.
+	path = os.path.join(os.path.dirname(__file__), '..', 'modules', 'opengl', 'common', 'math.py')
+	spec = importlib.util.spec_from_file_location('rave_testing_glmath', path)
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	return module
+
+def test_ortho(glmath):
+	# Top-left origin, as used for screen projections.
+	m = glmath.ortho(0, 200, 0, 100, 1, -1)
+	assert m.shape == (4, 4)
+	assert m @ [0, 0, 0, 1] == approx([-1, 1, 0, 1])
+	assert m @ [200, 100, 0, 1] == approx([1, -1, 0, 1])
+	# Column-major: the translation ends up in the last four elements.
+	assert glmath.to_gl(m).ravel()[12:15] == approx([-1, 1, 0])
+
+def test_affine2d(glmath):
+	m = glmath.affine2d(tx=[1, 2], ty=3, rotation=numpy.pi / 2, sx=2)
+	assert m.shape == (2, 3, 3)
+	assert m[0] @ [1, 0, 1] == approx([1, 5, 1], abs=1e-6)
+	assert m[1] @ [0, 1, 1] == approx([1, 3, 1], abs=1e-6)
+
+def test_inverse_affine2d(glmath):
+	m = glmath.affine2d(tx=[1, -4], ty=[2, 5], rotation=[0.3, -1.2], sx=[2, 0.5], sy=[1, 3])
+	inv = glmath.inverse_affine2d(m)
+	assert numpy.matmul(m, inv) == approx(numpy.broadcast_to(numpy.eye(3), (2, 3, 3)), abs=1e-5)
+
+	# In-place inversion is allowed.
+	glmath.inverse_affine2d(m, out=m)
+	assert m == approx(inv)
+
+def test_affine3d_inverse(glmath):
+	angle = 0.7
+	rotation = [0, 0, numpy.sin(angle / 2), numpy.cos(angle / 2)]
+	m = glmath.affine3d(translation=[[1, 2, 3], [-1, 0, 4]], rotation=rotation, scale=[2, 2, 2])
+	assert m.shape == (2, 4, 4)
+	assert numpy.matmul(m, glmath.inverse_affine3d(m)) == approx(numpy.broadcast_to(numpy.eye(4), (2, 4, 4)), abs=1e-5)
+	assert glmath.inverse(m) == approx(glmath.inverse_affine3d(m), abs=1e-5)
+
+def test_compose(glmath):
+	a = glmath.affine2d(tx=1)[0]
+	b = glmath.affine2d(sx=[2, 3])
+	c = glmath.affine2d(rotation=0.5)
+
+	result = glmath.compose([a, b, c])
+	assert result.shape == (2, 3, 3)
+	assert result == approx(a @ b @ c)
+
+	out = numpy.empty((2, 3, 3), dtype='float32')
+	assert glmath.compose([a, b, c], out=out) is out
+	assert out == approx(a @ b @ c)
+
+def test_affine2d_to_3d(glmath):
+	m = glmath.affine2d(tx=4, ty=5, rotation=0.25)
+	m3 = glmath.affine2d_to_3d(m)
+	x, y, _ = m[0] @ [1, 2, 1]
+	assert m3[0] @ [1, 2, 7, 1] == approx([x, y, 7, 1], abs=1e-6)
+
+def test_transform_points(glmath):
+	m = glmath.affine2d(tx=[1, 10], sx=2)
+	points = numpy.array([[[0, 0], [1, 1]], [[1, 0], [0, 1]]], dtype='float32')
+	assert glmath.transform_points(m, points) == approx(numpy.array([[[1, 0], [3, 1]], [[12, 0], [10, 1]]]))
+
+def test_transform_aabbs(glmath):
+	m = glmath.affine2d(tx=[0, 5], rotation=[numpy.pi / 2, 0])
+	mins, maxs = glmath.transform_aabbs(m, numpy.array([[0, 0], [0, 0]]), numpy.array([[2, 1], [2, 1]]))
+	assert mins == approx(numpy.array([[-1, 0], [5, 0]]), abs=1e-6)
+	assert maxs == approx(numpy.array([[0, 2], [7, 1]]), abs=1e-6)
@@ -0,0 +1,99 @@
+import json
+import time
+from rave import profiling
+from pytest import fixture, approx
+
+
+@fixture
+def profiler():
+	profiler = profiling.FrameProfiler(history=100, trace_frames=2)
+	profiler.enable()
+	return profiler
+
+
+def test_disabled_records_nothing():
+	profiler = profiling.FrameProfiler()
+	profiler.begin_frame()
+	with profiler.section('test'):
+		pass
+	profiler.record('other', 1.0)
+	profiler.end_frame()
+
+	assert profiler.timings == {}
+	assert len(profiler.trace) == 0
+
+def test_section(profiler):
+	profiler.begin_frame()
+	with profiler.section('test'):
+		pass
+	profiler.end_frame()
+
+	assert len(profiler.timings['test']) == 1
+	assert len(profiler.timings['frame']) == 1
+	assert [ name for _, name, *_ in profiler.trace ] == [ 'test', 'frame' ]
+
+def test_percentiles(profiler):
+	for i in range(1, 101):
+		profiler.record('test', i / 1000)
+
+	assert profiler.percentiles('test') == approx({ 50: 0.05, 95: 0.095, 99: 0.099 })
+	assert profiler.percentiles('missing') is None
+
+def test_rolling_window(profiler):
+	for i in range(200):
+		profiler.record('test', 1.0 if i < 100 else 2.0)
+
+	assert profiler.percentiles('test', [0]) == { 0: 2.0 }
+
+def test_trace_window(profiler):
+	for _ in range(3):
+		profiler.begin_frame()
+		profiler.record('test', 0.001, start=0)
+
+	assert [ frame for frame, *_ in profiler.trace ] == [ 2, 3 ]
+
+def test_export_trace(profiler, tmpdir):
+	profiler.begin_frame()
+	with profiler.section('test', category='io'):
+		pass
+	profiler.record('gpu', 0.001, category='gpu')
+
+	path = str(tmpdir.join('trace.json'))
+	profiler.export_trace(path)
+	with open(path) as f:
+		trace = json.load(f)
+
+	assert len(trace['traceEvents']) == 1
+	event = trace['traceEvents'][0]
+	assert event['name'] == 'test'
+	assert event['cat'] == 'io'
+	assert event['ph'] == 'X'
+	assert event['args']['frame'] == 1
+
+def test_overlay_reuses_text(profiler):
+	class Text:
+		def __init__(self, string):
+			self.string = string
+			self.rendered = 0
+
+		def render(self, target):
+			self.rendered += 1
+
+	class Font:
+		def __init__(self):
+			self.created = []
+
+		def create_text(self, string, **kwargs):
+			self.created.append(Text(string))
+			return self.created[-1]
+
+	font = Font()
+	overlay = profiling.Overlay(profiler, font, interval=0.001)
+	overlay.render(None)
+	profiler.record('test', 0.001)
+	time.sleep(0.002)
+	overlay.render(None)
+
+	assert len(font.created) == 1
+	assert font.created[0].rendered == 2
+	assert 'test' in font.created[0].string
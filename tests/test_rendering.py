@@ -0,0 +1,83 @@
+from rave import rendering, events
+from pytest import fixture
+
+
+class AnimatedDrawable(rendering.Drawable):
+	animated = True
+
+
+@fixture
+def redraws(monkeypatch):
+	bus = events.EventBus()
+	requested = []
+	bus.hook('video.redraw', lambda ev, window: requested.append(window))
+	monkeypatch.setattr(events, 'current', lambda: bus)
+	return requested
+
+
+def test_layer_static(redraws):
+	layer = rendering.Layer('test')
+	layer.add_child(rendering.Drawable())
+	assert not layer.animated
+
+def test_layer_animated(redraws):
+	layer = rendering.Layer('test')
+	child = AnimatedDrawable()
+	layer.add_child(rendering.Drawable())
+	layer.add_child(child)
+	assert layer.animated
+
+	layer.remove_child(child)
+	assert not layer.animated
+
+def test_layer_change_requests_redraw(redraws):
+	layer = rendering.Layer('test')
+	child = rendering.Drawable()
+
+	layer.add_child(child)
+	assert redraws == [None]
+	layer.remove_child(child)
+	assert redraws == [None, None]
+
+
+def test_pixel_format_size():
+	assert rendering.PixelFormat.FORMAT_RGBA8888.data_size(3, 5) == 60
+	assert rendering.PixelFormat.FORMAT_RGB565.data_size(3, 5) == 30
+
+def test_pixel_format_compressed_size():
+	assert rendering.PixelFormat.FORMAT_BC1.compressed
+	assert not rendering.PixelFormat.FORMAT_RGBA8888.compressed
+
+	assert rendering.PixelFormat.FORMAT_BC1.data_size(8, 8) == 32
+	assert rendering.PixelFormat.FORMAT_BC3.data_size(8, 8) == 64
+	# Partial blocks take up a whole block.
+	assert rendering.PixelFormat.FORMAT_BC1.data_size(1, 1) == 8
+	assert rendering.PixelFormat.FORMAT_ETC2_RGBA8.data_size(5, 3) == 32
+
+def test_layer_generation(redraws):
+	layer = rendering.Layer('test')
+	generation = layer.generation
+
+	layer.add_child(rendering.Drawable())
+	assert layer.generation == generation + 1
+
+	layer.invalidate()
+	assert layer.generation == generation + 2
+	assert len(redraws) == 2
+
+def test_drawable_changed(redraws):
+	layer = rendering.Layer('test')
+	child = rendering.Drawable()
+	layer.add_child(child)
+	assert child.layer is layer
+
+	generation = layer.generation
+	child.changed()
+	assert layer.generation == generation + 1
+
+	layer.remove_child(child)
+	assert child.layer is None
+	generation = layer.generation
+	child.changed()
+	assert layer.generation == generation
+	assert redraws == [None, None, None, None]
@@ -0,0 +1,85 @@
+from pytest import fixture, importorskip
+
+# Importing the modules.opengl package requires PyOpenGL, but no GL context.
+importorskip('OpenGL.GL')
+from modules.opengl.core3 import streaming
+
+
+class Texture:
+	""" Just enough of a texture for the texture manager to keep track of. """
+
+	def __init__(self, manager, size):
+		self.manager = manager
+		self.texture = 1
+		self.gpu_size = size
+		self.width = self.height = 256
+		self.max_level = 0
+		self.level = 0
+		self.ready = True
+		self.pending = False
+		self.source = object()
+		self.last_used = 0
+		self.evicted = False
+
+	def evict(self):
+		self.evicted = True
+		self.ready = False
+		self.manager.untrack(self)
+
+
+@fixture
+def manager():
+	return streaming.TextureManager(budget=100)
+
+def make_textures(manager, amount):
+	textures = [ Texture(manager, 100) for _ in range(amount) ]
+	for texture in textures:
+		manager.track(texture)
+	return textures
+
+
+def test_recording(manager):
+	a, b, c = make_textures(manager, 3)
+
+	with manager.recording() as outer:
+		manager.touch(a)
+		with manager.recording() as inner:
+			manager.touch(b)
+	manager.touch(c)
+
+	assert set(inner) == { b }
+	assert set(outer) == { a, b }
+
+def test_recording_weak(manager):
+	a, = make_textures(manager, 1)
+
+	with manager.recording() as textures:
+		manager.touch(a)
+	del a
+
+	assert len(textures) == 0
+
+def test_trim_unused(manager):
+	a, b = make_textures(manager, 2)
+
+	for _ in range(manager.UNUSED_FRAMES + 1):
+		manager.touch(a)
+		manager.end_frame()
+
+	assert not a.evicted
+	assert b.evicted
+	assert manager.usage == 100
+
+def test_trim_recorded(manager):
+	a, b = make_textures(manager, 2)
+
+	# Like a cached layer: bind once while rendering, then only touch what was recorded while displayed.
+	with manager.recording() as cached:
+		manager.touch(a)
+	for _ in range(manager.UNUSED_FRAMES + 1):
+		for texture in cached:
+			manager.touch(texture)
+		manager.end_frame()
+
+	assert not a.evicted
+	assert b.evicted
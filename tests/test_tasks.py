@@ -0,0 +1,103 @@
+import asyncio
+from rave import tasks
+from .support.events import *
+from pytest import fixture
+
+
+@fixture
+def loop():
+	loop = tasks.TaskLoop()
+	yield loop
+	loop.close()
+
+def test_step(loop):
+	steps = []
+	async def task():
+		for i in range(3):
+			steps.append(i)
+			await asyncio.sleep(0)
+
+	loop.spawn(task())
+	assert steps == []
+	loop.step()
+	assert steps == [0, 1, 2]
+	assert not loop.tasks
+
+def test_step_budget(loop):
+	steps = []
+	async def task():
+		while True:
+			steps.append(None)
+			await asyncio.sleep(0)
+
+	loop.spawn(task())
+	loop.step(budget=0)
+	assert len(steps) == 1
+	assert loop.ready
+
+def test_close(loop):
+	cancelled = False
+	async def task():
+		nonlocal cancelled
+		try:
+			await asyncio.sleep(3600)
+		except asyncio.CancelledError:
+			cancelled = True
+			raise
+
+	loop.spawn(task())
+	loop.step()
+	assert loop.timeout(1) == 1
+	loop.close()
+	assert cancelled
+
+def test_coroutine_handler(bus):
+	calls = []
+	async def cb(ev, x):
+		calls.append(x)
+
+	bus.hook('rave.testing.test', cb)
+	bus.emit('rave.testing.test', 1)
+	assert calls == []
+
+	bus.tasks.step()
+	assert calls == [1]
+	bus.tasks.close()
+
+def test_wait_for(bus):
+	results = []
+	async def script():
+		results.append(await bus.wait_for('rave.testing.test'))
+		results.append(await bus.wait_for('rave.testing.test', lambda x: x > 1))
+
+	bus.tasks.spawn(script())
+	bus.tasks.step()
+	bus.emit('rave.testing.test', 1)
+	bus.tasks.step()
+	assert results == [(1,)]
+
+	bus.emit('rave.testing.test', 1)
+	bus.emit('rave.testing.test', 2)
+	bus.tasks.step()
+	assert results == [(1,), (2,)]
+	assert not bus.handlers
+	bus.tasks.close()
+
+def test_wait_for_kwargs(bus):
+	results = []
+	async def script():
+		results.append(await bus.wait_for('rave.testing.test'))
+		results.append(await bus.wait_for('rave.testing.test', lambda x, y=0: y > 1))
+
+	bus.tasks.spawn(script())
+	bus.tasks.step()
+	bus.emit('rave.testing.test', 1, y=1)
+	bus.tasks.step()
+	assert results == [(1,)]
+
+	bus.emit('rave.testing.test', 1, y=1)
+	bus.emit('rave.testing.test', 2, y=2)
+	bus.tasks.step()
+	assert results == [(1,), (2,)]
+	assert not bus.handlers
+	bus.tasks.close()
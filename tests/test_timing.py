@@ -0,0 +1,55 @@
+from rave import timing
+from pytest import fixture, approx
+
+
+@fixture
+def scheduler():
+	scheduler = timing.FrameScheduler(fps=0, tick_rate=100, max_ticks=3)
+	scheduler.start()
+	return scheduler
+
+
+def test_ticks_fixed_step(scheduler, monkeypatch):
+	now = scheduler._last
+	monkeypatch.setattr(timing.time, 'perf_counter', lambda: now + 0.025)
+
+	assert scheduler.ticks() == approx([0.01, 0.01])
+
+def test_ticks_accumulate(scheduler, monkeypatch):
+	now = scheduler._last
+	monkeypatch.setattr(timing.time, 'perf_counter', lambda: now + 0.005)
+	assert scheduler.ticks() == []
+
+	monkeypatch.setattr(timing.time, 'perf_counter', lambda: now + 0.011)
+	assert scheduler.ticks() == approx([0.01])
+
+def test_ticks_capped(scheduler, monkeypatch):
+	now = scheduler._last
+	monkeypatch.setattr(timing.time, 'perf_counter', lambda: now + 1)
+
+	assert len(scheduler.ticks()) == 3
+
+def test_ticks_after_idle(scheduler, monkeypatch):
+	now = scheduler._last
+	monkeypatch.setattr(timing.time, 'perf_counter', lambda: now + 0.4)
+	scheduler.idled()
+
+	assert scheduler.ticks() == approx([0.4])
+
+def test_idle(scheduler):
+	assert not scheduler.idle
+	scheduler.ticks()
+	assert scheduler.idle
+
+	scheduler.wake()
+	assert not scheduler.idle
+	scheduler.ticks()
+	assert scheduler.idle
+
+def test_idle_animating(scheduler):
+	scheduler.begin_animation()
+	scheduler.ticks()
+	assert not scheduler.idle
+
+	scheduler.end_animation()
+	assert scheduler.idle
@@ -0,0 +1,180 @@
+"""
+Offline converter from regular images to precompressed KTX textures for rave.
+
+Usage: python tools/ktxconvert.py [-f bc1|bc3] [--no-mipmaps] INPUT OUTPUT
+
+Images are decoded using SDL2_image and compressed to BC1 (DXT1, opaque) or BC3 (DXT5, with alpha) using a simple
+principal axis endpoint fit. This favours speed over quality; ETC2 textures have to be created with external tools.
+"""
+import sys
+import struct
+import ctypes
+import argparse
+
+import numpy
+import sdl2
+import sdl2.ext
+import sdl2.sdlimage as sdl2image
+
+
+KTX_IDENTIFIER = b'\xabKTX 11\xbb\r\n\x1a\n'
+KTX_ENDIANNESS = 0x04030201
+
+GL_RGB = 0x1907
+GL_RGBA = 0x1908
+FORMATS = {
+    # name: (glInternalFormat, glBaseInternalFormat, alpha)
+    'bc1': (0x83F0, GL_RGB, False),
+    'bc3': (0x83F3, GL_RGBA, True),
+}
+
+
+## Image handling.
+
+def load_image(path):
+    """ Load image at `path` as an (height, width, 4) RGBA array. """
+    surface = sdl2image.IMG_Load(path.encode('utf-8'))
+    if not surface:
+        raise sdl2.ext.SDLError()
+
+    # ABGR8888 is stored as R, G, B, A bytes in memory on little endian machines.
+    fmt = sdl2.SDL_PIXELFORMAT_ABGR8888 if sys.byteorder == 'little' else sdl2.SDL_PIXELFORMAT_RGBA8888
+    converted = sdl2.SDL_ConvertSurfaceFormat(surface, fmt, 0)
+    sdl2.SDL_FreeSurface(surface)
+    if not converted:
+        raise sdl2.ext.SDLError()
+
+    try:
+        s = converted.contents
+        buf = ctypes.cast(s.pixels, ctypes.POINTER(ctypes.c_uint8 * (s.pitch * s.h))).contents
+        pixels = numpy.frombuffer(buf, dtype=numpy.uint8).reshape(s.h, s.pitch)[:, :s.w * 4]
+        return pixels.reshape(s.h, s.w, 4).copy()
+    finally:
+        sdl2.SDL_FreeSurface(converted)
+
+def mipmaps(image):
+    """ Generate all mipmap levels for `image` using a box filter, largest first. """
+    levels = [ image ]
+    while image.shape[0] > 1 or image.shape[1] > 1:
+        h, w = image.shape[:2]
+        # Pad odd dimensions by repeating the last row/column.
+        padded = numpy.pad(image, ((0, h % 2), (0, w % 2), (0, 0)), mode='edge').astype(numpy.uint16)
+        image = ((padded[0::2, 0::2] + padded[1::2, 0::2] + padded[0::2, 1::2] + padded[1::2, 1::2] + 2) // 4).astype(numpy.uint8)
+        levels.append(image)
+    return levels
+
+
+## Compression.
+
+def to_blocks(image):
+    """ Split `image` into an (n, 16, 4) array of 4x4 blocks, padding it to a multiple of 4 pixels. """
+    h, w = image.shape[:2]
+    padded = numpy.pad(image, ((0, -h % 4), (0, -w % 4), (0, 0)), mode='edge')
+    bh, bw = padded.shape[0] // 4, padded.shape[1] // 4
+    return padded.reshape(bh, 4, bw, 4, 4).transpose(0, 2, 1, 3, 4).reshape(bh * bw, 16, 4).astype(numpy.int32)
+
+def encode_565(colors):
+    return ((colors[:, 0] >> 3) << 11) | ((colors[:, 1] >> 2) << 5) | (colors[:, 2] >> 3)
+
+def decode_565(values):
+    r = (values >> 11) & 0x1F
+    g = (values >> 5) & 0x3F
+    b = values & 0x1F
+    return numpy.stack([ (r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2) ], axis=-1)
+
+def compress_color(blocks):
+    """ Compress the RGB channels of `blocks` into BC1 color blocks. """
+    rgb = blocks[:, :, :3]
+
+    # Pick the extreme colors along the principal axis of each block as endpoints, found through power iteration.
+    centered = rgb - rgb.mean(axis=1, keepdims=True)
+    covariance = numpy.einsum('nki,nkj->nij', centered, centered)
+    rows = numpy.arange(len(blocks))
+    # Start from the covariance row of the channel with the most variance, which can't be orthogonal to the axis.
+    axis = covariance[rows, numpy.einsum('nii->ni', covariance).argmax(axis=1)].astype(numpy.float64) + 1e-9
+    for _ in range(4):
+        axis = numpy.einsum('nij,nj->ni', covariance, axis)
+        axis /= numpy.linalg.norm(axis, axis=1, keepdims=True) + 1e-9
+    projection = (centered * axis[:, None, :]).sum(axis=-1)
+    c0 = encode_565(rgb[rows, projection.argmax(axis=1)])
+    c1 = encode_565(rgb[rows, projection.argmin(axis=1)])
+    # Four-color mode requires c0 > c1.
+    swap = c0 < c1
+    c0, c1 = numpy.where(swap, c1, c0), numpy.where(swap, c0, c1)
+
+    e0, e1 = decode_565(c0), decode_565(c1)
+    palette = numpy.stack([ e0, e1, (2 * e0 + e1) // 3, (e0 + 2 * e1) // 3 ], axis=1)
+    distances = ((rgb[:, :, None, :] - palette[:, None, :, :]) ** 2).sum(axis=-1)
+    indices = distances.argmin(axis=-1)
+    # Identical endpoints would select three-color mode, so just use the first endpoint.
+    indices[c0 == c1] = 0
+
+    packed = (indices.astype(numpy.uint32) << (2 * numpy.arange(16, dtype=numpy.uint32))).sum(axis=1, dtype=numpy.uint32)
+    out = numpy.zeros(len(blocks), dtype=[ ('c0', '<u2'), ('c1', '<u2'), ('indices', '<u4') ])
+    out['c0'], out['c1'], out['indices'] = c0, c1, packed
+    return out
+
+def compress_alpha(blocks):
+    """ Compress the alpha channel of `blocks` into BC3 alpha blocks. """
+    alpha = blocks[:, :, 3]
+    a0 = alpha.max(axis=1)
+    a1 = alpha.min(axis=1)
+
+    # Eight-alpha mode: a0 > a1, six interpolated values.
+    palette = numpy.empty((len(blocks), 8), dtype=numpy.int32)
+    palette[:, 0], palette[:, 1] = a0, a1
+    for i in range(1, 7):
+        palette[:, i + 1] = ((7 - i) * a0 + i * a1) // 7
+    indices = numpy.abs(alpha[:, :, None] - palette[:, None, :]).argmin(axis=-1).astype(numpy.uint64)
+    indices[a0 == a1] = 0
+
+    packed = (indices << (3 * numpy.arange(16, dtype=numpy.uint64))).sum(axis=1, dtype=numpy.uint64)
+    out = numpy.zeros((len(blocks), 8), dtype=numpy.uint8)
+    out[:, 0], out[:, 1] = a0, a1
+    for i in range(6):
+        out[:, 2 + i] = (packed >> numpy.uint64(8 * i)) & numpy.uint64(0xFF)
+    return out
+
+def compress(image, alpha):
+    blocks = to_blocks(image)
+    color = compress_color(blocks).view(numpy.uint8).reshape(len(blocks), 8)
+    if alpha:
+        return numpy.concatenate([ compress_alpha(blocks), color ], axis=1).tobytes()
+    return color.tobytes()
+
+
+## KTX output.
+
+def write_ktx(path, width, height, internal_format, base_format, levels):
+    with open(path, 'wb') as f:
+        f.write(KTX_IDENTIFIER)
+        f.write(struct.pack('<13I', KTX_ENDIANNESS, 0, 1, 0, internal_format, base_format, width, height, 0, 0, 1, len(levels), 0))
+        for data in levels:
+            f.write(struct.pack('<I', len(data)))
+            f.write(data)
+            f.write(b'\0' * (-len(data) % 4))
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Convert images to compressed KTX textures.', prog='ktxconvert')
+    parser.add_argument('-f', '--format', choices=sorted(FORMATS), help='Compressed format. (default: bc3 if the image has alpha, else bc1)')
+    parser.add_argument('--no-mipmaps', action='store_true', help='Do not generate mipmaps.')
+    parser.add_argument('input', help='The image to convert.')
+    parser.add_argument('output', help='The KTX file to write.')
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    image = load_image(args.input)
+
+    fmt = args.format
+    if not fmt:
+        fmt = 'bc3' if (image[:, :, 3] != 255).any() else 'bc1'
+    internal_format, base_format, alpha = FORMATS[fmt]
+
+    levels = [ image ] if args.no_mipmaps else mipmaps(image)
+    data = [ compress(level, alpha) for level in levels ]
+    write_ktx(args.output, image.shape[1], image.shape[0], internal_format, base_format, data)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""
+Offline filtering and aggregation of structured rave logs, as written by rave.logsink.
+
+Usage: python tools/logtool.py [-l LEVEL] [-m MIN_LEVEL] [-s SOURCE] [-n LOGGER] [-g TEXT] [--since TIME] [--until TIME]
+                               [--json | -c FIELD] FILE...
+
+Both JSON lines and binary logs of either version are read, detected by the binary header. Rotated files can be passed
+together and are read in the given order. Tracebacks of exception records are shown below their message. Records are printed in the human-readable rave log format, as JSON lines with --json,
+or counted by level, source, logger or template with --count-by.
+"""
+import json
+import struct
+import fnmatch
+import argparse
+import datetime
+import collections
+
+
+# Binary format headers, and the amount of string fields records have in that version.
+BINARY_HEADERS = {
+    b'RAVELOG\x01': 4,
+    b'RAVELOG\x02': 5,
+}
+HEADER_SIZE = 8
+LEVELS = {
+    0x1: 'EXCEPTION',
+    0x2: 'FATAL',
+    0x4: 'ERROR',
+    0x8: 'WARNING',
+    0x10: 'INFO',
+    0x20: 'DEBUG',
+    0x40: 'TRACE',
+}
+SEVERITIES = {
+    'TRACE': 0,
+    'DEBUG': 1,
+    'INFO': 2,
+    'WARNING': 3,
+    'ERROR': 4,
+    'EXCEPTION': 4,
+    'FATAL': 5,
+}
+FIELDS = ('level', 'source', 'logger', 'template')
+
+
+## Reading.
+
+def read_records(path):
+    """ Yield records from the log at `path` as dicts. Truncated trailing records, such as left by a crash, are skipped. """
+    with open(path, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+        if header in BINARY_HEADERS:
+            yield from read_binary(f, BINARY_HEADERS[header])
+        else:
+            f.seek(0)
+            yield from read_json(f)
+
+def read_json(f):
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line.decode('utf-8'))
+        except ValueError:
+            break
+        record.setdefault('exception', None)
+        yield record
+
+def read_binary(f, count=5):
+    while True:
+        prefix = f.read(4)
+        if len(prefix) < 4:
+            break
+        length, = struct.unpack('<I', prefix)
+        body = f.read(length)
+        if len(body) < length:
+            break
+
+        timestamp, level = struct.unpack_from('<dB', body)
+        offset = struct.calcsize('<dB')
+        fields = []
+        for _ in range(count):
+            size, = struct.unpack_from('<I', body, offset)
+            offset += 4
+            fields.append(body[offset:offset + size].decode('utf-8'))
+            offset += size
+
+        source, logger, template, arguments = fields[:4]
+        exception = fields[4] if count > 4 else ''
+        args, kwargs = json.loads(arguments)
+        yield { 'time': timestamp, 'level': LEVELS.get(level, str(level)), 'source': source, 'logger': logger, 'template': template, 'args': args, 'kwargs': kwargs, 'exception': exception or None }
+
+
+## Filtering and output.
+
+def make_filter(args):
+    levels = { level.upper() for level in args.level or () }
+    severity = SEVERITIES[args.min_level] if args.min_level else None
+
+    def matches(record):
+        if levels and record['level'] not in levels:
+            return False
+        if severity is not None and SEVERITIES.get(record['level'], 0) < severity:
+            return False
+        if args.source and not fnmatch.fnmatchcase(record['source'], args.source):
+            return False
+        if args.logger and not fnmatch.fnmatchcase(record['logger'], args.logger):
+            return False
+        if args.since is not None and record['time'] < args.since:
+            return False
+        if args.until is not None and record['time'] >= args.until:
+            return False
+        if args.grep and args.grep not in record['template'] and args.grep not in format_message(record) and args.grep not in (record['exception'] or ''):
+            return False
+        return True
+    return matches
+
+def format_message(record):
+    try:
+        return record['template'].format(*record['args'], **record['kwargs'])
+    except (IndexError, KeyError, ValueError, TypeError):
+        # Arguments stored as their repr() might not fit the format specification.
+        return '{} {!r} {!r}'.format(record['template'], record['args'], record['kwargs'])
+
+def format_record(record):
+    timestamp = datetime.datetime.fromtimestamp(record['time']).strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]
+    line = '{} {} [{}] {}: {}'.format(timestamp, record['source'], record['logger'], record['level'], format_message(record))
+    if record['exception']:
+        line += '\n' + record['exception']
+    return line
+
+def aggregate(records, field):
+    """ Get a list of (value, count, first time, last time) tuples for `field`, most common first. """
+    counts = collections.Counter()
+    first = {}
+    last = {}
+    for record in records:
+        value = record[field]
+        counts[value] += 1
+        first.setdefault(value, record['time'])
+        last[value] = record['time']
+    return [ (value, count, first[value], last[value]) for value, count in counts.most_common() ]
+
+
+def parse_time(value):
+    """ Parse seconds since the epoch or an ISO 8601 date and time. """
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Filter and aggregate structured rave logs.', prog='logtool')
+    parser.add_argument('-l', '--level', action='append', help='Only show records of this level. Can be given multiple times.')
+    parser.add_argument('-m', '--min-level', choices=sorted(SEVERITIES, key=SEVERITIES.get), type=str.upper, help='Only show records of at least this severity.')
+    parser.add_argument('-s', '--source', help='Only show records from games matching this pattern.')
+    parser.add_argument('-n', '--logger', help='Only show records from loggers matching this pattern.')
+    parser.add_argument('-g', '--grep', help='Only show records whose template, message or traceback contains this text.')
+    parser.add_argument('--since', type=parse_time, help='Only show records from this time on. (seconds since epoch, or ISO 8601)')
+    parser.add_argument('--until', type=parse_time, help='Only show records from before this time. (seconds since epoch, or ISO 8601)')
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument('--json', action='store_true', help='Output matching records as JSON lines.')
+    output.add_argument('-c', '--count-by', choices=FIELDS, help='Count matching records by this field instead of showing them.')
+    parser.add_argument('files', metavar='FILE', nargs='+', help='The logs to read.')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    matches = make_filter(args)
+    records = (record for path in args.files for record in read_records(path) if matches(record))
+
+    if args.count_by:
+        for value, count, first, last in aggregate(records, args.count_by):
+            print('{:>8}  {}  ({} - {})'.format(count, value,
+                datetime.datetime.fromtimestamp(first).isoformat(' ', 'seconds'), datetime.datetime.fromtimestamp(last).isoformat(' ', 'seconds')))
+    elif args.json:
+        for record in records:
+            print(json.dumps(record, ensure_ascii=False))
+    else:
+        for record in records:
+            print(format_record(record))
+
+
+if __name__ == '__main__':
+    main()